@@ -0,0 +1,111 @@
+import collections
+from speakers import JUSTICE_NAMES
+
+ASCENDING = 1
+
+# The only fields of a case document the aggregates are built from (kilobytes per docket)
+SOURCE_FIELDS = ('term', 'interruptions_dict', 'interruptions_side_dict', 'sentiment_dict', 'lawyer_names_lst')
+
+# Aggregate collection suffix -> the indexes its queries need
+AGGREGATE_INDEXES = {'justice_terms': [[('justice', ASCENDING), ('term', ASCENDING)], [('term', ASCENDING)]],
+                     'side_terms': [[('side', ASCENDING), ('term', ASCENDING)], [('term', ASCENDING)]],
+                     'terms': [],
+                     }
+
+def _new_group():
+    return {'dockets': 0, 'interruptions': 0, 'statements_scored': 0, 'polarity_sum': 0.0}
+
+class Aggregates(object):
+    """
+    Objective: Precompute what the dashboards ask for, so that they read a few small documents
+    instead of every case document:
+        justice_terms: per justice and term
+        side_terms: per side (PETITIONER, RESPONDENT) and term
+        terms: per term
+    each with the number of dockets, interrupted statements and scored statements, and the
+    summed and mean polarity
+
+    A docket's lawyers go to their side, the speakers in speakers.JUSTICE_NAMES to justice_terms.
+    Any other speaker (a lawyer name that did not resolve, a garbled "<name>" prefix) is left out
+    of every group, terms only counts them (other_speakers).
+    """
+    def __init__(self):
+        # (justice, term) -> group
+        self.justice_terms = collections.defaultdict(_new_group)
+        # (side, term) -> group
+        self.side_terms = collections.defaultdict(_new_group)
+        # term -> group, plus interruptions per side
+        self.terms = collections.defaultdict(_new_group)
+
+    def add(self, doc):
+        """
+        Add a case document (at least SOURCE_FIELDS)
+        """
+        term = int(doc['term'])
+        lawyer_sides = {name: side for side, name in doc['lawyer_names_lst']}
+        speakers = set(doc['interruptions_dict']).union(doc['sentiment_dict'])
+
+        term_group = self.terms[term]
+        term_group['dockets'] += 1
+        term_group.setdefault('other_speakers', 0)
+        for side, n_interruptions in doc['interruptions_side_dict'].iteritems():
+            key = 'interruptions_%s' % side.lower()
+            term_group[key] = term_group.get(key, 0) + n_interruptions
+
+        sides_seen = set()
+        for name in speakers:
+            n_interruptions = doc['interruptions_dict'].get(name, 0)
+            scores = doc['sentiment_dict'].get(name, [])
+            if name in lawyer_sides:
+                group = self.side_terms[(lawyer_sides[name], term)]
+                if lawyer_sides[name] not in sides_seen:
+                    sides_seen.add(lawyer_sides[name])
+                    group['dockets'] += 1
+            elif name in JUSTICE_NAMES:
+                group = self.justice_terms[(name, term)]
+                group['dockets'] += 1
+            else:
+                term_group['other_speakers'] += 1
+                continue
+            for g in (group, term_group):
+                g['interruptions'] += n_interruptions
+                g['statements_scored'] += len(scores)
+                g['polarity_sum'] += sum(scores)
+
+    @staticmethod
+    def _documents(groups, key_names):
+        docs = []
+        for key, group in sorted(groups.iteritems()):
+            key = key if isinstance(key, tuple) else (key,)
+            doc = dict(group, _id='-'.join(str(k) for k in key))
+            doc.update(zip(key_names, key))
+            doc['mean_polarity'] = (group['polarity_sum'] / group['statements_scored']
+                                    if group['statements_scored'] else None)
+            docs.append(doc)
+        return docs
+
+    def documents(self):
+        """
+        Returns collection suffix -> documents of the aggregate collection
+        """
+        return {'justice_terms': self._documents(self.justice_terms, ('justice', 'term')),
+                'side_terms': self._documents(self.side_terms, ('side', 'term')),
+                'terms': self._documents(self.terms, ('term',))}
+
+def rebuild(storage_obj, collectionname):
+    """
+    Recompute the aggregate tables (<collectionname>_justice_terms, ...) from SOURCE_FIELDS of
+    every case document of the collectionname table. Every table is replaced at once
+    (storage table replace_all), so readers never see it half written.
+    :param storage_obj: storage backend (storage.py)
+    :return: suffix -> number of aggregate documents
+    """
+    aggregates_obj = Aggregates()
+    for doc in storage_obj.table(collectionname).find(SOURCE_FIELDS):
+        aggregates_obj.add(doc)
+
+    counts = {}
+    for suffix, docs in aggregates_obj.documents().iteritems():
+        storage_obj.table('%s_%s' % (collectionname, suffix)).replace_all(docs, AGGREGATE_INDEXES[suffix])
+        counts[suffix] = len(docs)
+    return counts
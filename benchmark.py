@@ -0,0 +1,889 @@
+import aggregates
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+import bulk_writer
+import cache
+import clean_data
+import interruptions
+import inverted_index
+import pipeline
+import polarity
+import preprocessing
+import recompute
+import sentiment
+import statement_table
+import storage
+import synthetic
+from speakers import JUSTICE_NAMES
+
+def _make_docs(n_docs, text_kb):
+    """
+    Build case-like documents of roughly text_kb KB of oral_text each
+    """
+    sentence = 'JUSTICE SCALIA: Counsel, is that the rule we adopted -- '
+    oral_text = sentence * (text_kb * 1024 / len(sentence))
+    statements = [oral_text[i:i + 500] for i in range(0, len(oral_text), 500)]
+    return [{'_id': 'docket-%s' % i,
+             'oral_text': oral_text,
+             'statements': statements,
+             'interruptions_dict': {'SCALIA': 3},
+             'sentiment_dict': {'SCALIA': [0.1, -0.2]}} for i in range(n_docs)]
+
+def _get_collection(use_mongomock, dbname, collectionname):
+    if use_mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient()
+    return client[dbname][collectionname]
+
+def bench_bulk_writes(tab, n_docs=500, text_kb=200, batch_sizes=(10, 50, 100)):
+    """
+    Compare docs/sec of one insert_one per document against Bulk_Writer batches
+    :return: dict of label -> docs/sec
+    """
+    results = {}
+
+    tab.delete_many({})
+    docs = _make_docs(n_docs, text_kb)
+    start = time.time()
+    for doc in docs:
+        tab.insert_one(doc)
+    results['per_document'] = n_docs / (time.time() - start)
+
+    for batch_size in batch_sizes:
+        tab.delete_many({})
+        docs = _make_docs(n_docs, text_kb)
+        start = time.time()
+        writer = bulk_writer.Bulk_Writer(storage.Mongo_Table(tab), batch_size=batch_size)
+        for doc in docs:
+            writer.add(doc)
+        writer.flush()
+        results['bulk_%s' % batch_size] = n_docs / (time.time() - start)
+
+    tab.delete_many({})
+    return results
+
+def _legacy_preprocess_meta(meta_df):
+    """
+    The per-docket loop Preprocessing._preprocess_meta used to run, kept as the baseline
+    """
+    uniq_cols = ['justice', 'justiceName', 'vote', 'opinion', 'direction',
+                 'majority', 'firstAgreement', 'secondAgreement']
+    non_uniq_cols = meta_df.columns.difference(uniq_cols)
+
+    collapsed_df_lst = []
+    for name, df in meta_df.groupby('docket'):
+        info_dict = df[non_uniq_cols].iloc[0].to_dict()
+        for jcol in uniq_cols:
+            info_dict[jcol] = df[jcol].tolist()
+        collapsed_df_lst.append(info_dict)
+
+    df = pd.DataFrame(collapsed_df_lst)
+    df['_id'] = df['docket']
+    return df
+
+def bench_metadata(metadata_file):
+    """
+    Time collapsing the justice-centered SCDB file and looking up every docket, with the
+    per-docket groupby loop + boolean scan against Preprocessing._preprocess_meta (one stable
+    sort by docket, the justice columns sliced per docket) + docket index
+    :return: dict of label -> seconds
+    """
+    raw_metadata = pd.read_csv(metadata_file)
+    raw_metadata = raw_metadata[raw_metadata['term'] >= 2000]
+    results = {}
+
+    start = time.time()
+    metadata = _legacy_preprocess_meta(raw_metadata)
+    results['legacy_collapse'] = time.time() - start
+    start = time.time()
+    for docket in metadata['docket']:
+        metadata[metadata['docket'] == docket].iloc[0].to_dict()
+    results['legacy_lookup'] = time.time() - start
+
+    start = time.time()
+    metadata = preprocessing.Preprocessing._preprocess_meta(raw_metadata)
+    results['vectorized_collapse'] = time.time() - start
+    start = time.time()
+    metadata_index = dict(zip(metadata['docket'], metadata.to_dict('records')))
+    for docket in metadata['docket']:
+        dict(metadata_index[docket])
+    results['indexed_lookup'] = time.time() - start
+
+    return results
+
+class _Legacy_Clean_Data(clean_data.Clean_Data):
+    """
+    Clean_Data as it was before the module-level tables and precompiled patterns,
+    kept as the baseline (and to check the output has not changed)
+    """
+    def perform_regex(self):
+        self.oral_text = re.sub(r'\s\d+', '', self.oral_text)
+
+    def find_beginning_of_oral_argument(self):
+        self.oral_text_start = -1
+        for marker in clean_data.START_MARKERS:
+            if self.oral_text_start == -1:
+                self.oral_text_start = self.oral_text.find(marker)
+
+    def find_end_of_oral_argument(self):
+        self.oral_text_end = -1
+        for marker in clean_data.END_MARKERS:
+            if self.oral_text_end == -1:
+                self.oral_text_end = self.oral_text.find(marker)
+
+    def identify_lawyers_as_petitioner_respondent(self):
+        slce = slice(self.oral_text_start, self.oral_text_end)
+        for line in re.findall('ORAL ARGUMENT OF (.+?):', self.oral_text[slce]):
+            last_name = line.split()[-1]
+            if 'PETITIONER' in line:
+                self.lawyer_names_lst.append(('PETITIONER', last_name))
+                self.lawyer_names_dict[last_name] = 'PETITIONER'
+            if 'RESPONDENT' in line:
+                self.lawyer_names_lst.append(('RESPONDENT', last_name))
+                self.lawyer_names_dict[last_name] = 'RESPONDENT'
+
+def _read_transcripts(oral_argument_folder, limit=None):
+    """
+    Returns (docket, text) of the transcripts in oral_argument_folder, as Preprocessing reads them
+    """
+    fnames = sorted(os.listdir(oral_argument_folder))[:limit]
+    return [(fname[:-len('.txt')], preprocessing.Preprocessing._to_utf8(open(os.path.join(oral_argument_folder, fname)).read()))
+            for fname in fnames]
+
+def bench_clean_data(transcripts, repeat=3):
+    """
+    Time Clean_Data.update_class_variables against the legacy implementation on the same
+    transcripts and check that both produce the same output
+    :return: dict of label -> MB/sec
+    """
+    n_bytes = sum(len(text) for docket, text in transcripts)
+    results = {}
+    outputs = {}
+
+    for label, cls in [('legacy', _Legacy_Clean_Data), ('current', clean_data.Clean_Data)]:
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            objs = [cls(docket, text) for docket, text in transcripts]
+            for obj in objs:
+                obj.update_class_variables()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = n_bytes / best / 1e6
+        outputs[label] = [(obj.oral_text, obj.oral_text_start, obj.oral_text_end, obj.lawyer_names_lst)
+                          for obj in objs]
+
+    if outputs['legacy'] != outputs['current']:
+        raise AssertionError('Clean_Data output differs from the legacy implementation')
+    return results
+
+def _docket_spans(transcripts):
+    """
+    Returns (docket, oral_text, spans) of each transcript, as Preprocessing passes them to Sentiment
+    """
+    docket_spans = []
+    for docket, text in transcripts:
+        clean_data_obj = clean_data.Clean_Data(docket, text)
+        clean_data_obj.update_class_variables()
+        interruptions_obj = interruptions.Interruptions(docket,
+                                                        clean_data_obj.oral_text,
+                                                        clean_data_obj.oral_text_start,
+                                                        clean_data_obj.oral_text_end,
+                                                        clean_data_obj.lawyer_names_dict)
+        interruptions_obj.update_class_variables()
+        docket_spans.append((docket, clean_data_obj.oral_text, interruptions_obj.spans))
+    return docket_spans
+
+def bench_sentiment(docket_spans):
+    """
+    Time Sentiment with one TextBlob per statement against the batched Lexicon_Scorer
+    (TextBlob compatible and fast mode)
+    :return: dict of label -> (statements/sec, max absolute difference to TextBlob)
+    """
+    lexicon_scorer = polarity.Lexicon_Scorer(textblob_compatible=True)
+    scorers = [('textblob', polarity.TextBlob_Scorer()),
+               ('lexicon_compatible', lexicon_scorer),
+               ('lexicon_fast', polarity.Lexicon_Scorer(textblob_compatible=False,
+                                                        lexicon=lexicon_scorer.lexicon))]
+    results = {}
+    scores = {}
+
+    for label, scorer in scorers:
+        n_statements = 0
+        scores[label] = []
+        start = time.time()
+        for docket, oral_text, spans in docket_spans:
+            sentiment_obj = sentiment.Sentiment(docket, oral_text, spans, scorer=scorer)
+            sentiment_obj.update_class_variables()
+            for name, lst in sorted(sentiment_obj.sentiment_dict.items()):
+                n_statements += len(lst)
+                scores[label].extend(lst)
+        elapsed = time.time() - start
+        max_diff = max([abs(a - b) for a, b in zip(scores['textblob'], scores[label])] or [0.0])
+        results[label] = (n_statements / elapsed, max_diff)
+
+    return results
+
+class _Discard_Table(object):
+    """
+    Stands in for a storage table: drops the documents after write_delay seconds per
+    document, so that memory is not held by the sink and writes can be made slower than the workers
+    """
+    transient_errors = ()
+    doc_size = None
+
+    def __init__(self, write_delay=0.0):
+        self.write_delay = write_delay
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        time.sleep(self.write_delay * len(docs))
+        return []
+
+    def clear(self):
+        pass
+
+def _replicated_tasks(oral_argument_folder, n_dockets):
+    """
+    Returns n_dockets (docket, meta_dict, oral_fpath) tasks cycling through the transcripts of
+    oral_argument_folder, so that any corpus size can be simulated with the same texts
+    """
+    fnames = sorted(os.listdir(oral_argument_folder))
+    tasks = []
+    for i in range(n_dockets):
+        docket = '%s-%s' % (fnames[i % len(fnames)][:-len('.txt')], i)
+        tasks.append((docket, {'_id': docket, 'docket': docket},
+                      os.path.join(oral_argument_folder, fnames[i % len(fnames)])))
+    return tasks
+
+def _write_all(path, tasks, n_workers, write_delay, result_queue):
+    """
+    Run one path over tasks in a fresh process and put the growth of its peak RSS (MB) on
+    result_queue
+    """
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    writer = bulk_writer.Bulk_Writer(_Discard_Table(write_delay))
+    pool = None
+
+    if path == 'streaming':
+        results = pipeline.run(tasks)
+    else:
+        pool = multiprocessing.Pool(n_workers)
+        worker_tasks = [task + (None, 1 << 30, False, False) for task in tasks]
+        if path == 'pool_imap':
+            results = pool.imap(preprocessing._process_docket_task, worker_tasks, 1)
+        else:
+            results = pipeline.bounded_imap(pool, preprocessing._process_docket_task, worker_tasks, 1, 2 * n_workers)
+
+    for result in results:
+        writer.add(result[0])
+    writer.flush()
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    result_queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024.0)
+
+def bench_memory(oral_argument_folder, sizes=(100, 400, 1600), n_workers=2, write_delay=0.005):
+    """
+    Peak RSS growth of the writing process against corpus size, for the pool.imap fan-out
+    insert_intersect_docket_meta_oral used before, the bounded pipeline fan-out and the
+    single process streaming pipeline (the pool workers themselves are not counted, they only
+    ever hold the dockets they are working on)
+    :param write_delay: seconds per document the stand-in collection takes to write
+    :return: dict of (path, n_dockets) -> MB
+    """
+    results = {}
+    for n_dockets in sizes:
+        tasks = _replicated_tasks(oral_argument_folder, n_dockets)
+        for path in ('pool_imap', 'bounded_pipeline', 'streaming'):
+            result_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_write_all,
+                                              args=(path, tasks, n_workers, write_delay, result_queue))
+            process.start()
+            results[(path, n_dockets)] = result_queue.get()
+            process.join()
+    return results
+
+def _metric(value, unit, higher_is_better):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+def _corpus_tasks(metadata_file, oral_argument_folder):
+    """
+    Returns the (docket, meta_dict, oral_fpath) tasks Preprocessing would run, without Mongo
+    """
+    raw_metadata = pd.read_csv(metadata_file)
+    metadata = preprocessing.Preprocessing._preprocess_meta(raw_metadata[raw_metadata['term'] >= 2000])
+    metadata_index = dict(zip(metadata['docket'], metadata.to_dict('records')))
+    return [(fname[:-len('.txt')], dict(metadata_index[fname[:-len('.txt')]]),
+             os.path.join(oral_argument_folder, fname))
+            for fname in sorted(os.listdir(oral_argument_folder)) if fname[:-len('.txt')] in metadata_index]
+
+def bench_stages(metadata_file, oral_argument_folder, repeat=3):
+    """
+    Time the metadata collapse and every pipeline stage over the whole corpus (best of repeat)
+    :return: dict of metric name -> _metric
+    """
+    lexicon_scorer = polarity.Lexicon_Scorer()
+    best = {}
+    n_statements = 0
+
+    for _ in range(repeat):
+        start = time.time()
+        tasks = _corpus_tasks(metadata_file, oral_argument_folder)
+        timings = [('metadata', time.time() - start)]
+
+        # A fresh polarity cache every repeat, so that later repeats are not all cache hits
+        scorer = cache.Caching_Scorer(lexicon_scorer, cache.LRU_Cache(sentiment.POLARITY_CACHE_SIZE))
+        stages = [('read', pipeline.read),
+                  ('clean', pipeline.clean),
+                  ('segment', pipeline.segment),
+                  ('interruptions', pipeline.find_interruptions),
+                  ('sentiment', lambda records: pipeline.score_sentiment(records, scorer))]
+        records = tasks
+        for name, stage in stages:
+            start = time.time()
+            records = list(stage(records))
+            timings.append((name, time.time() - start))
+        n_statements = sum(len(record.interruptions.spans) for record in records)
+
+        for name, seconds in timings:
+            best[name] = min(seconds, best.get(name, seconds))
+
+    n_dockets = len(tasks)
+    n_mb = sum(os.path.getsize(oral_fpath) for docket, meta_dict, oral_fpath in tasks) / 1e6
+    # Only throughputs are checked against the baseline, seconds are there for reading
+    metrics = {'metadata.seconds': _metric(best['metadata'], 's', None),
+               'metadata.dockets_per_sec': _metric(n_dockets / best['metadata'], 'dockets/sec', True)}
+    for name, seconds in best.items():
+        if name == 'metadata':
+            continue
+        metrics['stage.%s.seconds' % name] = _metric(seconds, 's', None)
+        metrics['stage.%s.mb_per_sec' % name] = _metric(n_mb / seconds, 'MB/sec', True)
+    metrics['stage.sentiment.statements_per_sec'] = _metric(n_statements / best['sentiment'],
+                                                            'statements/sec', True)
+    metrics['corpus.dockets'] = _metric(n_dockets, 'dockets', None)
+    metrics['corpus.mb'] = _metric(n_mb, 'MB', None)
+    metrics['corpus.statements'] = _metric(n_statements, 'statements', None)
+    return metrics
+
+def _end_to_end(metadata_file, oral_argument_folder, result_queue):
+    """
+    Metadata -> pipeline -> Bulk_Writer into a _Discard_Table, in a fresh process; puts
+    (dockets written, seconds, peak RSS growth in MB) on result_queue
+    """
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    writer = bulk_writer.Bulk_Writer(_Discard_Table())
+    for doc, count_problems, columns in pipeline.run(_corpus_tasks(metadata_file, oral_argument_folder)):
+        writer.add(doc)
+    writer.flush()
+    result_queue.put((writer.n_written, time.time() - start,
+                      (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024.0))
+
+def bench_end_to_end(metadata_file, oral_argument_folder):
+    """
+    :return: dict of metric name -> _metric
+    """
+    result_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_end_to_end, args=(metadata_file, oral_argument_folder, result_queue))
+    process.start()
+    n_dockets, seconds, peak_mb = result_queue.get()
+    process.join()
+    return {'end_to_end.seconds': _metric(seconds, 's', None),
+            'end_to_end.dockets_per_sec': _metric(n_dockets / seconds, 'dockets/sec', True),
+            'end_to_end.peak_rss_growth_mb': _metric(peak_mb, 'MB', False)}
+
+def bench_suite(n_dockets=200, seed=0, repeat=3):
+    """
+    Generate a synthetic corpus and run the per-stage and end-to-end benchmarks on it
+    :return: {'config': ..., 'metrics': {name: {'value', 'unit', 'higher_is_better'}}}
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        start = time.time()
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        generate_seconds = time.time() - start
+
+        metrics = bench_stages(metadata_file, oral_argument_folder, repeat)
+        metrics.update(bench_end_to_end(metadata_file, oral_argument_folder))
+        metrics['corpus.generate_seconds'] = _metric(generate_seconds, 's', None)
+    finally:
+        shutil.rmtree(folder)
+
+    return {'config': {'n_dockets': n_dockets, 'seed': seed, 'repeat': repeat}, 'metrics': metrics}
+
+def _interruptions_per_justice_per_term(table):
+    """
+    The aggregation statement_table.interruptions_per_justice_per_term over the stored documents
+    """
+    counts = collections.Counter()
+    for doc in table.find(['term', 'interruptions_dict', 'lawyer_names_lst']):
+        lawyers = set(name for side, name in doc['lawyer_names_lst'])
+        for name, n_interruptions in doc['interruptions_dict'].iteritems():
+            if name in JUSTICE_NAMES and name not in lawyers and n_interruptions:
+                counts[(int(doc['term']), name)] += n_interruptions
+    return counts
+
+def _mean_polarity_by_side(table):
+    """
+    The aggregation statement_table.mean_polarity_by_side over the stored documents
+    """
+    sums = collections.Counter()
+    counts = collections.Counter()
+    for doc in table.find(['sentiment_dict', 'lawyer_names_lst']):
+        lawyer_sides = {name: side for side, name in doc['lawyer_names_lst']}
+        for name, polarities in doc['sentiment_dict'].iteritems():
+            side = lawyer_sides.get(name, 'JUSTICE' if name in JUSTICE_NAMES else None)
+            if side is not None:
+                sums[side] += sum(polarities)
+                counts[side] += len(polarities)
+    return {side: sums[side] / counts[side] for side in counts if counts[side]}
+
+def bench_statements(table, n_dockets=200, seed=0):
+    """
+    Time corpus-wide aggregations over the Mongo documents against the statement_table export
+    of the same synthetic corpus
+    :return: dict of label -> seconds
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        statements_dir = os.path.join(folder, 'statements')
+        table.clear()
+        writer = bulk_writer.Bulk_Writer(table)
+        statement_writer = statement_table.Statement_Table_Writer(statements_dir)
+        for doc, count_problems, columns in pipeline.run(_corpus_tasks(metadata_file, oral_argument_folder),
+                                                         statement_columns=True):
+            writer.add(doc)
+            statement_writer.add(*columns)
+        writer.flush()
+        statement_writer.close()
+
+        results = {}
+        start = time.time()
+        _interruptions_per_justice_per_term(table)
+        results['mongo.interruptions_per_justice_per_term'] = time.time() - start
+
+        start = time.time()
+        statement_table.interruptions_per_justice_per_term(
+            statement_table.read_statements(statements_dir, columns=['speaker', 'side', 'interrupted']))
+        results['parquet.interruptions_per_justice_per_term'] = time.time() - start
+
+        start = time.time()
+        _mean_polarity_by_side(table)
+        results['mongo.mean_polarity_by_side'] = time.time() - start
+
+        start = time.time()
+        statement_table.mean_polarity_by_side(statement_table.read_statements(statements_dir,
+                                                                              columns=['side', 'polarity']))
+        results['parquet.mean_polarity_by_side'] = time.time() - start
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def bench_background_writes(table, n_dockets=200, seed=0, batch_size=20):
+    """
+    End-to-end dockets/sec of the pipeline writing through Bulk_Writer (parsing and writes
+    alternate) and through Background_Writer (writes overlap with parsing), on a synthetic corpus
+    :param table: storage table, or a _Discard_Table simulating write latency
+    :return: dict of label -> dockets/sec
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        tasks = _corpus_tasks(metadata_file, oral_argument_folder)
+        # Warm the polarity cache, so that both paths parse at the same speed
+        for _ in pipeline.run(tasks):
+            pass
+
+        results = {}
+        for label, writer_class in (('synchronous', bulk_writer.Bulk_Writer),
+                                    ('background', bulk_writer.Background_Writer)):
+            table.clear()
+            start = time.time()
+            writer = writer_class(table, batch_size)
+            for doc, count_problems, columns in pipeline.run(tasks):
+                writer.add(doc)
+            writer.close()
+            results[label] = writer.n_written / (time.time() - start)
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def bench_storage(mongo_storage=None, n_dockets=200, seed=0, batch_size=100):
+    """
+    Write the documents of a synthetic corpus to every storage backend and rebuild the
+    aggregates from them
+    :param mongo_storage: storage.Mongo_Storage to include Mongo (None = SQLite and JSONL only)
+    :return: dict of backend -> (docs/sec, MB/sec, aggregate rebuild seconds)
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        docs = [doc for doc, count_problems, columns in pipeline.run(_corpus_tasks(metadata_file,
+                                                                                     oral_argument_folder))]
+        n_mb = sum(len(storage._dumps(doc)) for doc in docs) / 1e6
+
+        backends = [('sqlite', storage.SQLite_Storage(os.path.join(folder, 'benchmark.db'))),
+                    ('jsonl', storage.JSONL_Storage(os.path.join(folder, 'jsonl')))]
+        if mongo_storage is not None:
+            backends.append(('mongo', mongo_storage))
+
+        results = {}
+        for name, storage_obj in backends:
+            table = storage_obj.table('data')
+            table.clear()
+            start = time.time()
+            writer = bulk_writer.Bulk_Writer(table, batch_size)
+            for doc in docs:
+                writer.add(dict(doc))
+            writer.close()
+            seconds = time.time() - start
+
+            start = time.time()
+            aggregates.rebuild(storage_obj, 'data')
+            results[name] = (writer.n_written / seconds, n_mb / seconds, time.time() - start)
+            storage_obj.close()
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.time()
+sys.path.insert(0, %(repo_dir)r)
+import preprocessing
+imported = time.time()
+preprocessing.Preprocessing(%(metadata_file)r, %(oral_argument_folder)r, storage_url=%(storage_url)r,
+                            cache_dir=%(cache_dir)r)
+print json.dumps({'import': imported - start, 'construct': time.time() - imported,
+                  'pymongo': 'pymongo' in sys.modules, 'textblob': 'textblob' in sys.modules})
+"""
+
+def bench_startup(n_dockets=9000, seed=0, repeat=3, pre_2000_rate=0.8):
+    """
+    Time from a fresh interpreter to a constructed Preprocessing (imports, metadata and the
+    docket intersection) on a synthetic metadata file of n_dockets with a small corpus, writing
+    to JSONL so that no server is involved. Like the SCDB file (terms from 1946), most of the
+    dockets are argued before 2000 (pre_2000_rate):
+        no_cache: without a cache_dir, the metadata CSV is parsed and collapsed
+        cold: with an empty cache_dir (the collapsed metadata is pickled there)
+        warm: with the cache_dir of the cold run
+    :return: dict of label -> (import seconds, construct seconds, pymongo imported, textblob imported),
+             the fastest of repeat runs
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        corpus = synthetic.Synthetic_Corpus(n_dockets, seed, pre_2000_rate=pre_2000_rate)
+        metadata_file, oral_argument_folder = corpus.write(folder, 20)
+        script_kwargs = {'repo_dir': os.path.dirname(os.path.abspath(__file__)), 'metadata_file': metadata_file,
+                         'oral_argument_folder': oral_argument_folder,
+                         'storage_url': 'jsonl://' + os.path.join(folder, 'jsonl')}
+        results = {}
+        for label in ('no_cache', 'cold', 'warm'):
+            runs = []
+            for i in range(repeat):
+                cache_dir = None
+                if label != 'no_cache':
+                    cache_dir = os.path.join(folder, 'cache')
+                    if label == 'cold' and os.path.isdir(cache_dir):
+                        shutil.rmtree(cache_dir)
+                output = subprocess.check_output([sys.executable, '-c',
+                                                  _STARTUP_SCRIPT % dict(script_kwargs, cache_dir=cache_dir)])
+                timings = json.loads(output.strip().splitlines()[-1])
+                runs.append((timings['import'], timings['construct'], timings['pymongo'], timings['textblob']))
+            results[label] = min(runs, key=lambda run: run[0] + run[1])
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def bench_recompute(n_dockets=200, seed=0, stages=('sentiment', 'interruptions', 'segment', 'clean')):
+    """
+    Seconds of a full run of a synthetic corpus into SQLite against re-running one stage (and the
+    stages depending on it) on the stored documents with recompute.py. Each recompute scores
+    with a fresh polarity cache, as after a change to the scorer.
+    :return: dict of label -> seconds
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        obj = preprocessing.Preprocessing(metadata_file, oral_argument_folder,
+                                          storage_url='sqlite://' + os.path.join(folder, 'benchmark.db'))
+        results = {}
+        start = time.time()
+        obj.insert_intersect_docket_meta_oral()
+        results['full_run'] = time.time() - start
+        for stage in stages:
+            scorer = cache.Caching_Scorer(polarity.Lexicon_Scorer(textblob_compatible=True),
+                                          cache.LRU_Cache(sentiment.POLARITY_CACHE_SIZE))
+            start = time.time()
+            recompute.recompute(obj.storage, [stage], oral_argument_folder=oral_argument_folder, scorer=scorer)
+            results['recompute_' + stage] = time.time() - start
+        obj.storage.close()
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def bench_index(n_dockets=200, seed=0, queries=('speaker:SCALIA', 'speaker:SCALIA court',
+                                                'interrupts:PETITIONER side:JUSTICE',
+                                                'interrupted:1 -side:JUSTICE statute|congress')):
+    """
+    Milliseconds per query of the inverted index against scanning the stored statements of a
+    synthetic corpus (already read into memory, so the scan is a lower bound), and the index size
+    :return: dict of label -> value
+    """
+    folder = tempfile.mkdtemp(prefix='scotus_benchmark_')
+    try:
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(n_dockets, seed).write(folder)
+        index_path = os.path.join(folder, 'index.pkl')
+        obj = preprocessing.Preprocessing(metadata_file, oral_argument_folder,
+                                          storage_url='sqlite://' + os.path.join(folder, 'benchmark.db'))
+        obj.insert_intersect_docket_meta_oral(index_path=index_path)
+        docs = list(obj.tab.find(['statements', 'lawyer_names_lst']))
+        obj.storage.close()
+
+        results = {'n_statements': sum(len(doc['statements']) for doc in docs),
+                   'index_mb': os.path.getsize(index_path) / 1e6}
+        start = time.time()
+        index_obj = inverted_index.Inverted_Index.load(index_path)
+        results['index_load_ms'] = 1000 * (time.time() - start)
+        for text in queries:
+            query = inverted_index.parse_query(text)
+            start = time.time()
+            n_hits = len(index_obj.search(query))
+            results['index_ms ' + text] = 1000 * (time.time() - start)
+
+            # The scan evaluates the same conditions on the facets of every statement
+            start = time.time()
+            n_scan_hits = 0
+            for doc in docs:
+                for keys in inverted_index.statement_facets(doc['statements'], doc['lawyer_names_lst']):
+                    n_scan_hits += _matches(query, keys)
+            results['scan_ms ' + text] = 1000 * (time.time() - start)
+            if n_hits != n_scan_hits:
+                raise AssertionError('%s: %s hits in the index, %s scanning' % (text, n_hits, n_scan_hits))
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+def _matches(query, keys):
+    """
+    True if a statement with index keys keys matches query, see inverted_index.parse_query
+    """
+    if query[0] == 'and':
+        return all(_matches(subquery, keys) for subquery in query[1:])
+    if query[0] == 'or':
+        return any(_matches(subquery, keys) for subquery in query[1:])
+    if query[0] == 'not':
+        return not _matches(query[1], keys)
+    return '%s:%s' % query in keys
+
+def find_regressions(results, baseline, threshold=0.25, memory_threshold=0.25):
+    """
+    Compare results to a baseline from bench_suite. A metric regresses when it is more than
+    threshold (memory_threshold for memory) worse than the baseline, relative to the baseline
+    Metrics without a direction (corpus size) are not compared.
+    :return: list of messages, one per regression
+    """
+    regressions = []
+    for name, baseline_metric in sorted(baseline['metrics'].items()):
+        metric = results['metrics'].get(name)
+        if (metric is None) or (baseline_metric['higher_is_better'] is None) or (baseline_metric['value'] <= 0):
+            continue
+        change = (metric['value'] - baseline_metric['value']) / float(baseline_metric['value'])
+        if baseline_metric['higher_is_better']:
+            change = -change
+        limit = memory_threshold if baseline_metric['unit'] == 'MB' else threshold
+        if change > limit:
+            regressions.append('%s: %.4g %s vs. baseline %.4g %s (%+.0f%% worse, limit %.0f%%)' %
+                               (name, metric['value'], metric['unit'], baseline_metric['value'],
+                                baseline_metric['unit'], 100 * change, 100 * limit))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Performance benchmarks for the preprocessing pipeline')
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    bulk_parser = subparsers.add_parser('bulk_writes', help='per-document insert vs. batched bulk insert')
+    bulk_parser.add_argument('--mongomock', action='store_true', help='use mongomock instead of a local mongod')
+    bulk_parser.add_argument('--n-docs', type=int, default=500)
+    bulk_parser.add_argument('--text-kb', type=int, default=200)
+
+    metadata_parser = subparsers.add_parser('metadata', help='metadata collapse and docket lookup')
+    metadata_parser.add_argument('metadata_file', help='SCDB justice-centered CSV')
+
+    clean_parser = subparsers.add_parser('clean_data', help='Clean_Data throughput on real transcripts')
+    clean_parser.add_argument('oral_argument_folder')
+    clean_parser.add_argument('--limit', type=int, default=None, help='only use the first LIMIT transcripts')
+
+    sentiment_parser = subparsers.add_parser('sentiment', help='TextBlob vs. batched lexicon polarity scoring')
+    sentiment_parser.add_argument('oral_argument_folder')
+    sentiment_parser.add_argument('--limit', type=int, default=None, help='only use the first LIMIT transcripts')
+
+    memory_parser = subparsers.add_parser('memory', help='peak RSS against corpus size, old vs. streaming path')
+    memory_parser.add_argument('oral_argument_folder')
+    memory_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 400, 1600],
+                               help='corpus sizes (dockets) to simulate by cycling through the transcripts')
+    memory_parser.add_argument('--n-workers', type=int, default=2)
+    memory_parser.add_argument('--write-delay', type=float, default=0.005, help='seconds per document written')
+
+    statements_parser = subparsers.add_parser('statements', help='aggregations over Mongo vs. the Parquet export')
+    statements_parser.add_argument('--mongomock', action='store_true', help='use mongomock instead of a local mongod')
+    statements_parser.add_argument('--n-dockets', type=int, default=200)
+    statements_parser.add_argument('--seed', type=int, default=0)
+
+    background_parser = subparsers.add_parser('background_writes',
+                                              help='end-to-end throughput, synchronous vs. background writes')
+    background_parser.add_argument('--mongomock', action='store_true', help='use mongomock instead of a local mongod')
+    background_parser.add_argument('--write-delay', type=float, default=None,
+                                   help='instead of Mongo, drop the documents after WRITE_DELAY seconds each')
+    background_parser.add_argument('--n-dockets', type=int, default=200)
+    background_parser.add_argument('--seed', type=int, default=0)
+    background_parser.add_argument('--batch-size', type=int, default=20)
+
+    storage_parser = subparsers.add_parser('storage', help='write throughput of the storage backends')
+    storage_parser.add_argument('--mongo', choices=['none', 'mongomock', 'local'], default='none',
+                                help='also benchmark Mongo (mongomock or the local mongod)')
+    storage_parser.add_argument('--n-dockets', type=int, default=200)
+    storage_parser.add_argument('--seed', type=int, default=0)
+    storage_parser.add_argument('--batch-size', type=int, default=100)
+
+    startup_parser = subparsers.add_parser('startup', help='import and Preprocessing construction time, '
+                                                           'without, with a cold and with a warm metadata cache')
+    startup_parser.add_argument('--n-dockets', type=int, default=9000, help='dockets of the metadata file')
+    startup_parser.add_argument('--seed', type=int, default=0)
+    startup_parser.add_argument('--repeat', type=int, default=3, help='timings are the best of REPEAT runs')
+
+    recompute_parser = subparsers.add_parser('recompute', help='full run vs. re-running single stages')
+    recompute_parser.add_argument('--n-dockets', type=int, default=200)
+    recompute_parser.add_argument('--seed', type=int, default=0)
+
+    index_parser = subparsers.add_parser('index', help='inverted index queries vs. scanning the statements')
+    index_parser.add_argument('--n-dockets', type=int, default=200)
+    index_parser.add_argument('--seed', type=int, default=0)
+
+    suite_parser = subparsers.add_parser('suite', help='per-stage and end-to-end benchmarks on a synthetic corpus')
+    suite_parser.add_argument('--n-dockets', type=int, default=200)
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument('--repeat', type=int, default=3, help='stage timings are the best of REPEAT runs')
+    suite_parser.add_argument('--output', help='write the results (JSON) here, e.g. to record a new baseline')
+    suite_parser.add_argument('--baseline', help='JSON results of a previous run to check for regressions, '
+                                                 'e.g. benchmark_baseline.json (recorded with the defaults, '
+                                                 'timings are only comparable on the same machine)')
+    suite_parser.add_argument('--threshold', type=float, default=0.25,
+                              help='fraction by which a timing or throughput may be worse than the baseline')
+    suite_parser.add_argument('--memory-threshold', type=float, default=0.25,
+                              help='fraction by which peak memory may be worse than the baseline')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'bulk_writes':
+        tab = _get_collection(args.mongomock, 'scotus_benchmark', 'bulk_writes')
+        for label, docs_per_sec in sorted(bench_bulk_writes(tab, args.n_docs, args.text_kb).items()):
+            print '%-15s %10.1f docs/sec' % (label, docs_per_sec)
+
+    elif args.benchmark == 'metadata':
+        for label, seconds in sorted(bench_metadata(args.metadata_file).items()):
+            print '%-20s %8.3f s' % (label, seconds)
+
+    elif args.benchmark == 'clean_data':
+        for label, mb_per_sec in sorted(bench_clean_data(_read_transcripts(args.oral_argument_folder,
+                                                                           args.limit)).items()):
+            print '%-10s %8.1f MB/sec' % (label, mb_per_sec)
+
+    elif args.benchmark == 'sentiment':
+        docket_spans = _docket_spans(_read_transcripts(args.oral_argument_folder, args.limit))
+        for label, (statements_per_sec, max_diff) in sorted(bench_sentiment(docket_spans).items()):
+            print '%-20s %10.1f statements/sec  max |diff| to TextBlob %.2e' % (label, statements_per_sec, max_diff)
+
+    elif args.benchmark == 'memory':
+        results = bench_memory(args.oral_argument_folder, args.sizes, args.n_workers, args.write_delay)
+        print '%-10s %18s %18s %18s' % ('dockets', 'pool_imap', 'bounded_pipeline', 'streaming')
+        for n_dockets in args.sizes:
+            print '%-10s %15.1f MB %15.1f MB %15.1f MB' % (n_dockets, results[('pool_imap', n_dockets)],
+                                                           results[('bounded_pipeline', n_dockets)],
+                                                           results[('streaming', n_dockets)])
+
+    elif args.benchmark == 'statements':
+        table = storage.Mongo_Table(_get_collection(args.mongomock, 'scotus_benchmark', 'statements'))
+        for label, seconds in sorted(bench_statements(table, args.n_dockets, args.seed).items()):
+            print '%-45s %8.3f s' % (label, seconds)
+
+    elif args.benchmark == 'background_writes':
+        if args.write_delay is not None:
+            table = _Discard_Table(args.write_delay)
+        else:
+            table = storage.Mongo_Table(_get_collection(args.mongomock, 'scotus_benchmark', 'background_writes'))
+        for label, dockets_per_sec in sorted(bench_background_writes(table, args.n_dockets, args.seed,
+                                                                     args.batch_size).items()):
+            print '%-15s %10.1f dockets/sec' % (label, dockets_per_sec)
+
+    elif args.benchmark == 'storage':
+        mongo_storage = None
+        if args.mongo == 'mongomock':
+            import mongomock
+            mongo_storage = storage.Mongo_Storage('scotus_benchmark', client=mongomock.MongoClient())
+        elif args.mongo == 'local':
+            mongo_storage = storage.Mongo_Storage('scotus_benchmark')
+        results = bench_storage(mongo_storage, args.n_dockets, args.seed, args.batch_size)
+        for name, (docs_per_sec, mb_per_sec, aggregate_seconds) in sorted(results.items()):
+            print '%-8s %10.1f docs/sec %8.1f MB/sec   aggregates rebuilt in %.3f s' % (name, docs_per_sec,
+                                                                                     mb_per_sec, aggregate_seconds)
+
+    elif args.benchmark == 'startup':
+        results = bench_startup(args.n_dockets, args.seed, args.repeat)
+        for label in ('no_cache', 'cold', 'warm'):
+            import_seconds, construct_seconds, pymongo_imported, textblob_imported = results[label]
+            print '%-10s import %6.3f s  construct %6.3f s  total %6.3f s  (pymongo %s, textblob %s)' % (
+                label, import_seconds, construct_seconds, import_seconds + construct_seconds,
+                'imported' if pymongo_imported else 'not imported', 'imported' if textblob_imported else 'not imported')
+
+    elif args.benchmark == 'recompute':
+        results = bench_recompute(args.n_dockets, args.seed)
+        for label, seconds in sorted(results.items(), key=lambda item: item[1]):
+            print '%-25s %8.2f s  (%3.0f%% of the full run)' % (label, seconds, 100 * seconds / results['full_run'])
+
+    elif args.benchmark == 'index':
+        results = bench_index(args.n_dockets, args.seed)
+        print '%s statements, index %.2f MB, loaded in %.1f ms' % (results['n_statements'], results['index_mb'],
+                                                                   results['index_load_ms'])
+        for label in sorted(results):
+            if label.startswith('index_ms '):
+                text = label[len('index_ms '):]
+                print '%-45s index %8.2f ms   scan %8.1f ms' % (text, results[label], results['scan_ms ' + text])
+
+    elif args.benchmark == 'suite':
+        results = bench_suite(args.n_dockets, args.seed, args.repeat)
+        for name, metric in sorted(results['metrics'].items()):
+            print '%-40s %12.4g %s' % (name, metric['value'], metric['unit'])
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline['config'] != results['config']:
+                print 'Warning: baseline was recorded with %s, this run used %s' % (baseline['config'],
+                                                                                   results['config'])
+            regressions = find_regressions(results, baseline, args.threshold, args.memory_threshold)
+            for regression in regressions:
+                print 'REGRESSION', regression
+            if regressions:
+                sys.exit(1)
+            print 'No regressions against', args.baseline
@@ -0,0 +1,185 @@
+import Queue
+import threading
+import time
+
+class Bulk_Writer(object):
+    """
+    Objective: Write documents to a storage table (storage.py) in batches instead of one
+    round trip per document
+
+    Documents are buffered until either batch_size documents or max_batch_bytes
+    (table.doc_size, BSON size for Mongo) are reached, then written with a single
+    table.write_batch (an unordered insert_many for Mongo). Tables without a doc_size have no
+    byte limit and their documents are not sized.
+    A failing document does not stop the rest of its batch or the run; failures
+    are counted and reported per batch.
+    With upsert=True documents replace any stored document with the same _id. With
+    update_fields=True documents only hold _id and the fields to set (table.update_batch).
+    A batch that fails with a transient error (table.transient_errors) is retried up to max_retries
+    times, waiting backoff_seconds, then twice as long, ... in between.
+    """
+    def __init__(self, table, batch_size=100, max_batch_bytes=16 * 1024 * 1024, upsert=False,
+                 max_retries=5, backoff_seconds=0.5, update_fields=False):
+        self.table = table
+        self.upsert = upsert
+        self.update_fields = update_fields
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.n_batches = 0
+        self.n_written = 0
+        self.n_failed = 0
+        self.failed_ids = []
+        self.n_retries = 0
+
+    def add(self, doc):
+        """
+        Buffer a document, flushing first if it would push the batch over max_batch_bytes
+        and after if the batch is full
+        """
+        doc_bytes = self.table.doc_size(doc) if self.table.doc_size is not None else 0
+        if self.buffer and (self.buffer_bytes + doc_bytes > self.max_batch_bytes):
+            self.flush()
+
+        self.buffer.append(doc)
+        self.buffer_bytes += doc_bytes
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered documents with one unordered bulk insert (or bulk upsert)
+        """
+        if not self.buffer:
+            return
+
+        batch = self.buffer
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.n_batches += 1
+        self._write_batch(batch, self.n_batches)
+
+    def sync(self):
+        """
+        Write what is buffered, returns once it is written (n_written, failed_ids are up to date)
+        """
+        self.flush()
+
+    def close(self):
+        """
+        Write what is still buffered
+        """
+        self.flush()
+
+    def _write_batch(self, batch, batch_number):
+        """
+        Write one batch, retrying transient errors with exponential backoff
+        """
+        retry = 0
+        while True:
+            try:
+                self._write_batch_once(batch, batch_number, retry)
+                return
+            except self.table.transient_errors as e:
+                if retry >= self.max_retries:
+                    raise
+                wait = self.backoff_seconds * 2 ** retry
+                print 'Batch %s: %s, retrying in %.1f s' % (batch_number, e, wait)
+                time.sleep(wait)
+                retry += 1
+                self.n_retries += 1
+
+    def _write_batch_once(self, batch, batch_number, retry=0):
+        if self.update_fields:
+            failed = self.table.update_batch(batch, retry > 0)
+        else:
+            failed = self.table.write_batch(batch, self.upsert, retry > 0)
+        self.n_written += len(batch) - len(failed)
+        self.n_failed += len(failed)
+        for index, message in failed:
+            self.failed_ids.append(batch[index].get('_id'))
+        if failed:
+            print 'Batch %s: %s of %s documents failed (%s)' % (batch_number, len(failed), len(batch), failed[0][1])
+
+
+class Background_Writer(Bulk_Writer):
+    """
+    Objective: Same batches as Bulk_Writer, but written by a background thread so that parsing
+    the next dockets overlaps with the writes
+
+    Full batches go through a queue of at most max_queued_batches batches: when the storage falls
+    behind, add() blocks until the thread catches up, so memory stays bounded. The thread is
+    the only one touching the table and the counters until close() returns. Once a batch
+    fails with an error that could not be retried away, the later batches are dropped and the
+    error is raised again by every add(), flush() and close().
+    """
+    def __init__(self, table, batch_size=100, max_batch_bytes=16 * 1024 * 1024, upsert=False,
+                 max_retries=5, backoff_seconds=0.5, max_queued_batches=4):
+        super(Background_Writer, self).__init__(table, batch_size, max_batch_bytes, upsert, max_retries,
+                                                backoff_seconds)
+        self.queue = Queue.Queue(max_queued_batches)
+        self.error = None
+        # Seconds add()/flush() spent blocked on a full queue
+        self.blocked_seconds = 0.0
+        self.thread = threading.Thread(target=self._drain, name='Background_Writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _drain(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self._write_batch(*item)
+            except Exception as e:
+                # Keep draining so that the producer never blocks on a dead writer
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def flush(self):
+        """
+        Hand the buffered documents to the background thread (blocks while the queue is full)
+        """
+        self._raise_error()
+        if not self.buffer:
+            return
+
+        batch = self.buffer
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.n_batches += 1
+        start = time.time()
+        self.queue.put((batch, self.n_batches))
+        self.blocked_seconds += time.time() - start
+
+    def sync(self):
+        """
+        Hand the buffered documents to the background thread and wait until it has written every
+        queued batch
+        """
+        self.flush()
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Write what is still buffered, wait for the thread to write every batch and stop it
+        """
+        if self.thread.is_alive():
+            try:
+                self.flush()
+            finally:
+                self.queue.put(None)
+                self.thread.join()
+        self._raise_error()
@@ -0,0 +1,167 @@
+import collections
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+
+def text_key(text):
+    """
+    Returns the content address (sha1) of a text
+    """
+    return hashlib.sha1(text).hexdigest()
+
+class LRU_Cache(object):
+    """
+    Objective: In-process key -> value cache holding at most max_size entries, evicting the
+    least recently used one first
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Re-insert as the most recently used
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.entries)}
+
+class Disk_Cache(object):
+    """
+    Objective: Keep pickled results on disk across runs, addressed by the hash of their input
+    text and the version of the code that produced them
+
+    Entries are files <directory>/<namespace>-<version>-<key>.pkl, written to a temporary
+    file and renamed so that concurrent worker processes never read a partial entry.
+    When the directory grows over max_bytes the least recently used entries (by mtime, which
+    a hit refreshes) are removed until it is back under low_watermark * max_bytes.
+    """
+    def __init__(self, directory, namespace, version, max_bytes=1 << 30, low_watermark=0.8):
+        self.directory = directory
+        self.namespace = namespace
+        self.version = version
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created by another worker in the meantime
+                if not os.path.isdir(directory):
+                    raise
+        self.total_bytes = sum(size for fpath, mtime, size in self._list_entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s-%s-%s.pkl' % (self.namespace, self.version, key))
+
+    def _list_entries(self):
+        """
+        Returns (fpath, mtime, size) of every entry in the directory
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            if not fname.endswith('.pkl'):
+                continue
+            fpath = os.path.join(self.directory, fname)
+            try:
+                stat = os.stat(fpath)
+            except OSError:
+                continue
+            entries.append((fpath, stat.st_mtime, stat.st_size))
+        return entries
+
+    def get(self, key, default=None):
+        fpath = self._path(key)
+        try:
+            with open(fpath, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(fpath, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        fd, tmp_fpath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        self.total_bytes += os.path.getsize(tmp_fpath)
+        os.rename(tmp_fpath, self._path(key))
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the directory is under low_watermark * max_bytes
+        """
+        entries = sorted(self._list_entries(), key=lambda entry: entry[1])
+        self.total_bytes = sum(size for fpath, mtime, size in entries)
+        for fpath, mtime, size in entries:
+            if self.total_bytes <= self.low_watermark * self.max_bytes:
+                break
+            try:
+                os.remove(fpath)
+            except OSError:
+                # Already evicted by another worker
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'bytes': self.total_bytes}
+
+class Caching_Scorer(object):
+    """
+    Objective: Memoize a polarity scorer (see polarity.py) per statement text, so repeated
+    boilerplate ("Thank you, counsel.") is only scored once per process
+    """
+    def __init__(self, scorer, lru_cache):
+        self.scorer = scorer
+        self.cache = lru_cache
+
+    def score(self, texts):
+        scores = [self.cache.get(text) for text in texts]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            # Score every miss of the batch in one call
+            for i, score in zip(missing, self.scorer.score([texts[i] for i in missing])):
+                scores[i] = score
+                self.cache.put(texts[i], score)
+        return scores
+
+# One cache per process and configuration, shared by every docket a worker processes
+_disk_caches = {}
+
+def get_disk_cache(directory, namespace, version, max_bytes=1 << 30):
+    """
+    Returns this process' Disk_Cache for the given configuration
+    """
+    config = (directory, namespace, version, max_bytes)
+    if config not in _disk_caches:
+        _disk_caches[config] = Disk_Cache(directory, namespace, version, max_bytes)
+    return _disk_caches[config]
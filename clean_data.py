@@ -1,11 +1,67 @@
 import pandas as pd
 import re
 
+# Extraneous words & phrases removed from every transcript
+REPLACE_STRINGS = ("ALDERSON REPORTING COMPANY, INC.",
+                   "1111 FOURTEENTH STREET, N.W.",
+                   "SUITE 400",
+                   "WASHINGTON, D.C. 20005",
+                   "(202)289-2260",
+                   "(800) FOR DEPO",
+                   "800-FOR-DEPO",
+                   "Alderson Reporting Company",
+                   "Official",
+                   )
+
+# Markers of the beginning/end of the oral argument, in priority order
+START_MARKERS = ('PROCEEDING',
+                 'P ROCEEDING',
+                 'PR OCEEDING',
+                 'PRO CEEDING',
+                 'R O C E E D I',
+                 'PROCEDINGS',
+                 ' OCEEDINGS',
+                 'above-entitled matter came on for oral',
+                 'The above-entitled argument before the Supreme',
+                 )
+END_MARKERS = ('above-entitled matter was submitted.',
+               'case is submitted.',
+               'case is now submitted.',
+               'above- entitled matter was submitted.',
+               )
+
+# Once whitespace is collapsed the only whitespace left is ' ', and a literal first
+# character lets re jump straight to candidate positions instead of testing \s everywhere
+LINE_NUMBER_RE = re.compile(r' \d+')
+POTENTIAL_LAWYER_RE = re.compile('ORAL ARGUMENT OF (.+?):')
+
+# Attributes update_class_variables sets, i.e. what a cached result has to restore
+OUTPUT_ATTRIBUTES = ('oral_text', 'oral_text_start', 'oral_text_end', 'count_problems',
+                     'potential_lawyers', 'lawyer_names_lst', 'lawyer_names_dict')
+
+def find_first_marker(text, markers):
+    """
+    Returns the position of the first occurrence of the highest priority marker found in
+    text, or -1 if none of the markers is in text
+    str.find is a C-level search, which measured faster than scanning once with a single
+    alternation regex of all the markers
+    """
+    for marker in markers:
+        position = text.find(marker)
+        if position != -1:
+            return position
+    return -1
+
 class Clean_Data(object):
 
-    def __init__(self, docket, oral_text):
+    def __init__(self, docket, oral_text, instrumentation_obj=None):
+        """
+        :param instrumentation_obj: instrumentation.Instrumentation counting the markers and
+                                    lawyers that could not be found (None = not counted)
+        """
         self.docket = docket
         self.oral_text = oral_text
+        self.instrumentation_obj = instrumentation_obj
         self.oral_text_start = None
         self.oral_text_end = None
         self.count_problems = 0
@@ -17,18 +73,7 @@ class Clean_Data(object):
         """
         Remove extraneous words & phrases from text
         """
-        replace_strings = ["ALDERSON REPORTING COMPANY, INC.",
-                           "1111 FOURTEENTH STREET, N.W.",
-                           "SUITE 400",
-                           "WASHINGTON, D.C. 20005",
-                           "(202)289-2260",
-                           "(800) FOR DEPO",
-                           "800-FOR-DEPO",
-                           "Alderson Reporting Company",
-                           "Official",
-                           ]
-
-        for s in replace_strings:
+        for s in REPLACE_STRINGS:
             self.oral_text = self.oral_text.replace(s, '')
 
     def remove_extra_whitespace(self):
@@ -40,31 +85,15 @@ class Clean_Data(object):
     def perform_regex(self):
         """
         Perform regex to remove unnecessary numbers from the text
+        Expects remove_extra_whitespace to have run first
         """
-        self.oral_text = re.sub(r'\s\d+', '', self.oral_text)
+        self.oral_text = LINE_NUMBER_RE.sub('', self.oral_text)
 
     def find_beginning_of_oral_argument(self):
         """
         Identify the beginning of the text of the actual oral argument
         """
-        self.oral_text_start = self.oral_text.find('PROCEEDING')
-
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('P ROCEEDING')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('PR OCEEDING')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('PRO CEEDING')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('R O C E E D I')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('PROCEDINGS')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find(' OCEEDINGS')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('above-entitled matter came on for oral')
-        if self.oral_text_start == -1:
-            self.oral_text_start = self.oral_text.find('The above-entitled argument before the Supreme')
+        self.oral_text_start = find_first_marker(self.oral_text, START_MARKERS)
 
         if self.oral_text_start == -1:
             print self.docket, self.oral_text_start, " -- CANNOT FIND START OF ORAL ARGUMENT"
@@ -75,14 +104,7 @@ class Clean_Data(object):
         Identify the end of the text of the actual oral argument
         """
 
-        self.oral_text_end = self.oral_text.find('above-entitled matter was submitted.')
-    
-        if self.oral_text_end == -1:
-            self.oral_text_end = self.oral_text.find('case is submitted.')
-        if self.oral_text_end == -1:
-            self.oral_text_end = self.oral_text.find('case is now submitted.')
-        if self.oral_text_end == -1:
-            self.oral_text_end = self.oral_text.find('above- entitled matter was submitted.')
+        self.oral_text_end = find_first_marker(self.oral_text, END_MARKERS)
 
         if (self.oral_text_start == -1) or (self.oral_text_end == -1):
             print self.docket, self.oral_text_start, self.oral_text_end, " -- CANNOT FIND START AND/OR END OF ORAL ARGUMENT"
@@ -95,9 +117,10 @@ class Clean_Data(object):
         count = 0
         petitioner_count = 0
         respondent_count = 0
-        slce = slice(self.oral_text_start, self.oral_text_end)
+        # Scan the argument in place instead of copying the slice
+        start, end, _ = slice(self.oral_text_start, self.oral_text_end).indices(len(self.oral_text))
 
-        potential_lawyers_1 = re.findall('ORAL ARGUMENT OF (.+?):', self.oral_text[slce])
+        potential_lawyers_1 = POTENTIAL_LAWYER_RE.findall(self.oral_text, start, end)
         # The one below is good except no way to find petitioner respondent.
         # potential_lawyers_2 = re.findall('ORAL ARGUMENT OF (.+?) ON BEHALF     OF', self.oral_text[slce])
 
@@ -118,6 +141,20 @@ class Clean_Data(object):
             # print self.potential_lawyers
             self.count_problems += 1
 
+    def update_instrumentation(self):
+        """
+        Count the markers and lawyer sides that could not be found (also used for results
+        restored from a cache)
+        """
+        if self.instrumentation_obj is None:
+            return
+        if self.oral_text_start == -1:
+            self.instrumentation_obj.count('start_marker_not_found')
+        if self.oral_text_end == -1:
+            self.instrumentation_obj.count('end_marker_not_found')
+        if self.count_problems:
+            self.instrumentation_obj.count('lawyer_side_not_found', self.count_problems)
+
     def update_class_variables(self):
         """
         Execute the functions of this class
@@ -129,3 +166,4 @@ class Clean_Data(object):
         self.find_beginning_of_oral_argument()
         self.find_end_of_oral_argument()
         self.identify_lawyers_as_petitioner_respondent()
+        self.update_instrumentation()
@@ -0,0 +1,178 @@
+import collections
+import contextlib
+import csv
+import json
+import os
+import time
+
+# Upper bounds (ms) of the per-docket latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+def _cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+@contextlib.contextmanager
+def null_stage(name, docket=None, n_bytes=0):
+    """
+    Stand-in for Instrumentation.stage when a run is not instrumented
+    """
+    yield
+
+def stage_timer(instrumentation_obj):
+    """
+    Returns instrumentation_obj.stage, or null_stage if instrumentation_obj is None
+    """
+    return instrumentation_obj.stage if instrumentation_obj is not None else null_stage
+
+class Instrumentation(object):
+    """
+    Objective: Record where an ingestion run spends its time: wall and CPU time and bytes per
+    stage, latency per docket, and counters of the problems the stages run into
+
+    Workers of a process pool fill their own Instrumentation, which the parent merges.
+    """
+    def __init__(self):
+        # stage name -> {'calls', 'wall_seconds', 'cpu_seconds', 'bytes'}, in the order first seen
+        self.stages = collections.OrderedDict()
+        # docket -> {'seconds': total, 'bytes': largest text seen, <stage name>: seconds}
+        self.dockets = {}
+        self.counters = collections.Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, docket=None, n_bytes=0):
+        """
+        Time the body of the with statement as stage name (of docket, if given)
+        """
+        wall = time.time()
+        cpu = _cpu_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.time() - wall, _cpu_time() - cpu, docket, n_bytes)
+
+    def add_stage(self, name, wall_seconds, cpu_seconds, docket=None, n_bytes=0):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'bytes': 0}
+        stats['calls'] += 1
+        stats['wall_seconds'] += wall_seconds
+        stats['cpu_seconds'] += cpu_seconds
+        stats['bytes'] += n_bytes
+
+        if docket is not None:
+            docket_stats = self.dockets.get(docket)
+            if docket_stats is None:
+                docket_stats = self.dockets[docket] = {'seconds': 0.0, 'bytes': 0}
+            docket_stats['seconds'] += wall_seconds
+            docket_stats['bytes'] = max(docket_stats['bytes'], n_bytes)
+            docket_stats[name] = docket_stats.get(name, 0.0) + wall_seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, other):
+        """
+        Add the measurements of another Instrumentation (e.g. a worker's) to this one
+        """
+        for name, stats in other.stages.iteritems():
+            if name not in self.stages:
+                self.stages[name] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'bytes': 0}
+            for key, value in stats.iteritems():
+                self.stages[name][key] += value
+        for docket, docket_stats in other.dockets.iteritems():
+            if docket in self.dockets:
+                for key, value in docket_stats.iteritems():
+                    if key == 'bytes':
+                        self.dockets[docket][key] = max(self.dockets[docket][key], value)
+                    else:
+                        self.dockets[docket][key] = self.dockets[docket].get(key, 0.0) + value
+            else:
+                self.dockets[docket] = dict(docket_stats)
+        self.counters.update(other.counters)
+
+    def slowest_dockets(self, n):
+        """
+        Returns the n dockets that took longest, slowest first
+        """
+        return sorted(self.dockets, key=lambda docket: self.dockets[docket]['seconds'], reverse=True)[:n]
+
+    def latency_histogram(self):
+        """
+        Returns [(bucket upper bound in ms or None for the last bucket, number of dockets)]
+        """
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for docket_stats in self.dockets.itervalues():
+            milliseconds = docket_stats['seconds'] * 1000
+            bucket = 0
+            while (bucket < len(LATENCY_BUCKETS_MS)) and (milliseconds > LATENCY_BUCKETS_MS[bucket]):
+                bucket += 1
+            counts[bucket] += 1
+        return zip(list(LATENCY_BUCKETS_MS) + [None], counts)
+
+    def latency_percentile(self, percentile):
+        """
+        Returns the per-docket latency (ms) below which percentile % of the dockets are
+        """
+        latencies = sorted(docket_stats['seconds'] * 1000 for docket_stats in self.dockets.itervalues())
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100.0))]
+
+    def report(self, n_slowest=10):
+        """
+        Returns the measurements as a JSON-serializable dict
+        """
+        stages = collections.OrderedDict()
+        for name, stats in self.stages.iteritems():
+            stages[name] = dict(stats)
+            if stats['wall_seconds'] > 0:
+                stages[name]['mb_per_sec'] = stats['bytes'] / 1e6 / stats['wall_seconds']
+        return {'stages': stages,
+                'dockets': {'count': len(self.dockets),
+                            'latency_ms': {'p50': self.latency_percentile(50),
+                                           'p90': self.latency_percentile(90),
+                                           'p99': self.latency_percentile(99),
+                                           'max': self.latency_percentile(100)},
+                            'latency_histogram_ms': [{'le': upper, 'count': count}
+                                                     for upper, count in self.latency_histogram()],
+                            'slowest': [dict(self.dockets[docket], docket=docket)
+                                        for docket in self.slowest_dockets(n_slowest)]},
+                'counters': dict(self.counters)}
+
+    def write_json(self, fpath, **run_info):
+        """
+        Write report() (plus run_info, e.g. n_workers) to fpath
+        """
+        report = self.report()
+        report['run'] = run_info
+        with open(fpath, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def write_csv(self, fpath):
+        """
+        Write one row per docket: docket, seconds, bytes and the seconds of every stage
+        """
+        stage_names = [name for name in self.stages if any(name in stats for stats in self.dockets.itervalues())]
+        with open(fpath, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(['docket', 'seconds', 'bytes'] + stage_names)
+            for docket in self.slowest_dockets(len(self.dockets)):
+                stats = self.dockets[docket]
+                writer.writerow([docket, stats['seconds'], stats['bytes']] +
+                                [stats.get(name, 0.0) for name in stage_names])
+
+    def summary(self):
+        """
+        Returns printable lines: one per stage, per-docket latency and the counters
+        """
+        lines = ['%-15s %8s %10s %10s %10s' % ('stage', 'calls', 'wall s', 'cpu s', 'MB/sec')]
+        for name, stats in self.stages.iteritems():
+            mb_per_sec = stats['bytes'] / 1e6 / stats['wall_seconds'] if stats['wall_seconds'] > 0 else 0.0
+            lines.append('%-15s %8s %10.2f %10.2f %10.1f' % (name, stats['calls'], stats['wall_seconds'],
+                                                            stats['cpu_seconds'], mb_per_sec))
+        lines.append('Docket latency: p50 %.0f ms, p90 %.0f ms, p99 %.0f ms, max %.0f ms' %
+                     tuple(self.latency_percentile(p) for p in (50, 90, 99, 100)))
+        for name, value in sorted(self.counters.iteritems()):
+            lines.append('%s: %s' % (name, value))
+        return lines
@@ -1,5 +1,67 @@
 import re
-from collections import defaultdict, Counter, deque
+import string
+from collections import Counter, deque
+import numpy as np
+import speakers
+from speakers import JUSTICE_NAMES
+
+COLON_RE = re.compile(':')
+# More than two words, i.e. len(statement.split()) > 2
+THREE_WORDS_RE = re.compile(r'\s*\S+\s+\S+\s+\S')
+# A single word followed by the first colon of the statement
+SPEAKER_NAME_RE = re.compile(r'\s*\S+\s*:')
+LOWERCASE_RE = re.compile('[a-z]')
+UPPERCASE_RE = re.compile('[A-Z]')
+# Characters that can make repr() longer than the text: backslashes, non-printable bytes and
+# single quotes (escaped when the text also has a double quote)
+REPR_ESCAPED_RE = re.compile(r'[^ -&(-\[\]-~]')
+
+def _is_upper(text, start, end):
+    """
+    Same as text[start:end].isupper() for ASCII text, without copying the slice
+    """
+    return (LOWERCASE_RE.search(text, start, end) is None) and (UPPERCASE_RE.search(text, start, end) is not None)
+
+def _repr_word_length(text, start, end):
+    """
+    Length of the word text[start:end] as the original str([word])[2:-2] round trip measured it,
+    i.e. of its repr without the quotes: backslashes and non-printable bytes are escaped, and
+    single quotes too when the word also contains a double quote. Only words with such a
+    character are copied out
+    """
+    if REPR_ESCAPED_RE.search(text, start, end) is None:
+        return end - start
+    return len(repr(text[start:end])) - 2
+
+def _speaker_id(text, start, end, registry):
+    """
+    Returns the speaker id (speakers.Speaker_Registry) of the statement text[start:end] (the single
+    upper case word before its first colon), or speakers.NO_SPEAKER
+    """
+    colon = text.find(':', start, end)
+    # Only copy the name out when it is a single word
+    if (colon == -1) or (SPEAKER_NAME_RE.match(text, start, colon + 1) is None):
+        return speakers.NO_SPEAKER
+    return registry.prefix_id(text[start:colon])
+
+def _speaker(text, start, end):
+    """
+    Returns the normalized speaker of the statement text[start:end], or None
+    """
+    registry = speakers.default_registry()
+    return registry.name(_speaker_id(text, start, end, registry))
+
+def statement_speaker(statement):
+    """
+    Returns the normalized speaker of a statement text (an element of 'statements'), or None
+    """
+    return _speaker(statement, 0, len(statement))
+
+def is_interrupted(statement, speaker):
+    """
+    Same rule as Interruptions.identify_interruptions, on a statement text
+    """
+    return (speaker is not None) and statement.endswith(' --')
 
 class Interruptions(object):
     """
@@ -16,37 +78,83 @@ class Interruptions(object):
         - Identify speech text
             - Language between speakers (Not perfect)
         - Identify speech text that ends with interruptions
+
+    Statements are kept as (start, end, speaker) offsets into oral_text, which is expected to
+    have its whitespace collapsed to single spaces (Clean_Data output).
     """
-    def __init__(self, docket, oral_text, oral_text_start, oral_text_end, lawyer_names_dict):
+    def __init__(self, docket, oral_text, oral_text_start, oral_text_end, lawyer_names_dict,
+                 instrumentation_obj=None, registry=None):
+        """
+        :param instrumentation_obj: instrumentation.Instrumentation counting statements,
+                                    interruptions and unresolved names (None = not counted)
+        :param registry: speakers.Speaker_Registry of the speaker ids (defaults to the process's)
+        """
         self.docket = docket
         self.oral_text = oral_text
         self.oral_text_start = oral_text_start
         self.oral_text_end = oral_text_end
         self.lawyer_names_dict = lawyer_names_dict
+        self.instrumentation_obj = instrumentation_obj
+        self.registry = registry if registry is not None else speakers.default_registry()
         self.oral_text_slce = slice(oral_text_start, oral_text_end)
-        self.oral_text_targeted = self.oral_text[self.oral_text_slce]
+        # Work on the argument in place: [targeted_start, targeted_end) of oral_text
+        self.targeted_start, self.targeted_end, _ = self.oral_text_slce.indices(len(oral_text))
+        self.targeted_end = max(self.targeted_start, self.targeted_end)
         self.speaker_number_of_statements_dict = None
         self.speaker_start_position_dict = {}
-        self.statements = []
+        self.colon_location_lst = None
+        # (start, end, speaker) of each statement, offsets into oral_text
+        self.spans = []
+        # Speaker id of each span (speakers.NO_SPEAKER for none)
+        self._speaker_ids = []
+        self._statements = None
+        # Interrupted statements per speaker id and per side code (speakers.SIDES)
+        self.interruption_counts = np.zeros(0, dtype=np.int32)
+        self.side_counts = np.zeros(len(speakers.SIDES), dtype=np.int32)
+        # Set by identify_interruptions from the two arrays, keyed by name for the case document
+        # (sides: PETITIONER and RESPONDENT only)
         self.interruptions_dict = Counter()
         self.interruptions_side_dict = Counter()
         self.not_lawyer_names = set()
-        self.justice_name = ['QUESTION', 'SCALIA', 'ROBERTS',
-                            'SOTOMAYOR', 'GINSBURG', 'KENNEDY',
-                            'SOUTER', 'BREYER', 'ALITO',
-                            'STEVENS', 'KAGAN', 'THOMAS',
-                            "O'CONNOR", 'REHNQUIST']
+        self.justice_name = frozenset(JUSTICE_NAMES)
+
+    @property
+    def statements(self):
+        """
+        Text of each statement, only built from self.spans when asked for
+        """
+        if self._statements is None:
+            self._statements = [self.oral_text[start:end] for start, end, speaker in self.spans]
+        return self._statements
+
+    @property
+    def speaker_ids(self):
+        """
+        Speaker id of each statement (int32 array, speakers.NO_SPEAKER for none)
+        """
+        return np.array(self._speaker_ids, dtype=np.int32)
+
+    def _add_span(self, start, end):
+        # The speaker name is normalized once per distinct name, see speakers.Speaker_Registry
+        speaker_id = _speaker_id(self.oral_text, start, end, self.registry)
+        self.spans.append((start, end, self.registry.name(speaker_id)))
+        self._speaker_ids.append(speaker_id)
 
     def identify_speakers(self):
         """
         Identify the speakers during oral arguments.
         Results should look like "<name>:"
+        The names are the runs of capital letters right before each colon, found by walking back
+        from the colons instead of matching '[A-Z]+:' over the whole argument
         """
-        speaker_lst = re.findall('[A-Z]+:', self.oral_text_targeted)
         self.speaker_number_of_statements_dict = Counter()
 
-        for name in speaker_lst:
-            self.speaker_number_of_statements_dict[name] += 1
+        for colon in self.locate_colons():
+            name_start = colon
+            while (name_start > self.targeted_start) and (self.oral_text[name_start - 1] in string.ascii_uppercase):
+                name_start -= 1
+            if name_start < colon:
+                self.speaker_number_of_statements_dict[self.oral_text[name_start:colon + 1]] += 1
 
         self.speaker_number_of_statements_dict = \
             {key: value for key, value in self.speaker_number_of_statements_dict.items() if value > 1}
@@ -55,22 +163,37 @@ class Interruptions(object):
         """
         Identify locations of colons (because statements begin with <name>:)
         """
-        return [colon.start() for colon in re.finditer(':', self.oral_text_targeted)]
+        if self.colon_location_lst is None:
+            self.colon_location_lst = [colon.start() for colon in
+                                       COLON_RE.finditer(self.oral_text, self.targeted_start, self.targeted_end)]
+        return self.colon_location_lst
 
     def identify_name_before_colon(self, colon_location_lst):
         """
         Assuming statements begin with "<name>:", find the starting position of the word immediately
         prior to the colon
+        The word is searched for in the 30 characters before the colon. Positions are clamped
+        the way slicing the argument text used to treat them (negative values wrap around).
         """
         name_start_lst = []
+        targeted_length = self.targeted_end - self.targeted_start
+
+        def to_offset(position):
+            if position < 0:
+                position = max(position + targeted_length, 0)
+            return self.targeted_start + position
 
         for end in colon_location_lst:
-            start = end - 30
-            slce = slice(start, end)
-            last_word = self.oral_text_targeted[slce].rsplit(None, 1)[-1:]
-            last_word = str(last_word)[2:-2]
-            start = end - len(last_word)
-            name_start_lst.append(start)
+            start = to_offset(end - self.targeted_start - 30)
+
+            # Last word in [start, end), ignoring a space right before the colon
+            word_end = end - 1 if (end > start and self.oral_text[end - 1] == ' ') else end
+            word_start = max(self.oral_text.rfind(' ', start, word_end) + 1, start)
+            if word_start >= word_end:
+                name_start_lst.append(end)
+            else:
+                name_start_lst.append(to_offset(end - self.targeted_start -
+                                                _repr_word_length(self.oral_text, word_start, word_end)))
 
         return name_start_lst
 
@@ -83,26 +206,33 @@ class Interruptions(object):
         statement_end_lst = deque(name_start_lst)
         statement_start_lst = deque(name_start_lst)
 
-        # name_start_lst has starting point for each phrase so add 0
-        statement_start_lst.appendleft(0)
+        # name_start_lst has starting point for each phrase so add the start of the argument
+        statement_start_lst.appendleft(self.targeted_start)
         # name_end_lst has ending point for each phrase so add the last point
-        statement_end_lst.append(len(self.oral_text_targeted))
+        statement_end_lst.append(self.targeted_end)
 
         return statement_start_lst, statement_end_lst
 
     def capture_statements(self, statement_start_lst, statement_end_lst):
         """
-        Capture each oral statement.
-        Remove extraneous words from the end of each statement.
+        Capture the span of each oral statement.
+        Remove extraneous (all caps) words from the end of each statement.
         """
+        text = self.oral_text
+        self._statements = None
+
         for statement_beg, statement_end in zip(statement_start_lst, statement_end_lst):
-            slce = slice(statement_beg, statement_end)
-            statement_tmp = self.oral_text_targeted[slce]
+            if ((THREE_WORDS_RE.match(text, statement_beg, statement_end) is not None)
+                    and (not _is_upper(text, statement_beg, statement_end))):
+                # Drop upper case words (the next speaker's title) from the end
+                while True:
+                    word_end = statement_end - 1 if text[statement_end - 1] == ' ' else statement_end
+                    cut = text.rfind(' ', statement_beg, word_end)
+                    if (cut == -1) or (not text[cut + 1:word_end].isupper()):
+                        break
+                    statement_end = cut
 
-            if (len(statement_tmp.split()) > 2) and (not (statement_tmp.isupper())):
-                while statement_tmp.rsplit(None, 1)[-1].isupper():
-                    statement_tmp = statement_tmp.rsplit(' ', 1)[0]
-                self.statements.append(statement_tmp)
+                self._add_span(statement_beg, statement_end)
 
     def identify_statements(self):
         """
@@ -120,49 +250,69 @@ class Interruptions(object):
         # Capture each statement
         self.capture_statements(statement_start_lst, statement_end_lst)
 
+    def restore_spans(self, statements):
+        """
+        Rebuild self.spans from the statement texts of an earlier run (stored as 'statements'),
+        instead of identify_speakers() and identify_statements(). Each statement is looked up
+        after the previous one; should the same text also appear earlier, that match has the
+        same speaker and ending, so the interruptions and polarities are the same.
+        """
+        self.spans = []
+        self._speaker_ids = []
+        self._statements = None
+        position = 0
+        for statement in statements:
+            start = self.oral_text.find(statement, position)
+            if start == -1:
+                raise ValueError('%s: statement not found in oral_text: %r' % (self.docket, statement[:50]))
+            end = start + len(statement)
+            self._add_span(start, end)
+            position = end
+
     def classify_statements(self):
         """
         This function identifies the starting position of each speakers statements.
         Not currently used.
         """
         for speaker, count in self.speaker_number_of_statements_dict.iteritems():
-            speaker_start_position_lst = [statement.start() for statement in re.finditer(speaker, self.oral_text_targeted)]
+            speaker_start_position_lst = [statement.start() - self.targeted_start for statement in
+                                          re.compile(speaker).finditer(self.oral_text, self.targeted_start,
+                                                                       self.targeted_end)]
             self.speaker_start_position_dict[speaker] = speaker_start_position_lst
 
-    def update_lawyer_names_dict(self, name):
-        if name in self.lawyer_names_dict:
-            if self.lawyer_names_dict[name] == 'PETITIONER':
-                self.interruptions_side_dict['PETITIONER'] += 1
-            if self.lawyer_names_dict[name] == 'RESPONDENT':
-                self.interruptions_side_dict['RESPONDENT'] += 1
-        else:
-            if name not in self.justice_name:
-                self.not_lawyer_names.add(name)
+    def identify_interruptions(self):
+        """
+        Count the statements that end with ' --' per speaker and per side. Sides are the lawyers'
+        (lawyer_names_dict) or JUSTICE; interrupted speakers that are neither go to not_lawyer_names.
+        """
+        text = self.oral_text
+        interrupted = np.array([(name is not None) and text.endswith(' --', start, end)
+                                for start, end, name in self.spans], dtype=bool)
+        interrupted_ids = self.speaker_ids[interrupted] if len(self.spans) else np.zeros(0, dtype=np.int32)
+        side_codes = self.registry.side_codes(self.lawyer_names_dict)
+        interrupted_sides = side_codes[interrupted_ids]
+
+        self.interruption_counts = np.bincount(interrupted_ids, minlength=len(self.registry)).astype(np.int32)
+        self.side_counts = np.bincount(interrupted_sides[interrupted_sides != speakers.NO_SIDE],
+                                       minlength=len(speakers.SIDES)).astype(np.int32)
+        self.interruptions_dict = Counter(self.registry.counts_dict(self.interruption_counts))
+        self.interruptions_side_dict = Counter({speakers.SIDES[side]: int(self.side_counts[side])
+                                                for side in (speakers.PETITIONER, speakers.RESPONDENT)
+                                                if self.side_counts[side]})
+        self.not_lawyer_names = set(self.registry.names[speaker_id] for speaker_id in
+                                    interrupted_ids[interrupted_sides == speakers.NO_SIDE].tolist())
 
         ### Identify the words that are not counted as lawyer names (in case not accurate)
         # if len(self.not_lawyer_names) > 0:
             # print
             # print self.docket
-            # print "Here are the names in the lawyer_names_dict:"
-            # for i in self.lawyer_names_dict:
-            #     print i, self.lawyer_names_dict[i]
-            # print 'Not a lawyer name (not included above): ', self.not_lawyer_names
+            # print 'Not a lawyer name: ', self.not_lawyer_names
 
-    def identify_interruptions(self):
-        for statement in self.statements:
-            potential_interruption = statement.rsplit(' ', 1)
-            if len(potential_interruption) > 1:
-                if (potential_interruption[-1] == '--'):
-                    name = statement.split(':', 1)[0]
-                    if (len(name.split()) == 1) and name.isupper():
-                        # Some names do not have a space between titles (MR.,MS.) and name
-                        # so removing the title. MongoDB does not like '.'s in keys of dictionaries
-                        name = name.rstrip(' ')
-                        name = name.rstrip('.')
-                        if '.' in name:
-                            name = name.split('.', 1)[-1]
-                        self.interruptions_dict[name] += 1
-                        self.update_lawyer_names_dict(name)
+        if self.instrumentation_obj is not None:
+            self.instrumentation_obj.count('statements', len(self.spans))
+            self.instrumentation_obj.count('interruptions', sum(self.interruptions_dict.values()))
+            # Interrupted speakers that are neither a lawyer of the case nor a justice
+            self.instrumentation_obj.count('unresolved_lawyer_names', len(self.not_lawyer_names))
 
         ### Verify that interruptions are being counted
         # print self.docket
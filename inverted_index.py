@@ -0,0 +1,310 @@
+"""
+Inverted index of the statements: which statements contain a word, were spoken by a speaker or
+side, or were cut off, without scanning the 'statements' of every case document
+
+Every statement has an integer key, (docket number << STATEMENT_BITS) | statement index, where
+the statement index is its position in the docket's 'statements'. The index maps
+    term:<word>             statements containing the word (lower case, after "<speaker>:")
+    speaker:<name>          statements of a speaker (as in interruptions_dict)
+    side:<side>             PETITIONER, RESPONDENT or JUSTICE
+    interrupted:1           statements that were cut off (end with " --")
+    interrupts:<side>       statements that interrupted a statement by <side> (the previous
+                            statement, cut off)
+to the sorted keys of its statements, stored as delta-varint bytes. A docket that is indexed
+again gets a new docket number, larger than every other, so postings only ever grow at the
+end; the statements of its old number are dropped from the results and from the postings at
+the next compact().
+
+Queries are nested tuples: ('term', 'originalism'), ('speaker', 'SCALIA'), ('and', q, ...),
+('or', q, ...), ('not', q), or the text form of parse_query:
+
+    python inverted_index.py scotus_index.pkl "speaker:SCALIA term:originalism interrupts:PETITIONER"
+"""
+
+import cPickle as pickle
+import os
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+import interruptions
+
+INDEX_VERSION = 1
+STATEMENT_BITS = 16
+FACETS = ('term', 'speaker', 'side', 'interrupted', 'interrupts')
+TERM_RE = re.compile('[a-z0-9]+')
+
+def _varint_bytes(deltas):
+    """
+    Returns the varint bytes (numpy uint8 array) of non-negative int64 deltas, and the number of
+    bytes of each
+    """
+    n_bytes = np.ones(len(deltas), dtype=np.int64)
+    for shift in range(7, 63, 7):
+        n_bytes += deltas >= (1 << shift)
+    offsets = np.cumsum(n_bytes) - n_bytes
+    data = np.empty(n_bytes.sum(), dtype=np.uint8)
+    for byte in range(n_bytes.max() if len(deltas) else 0):
+        has_byte = n_bytes > byte
+        # Low 7 bits first, the high bit marks that another byte follows
+        data[offsets[has_byte] + byte] = (((deltas[has_byte] >> (7 * byte)) & 0x7f) |
+                                          np.where(n_bytes[has_byte] > byte + 1, 0x80, 0))
+    return data, n_bytes
+
+def encode(keys):
+    """
+    Returns sorted integer keys as the varint bytes of their deltas (the first key as is)
+    """
+    return _varint_bytes(np.diff(np.asarray(keys, dtype=np.int64), prepend=0))[0].tostring()
+
+def decode(postings):
+    """
+    Returns the sorted keys (numpy int64 array) of encode()d postings
+    """
+    data = np.frombuffer(postings, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.r_[0, ends[:-1] + 1]
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    return np.cumsum(np.add.reduceat((data & 0x7f).astype(np.int64) << shifts, starts))
+
+def statement_facets(statements, lawyer_names_lst):
+    """
+    Returns the index keys ('term:...', 'speaker:...', ...) of every statement of a docket
+    :param statements: the docket's 'statements'
+    :param lawyer_names_lst: the docket's [(side, last name)]
+    """
+    lawyer_sides = {last_name: side for side, last_name in lawyer_names_lst}
+    facets = []
+    previous = None
+    for statement in statements:
+        speaker = interruptions.statement_speaker(statement)
+        keys = set('term:' + word for word in TERM_RE.findall(statement[statement.find(':') + 1:].lower()))
+        side = None
+        if speaker is not None:
+            keys.add('speaker:' + speaker)
+            side = lawyer_sides.get(speaker, 'JUSTICE' if speaker in interruptions.JUSTICE_NAMES else None)
+            if side is not None:
+                keys.add('side:' + side)
+        interrupted = interruptions.is_interrupted(statement, speaker)
+        if interrupted:
+            keys.add('interrupted:1')
+        if previous is not None and previous[0] and previous[1] is not None:
+            keys.add('interrupts:' + previous[1])
+        facets.append(keys)
+        previous = (interrupted, side)
+    return facets
+
+class Inverted_Index(object):
+    """
+    Objective: Find statements by words, speaker, side and interruptions in milliseconds,
+    updated docket by docket as they are (re-)ingested
+    """
+    def __init__(self):
+        # index key -> delta-varint postings (str when loaded, bytearray once appended to)
+        self.postings = {}
+        # index key -> last key in its postings
+        self.last_keys = {}
+        # docket -> docket number, and back (dockets indexed again keep only their newest number)
+        self.docket_numbers = {}
+        self.docket_names = {}
+        # Docket numbers whose statements are still in the postings but no longer valid
+        self.dropped_numbers = set()
+        # Number of statements of each docket number, valid and dropped
+        self.n_statements = {}
+        self.next_number = 0
+
+    def add_docket(self, docket, statements, lawyer_names_lst):
+        """
+        Index the statements of a docket, replacing what was indexed for it before
+        """
+        if len(statements) >= 1 << STATEMENT_BITS:
+            raise ValueError('%s: %s statements, the index takes at most %s per docket' %
+                             (docket, len(statements), (1 << STATEMENT_BITS) - 1))
+        self.remove_docket(docket)
+        number = self.next_number
+        self.next_number += 1
+        self.docket_numbers[docket] = number
+        self.docket_names[number] = docket
+        self.n_statements[number] = len(statements)
+
+        # index key -> keys of the docket's statements, in order
+        docket_keys = {}
+        for i, facet_keys in enumerate(statement_facets(statements, lawyer_names_lst)):
+            key = (number << STATEMENT_BITS) | i
+            for index_key in facet_keys:
+                docket_keys.setdefault(index_key, []).append(key)
+            docket_keys.setdefault('all', []).append(key)
+        if not docket_keys:
+            return
+        # Encode them for all index keys at once, the first delta of an index key is from the end
+        # of its postings
+        names = docket_keys.keys()
+        lengths = np.array([len(docket_keys[name]) for name in names])
+        keys = np.fromiter((key for name in names for key in docket_keys[name]), dtype=np.int64, count=lengths.sum())
+        starts = np.cumsum(lengths) - lengths
+        deltas = np.diff(keys, prepend=0)
+        deltas[starts] = keys[starts] - np.array([self.last_keys.get(name, 0) for name in names], dtype=np.int64)
+        data, n_bytes = _varint_bytes(deltas)
+        byte_starts = (np.cumsum(n_bytes) - n_bytes)[starts].tolist() + [len(data)]
+        ends = starts[1:].tolist() + [len(keys)]
+        for j, name in enumerate(names):
+            postings = self.postings.get(name)
+            if postings is None:
+                postings = self.postings[name] = bytearray()
+            elif not isinstance(postings, bytearray):
+                postings = self.postings[name] = bytearray(postings)
+            postings.extend(data[byte_starts[j]:byte_starts[j + 1]].tostring())
+            self.last_keys[name] = int(keys[ends[j] - 1])
+
+    def remove_docket(self, docket):
+        """
+        Drop a docket from the results (and from the postings at the next compact())
+        """
+        number = self.docket_numbers.pop(docket, None)
+        if number is not None:
+            del self.docket_names[number]
+            self.dropped_numbers.add(number)
+
+    def dropped_fraction(self):
+        """
+        Returns the fraction of the statements in the postings that belong to dropped dockets
+        """
+        n_total = sum(self.n_statements.itervalues())
+        n_dropped = sum(self.n_statements[number] for number in self.dropped_numbers)
+        return float(n_dropped) / n_total if n_total else 0.0
+
+    def compact(self):
+        """
+        Rewrite the postings without the statements of dropped dockets
+        """
+        if not self.dropped_numbers:
+            return
+        dropped = np.array(sorted(self.dropped_numbers), dtype=np.int64)
+        for index_key, postings in self.postings.items():
+            keys = decode(postings)
+            keys = keys[~np.in1d(keys >> STATEMENT_BITS, dropped)]
+            if len(keys):
+                self.postings[index_key] = encode(keys)
+                self.last_keys[index_key] = int(keys[-1])
+            else:
+                del self.postings[index_key]
+                del self.last_keys[index_key]
+        for number in self.dropped_numbers:
+            del self.n_statements[number]
+        self.dropped_numbers = set()
+
+    def keys(self, index_key):
+        """
+        Returns the keys of the valid statements of an index key ('term:originalism', ...)
+        """
+        keys = decode(self.postings.get(index_key, ''))
+        if self.dropped_numbers and len(keys):
+            keys = keys[~np.in1d(keys >> STATEMENT_BITS, np.array(sorted(self.dropped_numbers), dtype=np.int64))]
+        return keys
+
+    def _evaluate(self, query):
+        operator = query[0]
+        if operator == 'and':
+            # Smallest postings first, so the intersections stay small
+            results = sorted((self._evaluate(subquery) for subquery in query[1:]), key=len)
+            keys = results[0]
+            for other in results[1:]:
+                keys = np.intersect1d(keys, other, assume_unique=True)
+            return keys
+        if operator == 'or':
+            keys = np.zeros(0, dtype=np.int64)
+            for subquery in query[1:]:
+                keys = np.union1d(keys, self._evaluate(subquery))
+            return keys
+        if operator == 'not':
+            return np.setdiff1d(self.keys('all'), self._evaluate(query[1]), assume_unique=True)
+        if operator not in FACETS:
+            raise ValueError('Unknown query operator %r, expected and, or, not or one of %s' % (operator, FACETS))
+        value = query[1]
+        if operator == 'term':
+            value = value.lower()
+        elif operator != 'interrupted':
+            value = value.upper()
+        return self.keys('%s:%s' % (operator, value))
+
+    def search(self, query):
+        """
+        Returns the (docket, statement index) of every statement matching query, in docket order
+        of indexing. The statement is docs[docket]['statements'][statement index].
+        """
+        mask = (1 << STATEMENT_BITS) - 1
+        return [(self.docket_names[key >> STATEMENT_BITS], key & mask) for key in self._evaluate(query).tolist()]
+
+    def count(self, query):
+        return len(self._evaluate(query))
+
+    def n_bytes(self):
+        """
+        Returns the size of the postings
+        """
+        return sum(len(postings) for postings in self.postings.itervalues())
+
+    def save(self, fpath, compact_above=0.2):
+        """
+        Write the index to fpath (temporary file and rename, readers never see it half written),
+        compacting it first when more than compact_above of its statements are dropped
+        """
+        if self.dropped_fraction() > compact_above:
+            self.compact()
+        state = dict(self.__dict__, version=INDEX_VERSION,
+                     postings={index_key: str(postings) for index_key, postings in self.postings.iteritems()})
+        directory = os.path.dirname(os.path.abspath(fpath))
+        fd, tmp_fpath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fpath, fpath)
+
+    @classmethod
+    def load(cls, fpath):
+        """
+        Returns the index saved at fpath, or an empty index if there is none
+        """
+        index_obj = cls()
+        if os.path.exists(fpath):
+            with open(fpath, 'rb') as f:
+                state = pickle.load(f)
+            if state.pop('version') != INDEX_VERSION:
+                raise ValueError('%s was written by another version of the index, rebuild it' % fpath)
+            index_obj.__dict__.update(state)
+        return index_obj
+
+def parse_query(text):
+    """
+    Returns the query of a text of space separated facet:value conditions, all of which have to
+    hold. A value may list alternatives (speaker:SCALIA|THOMAS) and a leading - negates the
+    condition. A word without a facet is a term. interrupts:<side> matches the statements that
+    interrupted a statement by <side>.
+        "speaker:SCALIA originalism interrupts:PETITIONER -side:JUSTICE"
+    """
+    conditions = []
+    for condition in text.split():
+        negate = condition.startswith('-')
+        facet, _, values = condition.lstrip('-').rpartition(':')
+        facet = facet or 'term'
+        alternatives = [(facet, value) for value in values.split('|')]
+        query = alternatives[0] if len(alternatives) == 1 else ('or',) + tuple(alternatives)
+        conditions.append(('not', query) if negate else query)
+    if not conditions:
+        raise ValueError('Empty query')
+    return conditions[0] if len(conditions) == 1 else ('and',) + tuple(conditions)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print 'usage: python inverted_index.py INDEX_FILE QUERY'
+        print 'QUERY: space separated term:<word>, speaker:<name>, side:<side>, interrupted:1 and'
+        print '       interrupts:<side> (statements that interrupted a statement by <side>) conditions'
+        sys.exit(1)
+    index_obj = Inverted_Index.load(sys.argv[1])
+    start = time.time()
+    hits = index_obj.search(parse_query(sys.argv[2]))
+    print '%s statements in %.1f ms' % (len(hits), 1000 * (time.time() - start))
+    for docket, statement_index in hits:
+        print docket, statement_index
@@ -0,0 +1,87 @@
+import hashlib
+
+# What an entry is compared on
+INPUT_FIELDS = ('transcript_hash', 'metadata_hash', 'pipeline_version')
+
+class Manifest(object):
+    """
+    Objective: Remember what every stored docket was built from, so that an incremental
+    run only reprocesses dockets whose inputs or pipeline version changed
+
+    One entry per docket:
+        {'_id': docket, 'transcript_hash': ..., 'metadata_hash': ..., 'pipeline_version': ...,
+         'count_problems': ...}
+    count_problems is what the docket's run found, so that the problems of dockets stored by
+    earlier (or crashed and resumed) runs can still be counted
+    """
+    def __init__(self, table):
+        """
+        :param table: storage table (storage.py) the entries are kept in
+        """
+        self.table = table
+        self.entries = {entry['_id']: entry for entry in self.table.find()}
+
+    @staticmethod
+    def hash_file(fpath, block_size=1 << 20):
+        """
+        Returns the sha1 of the contents of a file
+        """
+        sha1 = hashlib.sha1()
+        with open(fpath, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), ''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def hash_metadata(meta_dict):
+        """
+        Returns the sha1 of a docket's metadata row
+        """
+        return hashlib.sha1(repr(sorted(meta_dict.items()))).hexdigest()
+
+    @staticmethod
+    def make_entry(docket, transcript_hash, metadata_hash, pipeline_version):
+        return {'_id': docket,
+                'transcript_hash': transcript_hash,
+                'metadata_hash': metadata_hash,
+                'pipeline_version': pipeline_version}
+
+    def is_current(self, entry):
+        """
+        True if the docket was already stored from exactly these inputs
+        """
+        stored = self.entries.get(entry['_id'])
+        return stored is not None and all(stored.get(field) == entry[field] for field in INPUT_FIELDS)
+
+    def count_problems(self):
+        """
+        Returns the count_problems of every docket in the manifest, summed
+        """
+        return sum(entry.get('count_problems', 0) for entry in self.entries.itervalues())
+
+    def removed_dockets(self, docket_ids):
+        """
+        Returns the dockets in the manifest that are no longer in docket_ids
+        """
+        return sorted(set(self.entries).difference(docket_ids))
+
+    def update(self, entries):
+        """
+        Record the entries of dockets that were written successfully
+        """
+        if not entries:
+            return
+        self.table.write_batch(entries, upsert=True)
+        for entry in entries:
+            self.entries[entry['_id']] = entry
+
+    def remove(self, dockets):
+        if not dockets:
+            return
+        self.table.delete(dockets)
+        for docket in dockets:
+            self.entries.pop(docket, None)
+
+    def clear(self):
+        self.table.clear()
+        self.entries = {}
@@ -0,0 +1,227 @@
+"""
+Streaming pipeline: read -> clean -> segment -> interruptions -> sentiment -> documents
+
+Every stage is a generator taking and yielding Docket_Records, so only the docket a stage
+is working on is alive and memory does not grow with the size of the corpus:
+
+    for doc, count_problems, columns in documents(score_sentiment(find_interruptions(segment(clean(read(tasks)))))):
+        writer.add(doc)
+
+run() composes the stages. bounded_imap() fans the work out to a process pool while
+keeping a bounded number of dockets in flight. Every stage optionally times its work per
+docket into an instrumentation.Instrumentation.
+"""
+
+import collections
+import itertools
+import os
+import cache
+import clean_data
+import instrumentation
+import interruptions
+import preprocessing
+import sentiment
+import statement_table
+import transcript
+
+class Docket_Record(object):
+    """
+    Objective: What flows between the stages, the document being built plus the stage
+    objects later stages need
+    """
+    def __init__(self, docket, doc, oral_fpath=None):
+        self.docket = docket
+        self.doc = doc
+        self.oral_fpath = oral_fpath
+        self.clean_data = None
+        self.interruptions = None
+        self.sentiment = None
+        # (start, end) marker indices when doc['oral_text'] is only the argument body
+        # (transcript.read_mapped_body), None when it is the whole transcript
+        self.body_markers = None
+
+def read(tasks, mmap_transcripts=False, instrumentation_obj=None):
+    """
+    Read the transcript of each (docket, meta_dict, oral_fpath) task into its document
+    :param mmap_transcripts: memory-map the transcripts and only copy out the argument body
+                             (see transcript.read_mapped_body)
+    """
+    timer = instrumentation.stage_timer(instrumentation_obj)
+    for docket, meta_dict, oral_fpath in tasks:
+        with timer('read', docket, os.path.getsize(oral_fpath)):
+            # Make sure every value in the document is utf-8
+            doc = {k: preprocessing.Preprocessing._to_utf8(v) for k, v in meta_dict.iteritems()}
+            record = Docket_Record(docket, doc, oral_fpath)
+            # Not stored in meta_dict, which the caller may keep for every docket
+            if mmap_transcripts:
+                doc['oral_text'], record.body_markers = transcript.read_mapped_body(oral_fpath)
+            else:
+                doc['oral_text'] = transcript.read_transcript(oral_fpath)
+        yield record
+
+def clean(records, cache_dir=None, cache_max_bytes=1 << 30, instrumentation_obj=None):
+    """
+    Run Clean_Data, reusing the disk cache entry of the transcript if there is one
+    :param cache_dir: directory of the Clean_Data disk cache (None = no disk cache)
+    :param cache_max_bytes: size limit of the disk cache
+    """
+    timer = instrumentation.stage_timer(instrumentation_obj)
+    for record in records:
+        with timer('clean', record.docket, len(record.doc['oral_text'])):
+            _clean_record(record, cache_dir, cache_max_bytes, instrumentation_obj)
+        yield record
+
+def _clean_record(record, cache_dir, cache_max_bytes, instrumentation_obj):
+    """
+    Run (or restore from the disk cache) Clean_Data on one record and add its output to the document
+    """
+    doc = record.doc
+    clean_data_obj = clean_data.Clean_Data(record.docket, doc['oral_text'], instrumentation_obj)
+    if cache_dir is None:
+        clean_data_obj.update_class_variables()
+    else:
+        # Reuse the cleaned transcript if this exact text was cleaned by this PIPELINE_VERSION before
+        clean_data_cache = cache.get_disk_cache(cache_dir, 'clean_data', preprocessing.PIPELINE_VERSION,
+                                                cache_max_bytes)
+        key = cache.text_key(doc['oral_text'])
+        cached = clean_data_cache.get(key)
+        if cached is None:
+            clean_data_obj.update_class_variables()
+            clean_data_cache.put(key, {attr: getattr(clean_data_obj, attr)
+                                       for attr in clean_data.OUTPUT_ATTRIBUTES})
+        else:
+            clean_data_obj.__dict__.update(cached)
+            clean_data_obj.update_instrumentation()
+
+    if (record.body_markers is not None) and not transcript.body_markers_match(clean_data_obj, record.body_markers):
+        # The markers found in the raw bytes are not the ones of the cleaned text, clean the whole transcript
+        if instrumentation_obj is not None:
+            instrumentation_obj.count('mapped_body_fallback')
+        doc['oral_text'] = transcript.read_transcript(record.oral_fpath)
+        record.body_markers = None
+        _clean_record(record, cache_dir, cache_max_bytes, instrumentation_obj)
+        return
+
+    # Replacing oral_text releases the raw transcript
+    doc['oral_text'] = clean_data_obj.oral_text
+    doc['oral_text_start'] = clean_data_obj.oral_text_start
+    doc['oral_text_end'] = clean_data_obj.oral_text_end
+    doc['potential_lawyers'] = clean_data_obj.potential_lawyers
+    doc['lawyer_names_lst'] = clean_data_obj.lawyer_names_lst
+    record.clean_data = clean_data_obj
+
+def segment(records, instrumentation_obj=None):
+    """
+    Find the speakers and the (start, end, speaker) span of every statement
+    """
+    timer = instrumentation.stage_timer(instrumentation_obj)
+    for record in records:
+        clean_data_obj = record.clean_data
+        with timer('segment', record.docket, len(clean_data_obj.oral_text)):
+            interruptions_obj = interruptions.Interruptions(record.docket,
+                                                            clean_data_obj.oral_text,
+                                                            clean_data_obj.oral_text_start,
+                                                            clean_data_obj.oral_text_end,
+                                                            clean_data_obj.lawyer_names_dict,
+                                                            instrumentation_obj)
+            interruptions_obj.identify_speakers()
+            interruptions_obj.identify_statements()
+        record.interruptions = interruptions_obj
+        yield record
+
+def find_interruptions(records, instrumentation_obj=None):
+    """
+    Count the statements that were interrupted, per speaker and per side
+    """
+    timer = instrumentation.stage_timer(instrumentation_obj)
+    for record in records:
+        interruptions_obj = record.interruptions
+        with timer('interruptions', record.docket, len(interruptions_obj.oral_text)):
+            interruptions_obj.identify_interruptions()
+
+        record.doc['statements'] = interruptions_obj.statements
+        record.doc['interruptions_dict'] = interruptions_obj.interruptions_dict
+        record.doc['interruptions_side_dict'] = interruptions_obj.interruptions_side_dict
+
+        if 'MR.GARRE' in interruptions_obj.interruptions_dict:
+            print 'interruptions_dict', interruptions_obj.docket
+        if 'MR.GARRE' in interruptions_obj.interruptions_side_dict:
+            print 'interruptions_dict', interruptions_obj.docket
+        yield record
+
+def score_sentiment(records, scorer=None, instrumentation_obj=None):
+    """
+    Score the polarity of every statement
+    :param scorer: see sentiment.Sentiment
+    """
+    timer = instrumentation.stage_timer(instrumentation_obj)
+    for record in records:
+        with timer('sentiment', record.docket, len(record.clean_data.oral_text)):
+            sentiment_obj = sentiment.Sentiment(record.docket, record.clean_data.oral_text,
+                                                record.interruptions.spans, scorer, instrumentation_obj,
+                                                record.interruptions.speaker_ids, record.interruptions.registry)
+            sentiment_obj.update_class_variables()
+        record.doc['sentiment_dict'] = sentiment_obj.sentiment_dict
+        record.sentiment = sentiment_obj
+
+        if 'MR.GARRE' in sentiment_obj.sentiment_dict:
+            print 'sentiment_dict', sentiment_obj.docket
+        yield record
+
+def documents(records, statement_columns=False):
+    """
+    Drop the stage objects and yield (document to insert, count_problems of the docket,
+    statement rows of the docket)
+    :param statement_columns: build the rows of statement_table (None is yielded otherwise)
+    """
+    for record in records:
+        columns = None
+        if statement_columns:
+            columns = statement_table.docket_statement_columns(record.docket,
+                                                               record.doc['term'],
+                                                               record.clean_data.oral_text,
+                                                               record.interruptions.spans,
+                                                               record.clean_data.lawyer_names_dict,
+                                                               record.interruptions.justice_name,
+                                                               record.sentiment.polarities)
+        yield record.doc, record.clean_data.count_problems, columns
+
+def run(tasks, cache_dir=None, cache_max_bytes=1 << 30, scorer=None, instrumentation_obj=None,
+        statement_columns=False, mmap_transcripts=False):
+    """
+    Compose every stage over (docket, meta_dict, oral_fpath) tasks
+    :param instrumentation_obj: instrumentation.Instrumentation the stages record into (None = not recorded)
+    :param statement_columns: also yield the (term, columns) rows of statement_table
+    :param mmap_transcripts: see read
+    :return: generator of (document to insert, count_problems of the docket, statement rows or None)
+    """
+    records = read(tasks, mmap_transcripts, instrumentation_obj)
+    records = clean(records, cache_dir, cache_max_bytes, instrumentation_obj)
+    records = segment(records, instrumentation_obj)
+    records = find_interruptions(records, instrumentation_obj)
+    records = score_sentiment(records, scorer, instrumentation_obj)
+    return documents(records, statement_columns)
+
+def _map_chunk(func, chunk):
+    return [func(task) for task in chunk]
+
+def bounded_imap(pool, func, tasks, chunksize=10, max_in_flight=4):
+    """
+    Same results, in the same order, as pool.imap(func, tasks, chunksize), but tasks are only
+    submitted while fewer than max_in_flight chunks are queued, running or waiting to be
+    consumed. pool.imap submits every task up front and buffers every result the consumer
+    has not reached yet, so a slow consumer (the Mongo writes) makes memory grow with the corpus.
+    func has to be a module-level function so that it can be sent to the workers.
+    """
+    tasks = iter(tasks)
+    pending = collections.deque()
+    while True:
+        while len(pending) < max_in_flight:
+            chunk = list(itertools.islice(tasks, chunksize))
+            if not chunk:
+                break
+            pending.append(pool.apply_async(_map_chunk, (func, chunk)))
+        if not pending:
+            return
+        for result in pending.popleft().get():
+            yield result
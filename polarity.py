@@ -0,0 +1,214 @@
+import re
+
+# Same tokenizer rules as textblob's (pattern's) find_tokens, restricted to the characters
+# Preprocessing._to_utf8 leaves in the text
+PUNCTUATION = tuple(",;:!?()[]{}`''\"@#$^&*+-|=~_")
+ABBREVIATIONS = set(("a.", "adj.", "adv.", "al.", "a.m.", "c.", "cf.", "comp.", "conf.", "def.",
+                     "ed.", "e.g.", "esp.", "etc.", "ex.", "f.", "fig.", "gen.", "id.", "i.e.",
+                     "int.", "l.", "m.", "Med.", "Mil.", "Mr.", "n.", "n.q.", "orig.", "pl.",
+                     "pred.", "pres.", "p.m.", "ref.", "v.", "vs.", "w/"))
+RE_ABBR1 = re.compile(r"^[A-Za-z]\.$")
+RE_ABBR2 = re.compile(r"^([A-Za-z]\.)+$")
+RE_ABBR3 = re.compile("^[A-Z][" + "|".join("bcdfghjklmnpqrstvwxz") + "]+.$")
+RE_SARCASM = re.compile(r"\( ?\! ?\)")
+NEGATIONS = ("no", "not", "n't", "never")
+# Separates the statements of a batch, cannot occur in the cleaned text
+STATEMENT_SEPARATOR = '\x00'
+WORD_RE = re.compile("[a-z]+|\x00")
+
+def _load_lexicon():
+    """
+    Returns {word: (polarity, intensity, is_modifier)} built from the lexicon TextBlob's
+    PatternAnalyzer uses (scores averaged over parts of speech, as it looks words up without tags)
+    """
+    from textblob.en import sentiment as pattern_sentiment
+    lexicon = {}
+    for word, pos in pattern_sentiment.items():
+        polarity, subjectivity, intensity = pos[None]
+        lexicon[word] = (polarity, intensity, 'RB' in pos)
+    return lexicon
+
+def _load_emoticons():
+    """
+    Returns (pattern that joins emoticons split by the tokenizer, {lower case emoticon: polarity})
+    as TextBlob's PatternAnalyzer recognizes them
+    """
+    from textblob import _text
+    emoticons = {}
+    for (mood, p), faces in _text.EMOTICONS.items():
+        for face in faces:
+            face = face.lower()
+            if face.isalpha() is False and len(face) <= 5 and face not in _text.PUNCTUATION:
+                emoticons.setdefault(face, p)
+    return _text.RE_EMOTICONS, emoticons
+
+def _join_emoticon(match):
+    return match.group(1).replace(' ', '') + match.group(2)
+
+def _split_token(token, tokens):
+    """
+    Split leading/trailing punctuation from token like textblob's find_tokens and append the
+    resulting tokens to tokens
+    """
+    while token.startswith(PUNCTUATION):
+        tokens.append(token[0])
+        token = token[1:]
+
+    tail = []
+    while token.endswith(PUNCTUATION + ('.',)):
+        if token.endswith(PUNCTUATION):
+            tail.append(token[-1])
+            token = token[:-1]
+        if token.endswith('...'):
+            tail.append('...')
+            token = token[:-3].rstrip('.')
+        if token.endswith('.'):
+            if (token in ABBREVIATIONS or RE_ABBR1.match(token) is not None or
+                    RE_ABBR2.match(token) is not None or RE_ABBR3.match(token) is not None):
+                break
+            else:
+                tail.append(token[-1])
+                token = token[:-1]
+
+    if token != '':
+        tokens.append(token)
+    tokens.extend(reversed(tail))
+
+class Lexicon_Scorer(object):
+    """
+    Objective: Score the polarity of every statement of a docket in one call, with the lexicon
+    loaded once per process
+
+    textblob_compatible=True applies PatternAnalyzer's tokenization and its modifier ("very
+    good"), negation ("not good"), exclamation, sarcasm and emoticon rules, and reproduces
+    TextBlob(text).sentiment.polarity to within 1e-9 on cleaned (whitespace collapsed) transcript
+    text.
+    textblob_compatible=False averages the lexicon polarity of the words, ignoring those rules.
+    """
+    def __init__(self, textblob_compatible=True, lexicon=None):
+        self.textblob_compatible = textblob_compatible
+        self.lexicon = lexicon if lexicon is not None else _load_lexicon()
+        if textblob_compatible:
+            self.emoticons_re, self.emoticons = _load_emoticons()
+
+    def tokenize(self, texts):
+        """
+        Returns the tokens of all texts, with a STATEMENT_SEPARATOR token after each text
+        """
+        joined = (' %s ' % STATEMENT_SEPARATOR).join(texts) + ' ' + STATEMENT_SEPARATOR
+        if not self.textblob_compatible:
+            return WORD_RE.findall(joined.lower())
+
+        # Contractions, then quotes become tokens of their own ("don't" -> "do n ' t")
+        joined = joined.replace("n't", " n't").replace("'", " ' ").replace('"', ' " ')
+        tokens = []
+        for token in joined.split():
+            if token.isalnum() or token == STATEMENT_SEPARATOR:
+                tokens.append(token)
+            else:
+                _split_token(token, tokens)
+
+        # Rejoin "( ! )" and emoticons split into several tokens (": - )" -> ":-)")
+        joined = ' '.join(tokens)
+        if '!' in joined:
+            joined = RE_SARCASM.sub('(!)', joined)
+        joined = self.emoticons_re.sub(_join_emoticon, joined)
+        return joined.lower().split()
+
+    def score(self, texts):
+        """
+        Returns the polarity of each text
+        """
+        if self.textblob_compatible:
+            return self._score_with_rules(self.tokenize(texts))
+        return self._score_words(self.tokenize(texts))
+
+    def _score_words(self, tokens):
+        lexicon = self.lexicon
+        polarities = []
+        total = 0.0
+        count = 0
+        for token in tokens:
+            if token == STATEMENT_SEPARATOR:
+                polarities.append(total / (count or 1))
+                total = 0.0
+                count = 0
+            else:
+                entry = lexicon.get(token)
+                if entry is not None:
+                    total += entry[0]
+                    count += 1
+        return polarities
+
+    def _score_with_rules(self, tokens):
+        """
+        PatternAnalyzer's assessments, keeping each assessment as [polarity, intensity, negated]
+        """
+        lexicon = self.lexicon
+        emoticons = self.emoticons
+        polarities = []
+        assessments = []
+        modifier = None
+        negation = None
+
+        for w in tokens:
+            if w == STATEMENT_SEPARATOR:
+                scores = [p * -0.5 if negated else p for p, i, negated in assessments]
+                polarities.append(sum(scores) / float(len(scores) or 1))
+                assessments = []
+                modifier = None
+                negation = None
+                continue
+
+            entry = lexicon.get(w)
+            if entry is not None:
+                p, i, is_modifier = entry
+                if modifier is None:
+                    # Known word not preceded by a modifier ("good")
+                    assessments.append([p, i, False])
+                else:
+                    # Known word preceded by a modifier ("really good")
+                    last = assessments[-1]
+                    last[0] = max(-1.0, min(p * last[1], +1.0))
+                    last[1] = i
+                if negation is not None:
+                    # Known word preceded by a negation ("not really good")
+                    last = assessments[-1]
+                    last[1] = 1.0 / last[1]
+                    last[2] = True
+                modifier = w if is_modifier else None
+                negation = w if w in NEGATIONS else None
+            else:
+                if w in NEGATIONS:
+                    negation = w
+                elif negation and len(w.strip("'")) > 1:
+                    # Retain negation across small words ("not a good")
+                    negation = None
+                if (negation is not None) and (modifier is not None) and modifier.endswith('ly'):
+                    # Negation preceded by a modifier ("really not good")
+                    assessments[-1][2] = True
+                    negation = None
+                elif modifier and len(w) > 2:
+                    # Retain modifier across small words ("really is a good")
+                    modifier = None
+                if (w == '!') and assessments:
+                    # Exclamation marks boost the previous word
+                    assessments[-1][0] = max(-1.0, min(assessments[-1][0] * 1.25, +1.0))
+                elif w == '(!)':
+                    # Exclamation marks in parentheses indicate sarcasm (scored as neutral)
+                    assessments.append([0.0, 1.0, False])
+                elif w in emoticons:
+                    assessments.append([emoticons[w], 1.0, False])
+
+        return polarities
+
+class TextBlob_Scorer(object):
+    """
+    Objective: Score each statement with its own TextBlob (the original, slow path)
+    """
+    def __init__(self):
+        from textblob import TextBlob
+        self.TextBlob = TextBlob
+
+    def score(self, texts):
+        return [self.TextBlob(text).sentiment.polarity for text in texts]
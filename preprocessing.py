@@ -1,26 +1,116 @@
+import numpy as np
 import pandas as pd
-from pymongo import MongoClient
+import cProfile
+import multiprocessing
 import os
-import re
-import clean_data
-import interruptions
+import pstats
+import time
+import aggregates
+import bulk_writer
+import cache
+import instrumentation
+import inverted_index
+import manifest
+import pipeline
 import sentiment
+import shards
+import statement_table
+import storage
+import transcript
+
+# Bump whenever a change to clean_data, interruptions or sentiment changes their output,
+# so that incremental runs reprocess every docket
+PIPELINE_VERSION = '1'
+
+# Storage layouts: everything in the case document, or the fields below in <collection>_text
+LAYOUTS = ('embedded', 'split')
+TEXT_FIELDS = ('oral_text', 'oral_text_start', 'oral_text_end', 'statements')
+
+# Bump whenever a change to _preprocess_meta changes its output, so that the collapsed metadata
+# cached in cache_dir is rebuilt
+METADATA_VERSION = '1'
+# Justice-level columns of the justice-centered CSV, collapsed into one list per docket
+JUSTICE_COLUMNS = ['justice', 'justiceName', 'vote', 'opinion', 'direction',
+                   'majority', 'firstAgreement', 'secondAgreement']
+# Always read, whatever metadata_columns asks for
+REQUIRED_METADATA_COLUMNS = ('docket', 'term')
+# Identifiers, citations and names are read as strings (a docket such as "105" would otherwise
+# come back as a number in some rows). The numeric codes are left to pandas: most of them
+# have missing values, so they are floats in some CSV releases and ints in others
+METADATA_DTYPES = {column: str for column in ('caseId', 'docketId', 'caseIssuesId', 'voteId', 'docket',
+                                              'dateDecision', 'dateArgument', 'dateRearg', 'usCite', 'sctCite',
+                                              'ledCite', 'lexisCite', 'caseName', 'lawMinor', 'chief',
+                                              'justiceName')}
 
 class Preprocessing(object):
 
-    def __init__(self, metadata_file, oral_argument_folder, dbname='scotus_cases', collectionname='data'):
+    def __init__(self, metadata_file, oral_argument_folder, dbname='scotus_cases', collectionname='data',
+                 incremental=False, cache_dir=None, cache_max_bytes=1 << 30, mmap_transcripts=False,
+                 layout='embedded', storage_url=None, metadata_columns=None, shard=None):
+        """
+        :param dbname: Mongo database, when storage_url does not name one
+        :param collectionname: table of the case documents, the other tables are named after it
+        :param incremental: keep the existing collection and only reprocess dockets whose transcript,
+                            metadata row or PIPELINE_VERSION changed since the last run
+        :param cache_dir: directory where Clean_Data results are cached across runs, keyed by
+                          transcript hash and PIPELINE_VERSION, and the collapsed metadata, keyed
+                          by the hash of metadata_file (None = no disk cache)
+        :param cache_max_bytes: size above which least recently used cache entries are evicted
+        :param mmap_transcripts: memory-map the transcripts and only copy out the argument body (see
+                                 transcript.read_mapped_body). The documents then hold the body as
+                                 oral_text, with oral_text_start/oral_text_end relative to it; the
+                                 statements, interruptions and sentiment are the same. Part of the
+                                 pipeline version, so toggling it reprocesses every docket
+        :param layout: 'embedded' stores everything in the case document, 'split' moves TEXT_FIELDS
+                       to <collectionname>_text (same _id) so that queries on the case documents
+                       do not pull the transcripts. The case collection also gets aggregate
+                       collections, see aggregates.rebuild
+        :param storage_url: where to write (see storage.open_storage): mongodb://host/dbname,
+                            sqlite:///path/to/file.db or jsonl:///path/to/directory. None = the
+                            local Mongo server
+        :param metadata_columns: only read these columns of metadata_file (plus
+                                 REQUIRED_METADATA_COLUMNS) into the case documents. None = every column
+        :param shard: (shard index, shard count) to only process the dockets of one shard
+                      (shards.shard_of), see shards.py. None = every docket
+        """
+        if layout not in LAYOUTS:
+            raise ValueError('layout must be one of %s, not %r' % (LAYOUTS, layout))
+        if shard is not None and not 0 <= shard[0] < shard[1]:
+            raise ValueError('shard index must be in [0, shard count), not %s of %s' % shard)
         self.metadata_file = metadata_file
         self.oral_argument_folder = oral_argument_folder
+        self.incremental = incremental
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.mmap_transcripts = mmap_transcripts
+        self.layout = layout
+        self.metadata_columns = metadata_columns
+        self.shard = shard
+        # Switching layouts, or to documents of the mapped body (different oral_text and offsets),
+        # reprocesses every docket of an incremental run
+        self.pipeline_version = PIPELINE_VERSION if layout == 'embedded' else PIPELINE_VERSION + '-' + layout
+        if mmap_transcripts:
+            self.pipeline_version += '-mmap'
 
-        # Instantiate Mongo db + collection
-        client = MongoClient()
-        db = client[dbname]
-        self.tab = db[collectionname]
-        # Empty table if it already exists
-        self.tab.remove({})
+        # Instantiate the storage backend + tables
+        self.storage = storage.open_storage(storage_url, dbname)
+        self.collectionname = collectionname
+        self.tab = self.storage.table(collectionname)
+        self.text_tab = self.storage.table(collectionname + '_text')
+        manifest_tab = self.storage.table(collectionname + '_manifest')
+        if not self.incremental:
+            # Empty table if it already exists (before the manifest loads entries it would drop)
+            self.tab.clear()
+            self.text_tab.clear()
+            manifest_tab.clear()
+        self.manifest = manifest.Manifest(manifest_tab)
 
         self.metadata = None
+        self.metadata_index = None
         self.intersect_docket_ids = None
+        # Measurements and counts of the last insert_intersect_docket_meta_oral run
+        self.instrumentation_obj = None
+        self.run_info = None
         self._assign_variables()
 
 
@@ -35,37 +125,54 @@ class Preprocessing(object):
         :param meta_df:
         :return: df
         """
-        # Define unique and non-unique columns
-        uniq_cols = ['justice', 'justiceName', 'vote', 'opinion', 'direction',
-                     'majority', 'firstAgreement', 'secondAgreement']
-        non_uniq_cols = meta_df.columns.diff(uniq_cols)
+        # Define unique and non-unique columns (metadata_columns may have left some out)
+        uniq_cols = [col for col in JUSTICE_COLUMNS if col in meta_df.columns]
+        non_uniq_cols = meta_df.columns.difference(uniq_cols)
+
+        # Sort (stable, so justices keep their order) and find where each docket starts
+        meta_df = meta_df[meta_df['docket'].notnull()].sort_values('docket', kind='mergesort')
+        dockets = meta_df['docket'].values
+        docket_starts = np.flatnonzero(np.r_[True, dockets[1:] != dockets[:-1]][:len(dockets)])
+        docket_bounds = zip(docket_starts, np.r_[docket_starts[1:], len(dockets)])
 
-        # Method to turn columns to a flat list
-        def collapse_to_lst(df, colname):
-            return df[colname].tolist()
+        # Case-level columns come from the first row of each docket
+        df = meta_df[non_uniq_cols].iloc[docket_starts].copy()
 
         # Make justice related columns into flat lists
-        collapsed_df_lst = []
-        for name, df in meta_df.groupby('docket'):
-            #
-            info_dict = df[non_uniq_cols].iloc[0].to_dict()
-            #
-            for jcol in uniq_cols:
-                info_dict[jcol] = collapse_to_lst(df, jcol)
-            collapsed_df_lst.append(info_dict)
-
-        df = pd.DataFrame(collapsed_df_lst)
+        for jcol in uniq_cols:
+            values = meta_df[jcol].tolist()
+            df[jcol] = pd.Series([values[start:end] for start, end in docket_bounds], index=df.index)
+
+        df = df.reset_index(drop=True)
         df['_id'] = df['docket']
         return df
 
     def _read_metadata(self):
         """
-        Read in the metadata CSV file
-        Updates self.metadata
+        Read in the metadata CSV file, or with a cache_dir the collapsed metadata pickled by an
+        earlier run on the same CSV (keyed by its sha1, metadata_columns and METADATA_VERSION)
+        Updates self.metadata and self.metadata_index (docket -> metadata row dict)
         """
-        raw_metadata = pd.read_csv(self.metadata_file)
+        metadata_cache = None
+        if self.cache_dir is not None:
+            metadata_cache = cache.get_disk_cache(self.cache_dir, 'metadata', METADATA_VERSION,
+                                                  self.cache_max_bytes)
+            key = cache.text_key('%s %r' % (manifest.Manifest.hash_file(self.metadata_file),
+                                            self.metadata_columns))
+            cached = metadata_cache.get(key)
+            if cached is not None:
+                self.metadata, self.metadata_index = cached
+                return
+
+        usecols = None
+        if self.metadata_columns is not None:
+            usecols = sorted(set(self.metadata_columns).union(REQUIRED_METADATA_COLUMNS))
+        raw_metadata = pd.read_csv(self.metadata_file, usecols=usecols, dtype=METADATA_DTYPES)
         # Only interested in cases after 2000 (since oral arguments starts there
         self.metadata = self._preprocess_meta(raw_metadata[raw_metadata['term'] >= 2000])
+        self.metadata_index = dict(zip(self.metadata['docket'], self.metadata.to_dict('records')))
+        if metadata_cache is not None:
+            metadata_cache.put(key, (self.metadata, self.metadata_index))
 
     def _get_oral_filename(self):
         """
@@ -78,12 +185,17 @@ class Preprocessing(object):
         Not all cases the SCOTUS hears have an oral argument hearing.
         Match the metadata cases (all cases) against the oral argument cases.
         Oral arguments should be a subset of the metadata cases
+        With a shard, only the dockets of the shard are kept
         Updates self.intersect_docket_ids
         """
         oral_filename = self._get_oral_filename()
         oral_docket_ids = [oral_fname.strip('.txt') for oral_fname in oral_filename]
         meta_docket_ids = self.metadata['docket'].unique().tolist()
         self.intersect_docket_ids = list(set(oral_docket_ids).intersection(set(meta_docket_ids)))
+        if self.shard is not None:
+            shard_index, shard_count = self.shard
+            self.intersect_docket_ids = [docket for docket in self.intersect_docket_ids
+                                         if shards.shard_of(docket, shard_count) == shard_index]
 
     def _assign_variables(self):
         """
@@ -100,79 +212,318 @@ class Preprocessing(object):
         """
         if type(s) != str:
             s = str(s)
-        return re.sub('[^0-9a-zA-Z \.\,\:\!\'\"\-]+', ' ', s)
+        return transcript.to_text(s)
 
-    def insert_intersect_docket_meta_oral(self):
+    def insert_intersect_docket_meta_oral(self, n_workers=1, chunksize=10, batch_size=100,
+                                          max_batch_bytes=16 * 1024 * 1024, max_in_flight=None,
+                                          report_prefix=None, profile_slowest=0, statements_dir=None,
+                                          background_writes=False, max_queued_batches=4, checkpoint_every=None,
+                                          index_path=None):
         """
         For each docket, get corresponding metadata and oral argument text and add to
-        mongodb collection
-        :return:
+        the storage (mongodb collection by default)
+        In incremental mode only new or changed dockets are processed (and upserted), and
+        dockets that disappeared from the inputs are removed from the collection.
+        Dockets are streamed through the stages of pipeline.py one at a time, or fanned out to
+        a process pool when n_workers > 1 with at most max_in_flight chunks of dockets queued
+        or waiting to be written. Results come back in docket order and this process is the
+        only one writing to the storage, from a background thread when background_writes is set so
+        that the next dockets are parsed while a batch is in flight.
+        :param n_workers: number of worker processes (1 = run everything in this process)
+        :param chunksize: number of dockets handed to a worker at a time
+        :param max_in_flight: chunks submitted to the pool and not yet written (default 2 * n_workers)
+        :param batch_size: number of documents per bulk insert
+        :param max_batch_bytes: size limit of a bulk insert (BSON size, Mongo only)
+        :param background_writes: write the batches from a thread (bulk_writer.Background_Writer)
+        :param max_queued_batches: batches waiting for the background thread before parsing blocks
+        :param checkpoint_every: every CHECKPOINT_EVERY dockets, wait for the writes and record the
+                                 dockets written so far in the manifest, so that an incremental
+                                 run after a crash resumes from there (None = only at the end)
+        :param report_prefix: write the per-stage/per-docket measurements (self.instrumentation_obj)
+                              to <report_prefix>.json and <report_prefix>.csv
+        :param profile_slowest: re-run the N slowest dockets under cProfile afterwards, saving the
+                                profiles to <report_prefix>.<docket>.pstats (or printing them)
+        :param statements_dir: also export one row per statement (speaker, side, offsets, interrupted,
+                               polarity) as a Parquet dataset partitioned by term, see statement_table.
+                               The export is rewritten from the dockets of the run, so it needs a
+                               full (not incremental) run
+        :param index_path: keep the inverted index of the statements (inverted_index.py) in this file,
+                           updated with the dockets of the run when incremental, rebuilt otherwise.
+                           It is saved at every checkpoint, before the manifest, and unchanged
+                           dockets it does not have (an earlier run without index_path, or
+                           that crashed) are indexed from their stored statements
+        The counts of the run (dockets, count_problems, documents written, ...) are kept in self.run_info
+        :return: count_problems
         """
+        if statements_dir is not None and self.incremental:
+            raise ValueError('statements_dir needs a full run, the export only holds the dockets processed')
         count_problems = 0
+        writer_class = bulk_writer.Background_Writer if background_writes else bulk_writer.Bulk_Writer
+        writer_kwargs = {'max_queued_batches': max_queued_batches} if background_writes else {}
+        writer = writer_class(self.tab, batch_size, max_batch_bytes, upsert=self.incremental, **writer_kwargs)
+        # Transcripts and statements of the split layout
+        text_writer = None
+        if self.layout == 'split':
+            text_writer = writer_class(self.text_tab, batch_size, max_batch_bytes, upsert=self.incremental,
+                                       **writer_kwargs)
+        statement_writer = None
+        if statements_dir is not None:
+            statement_writer = statement_table.Statement_Table_Writer(statements_dir)
+        self.instrumentation_obj = instrumentation.Instrumentation()
+        timer = self.instrumentation_obj.stage
+        start = time.time()
+        index_obj = None
+        if index_path is not None:
+            with timer('index'):
+                index_obj = (inverted_index.Inverted_Index.load(index_path) if self.incremental
+                             else inverted_index.Inverted_Index())
 
-        for i, docket in enumerate(self.intersect_docket_ids):
+        removed_dockets = self.manifest.removed_dockets(self.intersect_docket_ids)
+        if removed_dockets:
+            self.tab.delete(removed_dockets)
+            self.text_tab.delete(removed_dockets)
+            self.manifest.remove(removed_dockets)
+            if index_obj is not None:
+                for docket in removed_dockets:
+                    index_obj.remove_docket(docket)
 
-            if i % 100 == 0:
-                print 'Done %s th doc...' % i
+        tasks = []
+        manifest_entries = []
+        for docket in self.intersect_docket_ids:
+            # Copy, the worker adds the oral argument outputs to meta_dict
+            meta_dict = dict(self.metadata_index[docket])
+            oral_fpath = os.path.join(self.oral_argument_folder, docket + '.txt')
+            with timer('manifest', n_bytes=os.path.getsize(oral_fpath)):
+                entry = self.manifest.make_entry(docket, self.manifest.hash_file(oral_fpath),
+                                                 self.manifest.hash_metadata(meta_dict), self.pipeline_version)
+            if self.incremental and self.manifest.is_current(entry):
+                continue
+            tasks.append((docket, meta_dict, oral_fpath))
+            manifest_entries.append(entry)
 
-            # Get the corresponding metadata based on docket
-            meta_dict = self.metadata[self.metadata['docket'] == docket].iloc[0].to_dict()
+        if index_obj is not None:
+            task_dockets = set(task[0] for task in tasks)
+            unindexed_dockets = [docket for docket in self.intersect_docket_ids
+                                 if docket not in task_dockets and docket not in index_obj.docket_numbers]
+            if unindexed_dockets:
+                with timer('index'):
+                    self._index_stored_dockets(index_obj, unindexed_dockets)
+                print 'Indexed %s unchanged dockets missing from %s' % (len(unindexed_dockets), index_path)
 
-            # Get the oral argument text file and put it into meta_dict
-            oral_fpath = os.path.join(self.oral_argument_folder, docket + '.txt')
-            meta_dict['oral_text'] = open(oral_fpath).read()
+        print '%s dockets to process, %s unchanged, %s removed' % (len(tasks),
+                                                                  len(self.intersect_docket_ids) - len(tasks),
+                                                                  len(removed_dockets))
+
+        pool = None
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            results = pipeline.bounded_imap(pool, _process_docket_task,
+                                            (task + (self.cache_dir, self.cache_max_bytes, statement_writer is not None,
+                                                     self.mmap_transcripts) for task in tasks),
+                                            chunksize, max_in_flight or 2 * n_workers)
+        else:
+            # Stream the dockets through the stages in this process
+            results = ((meta_dict, docket_problems, columns, (os.getpid(), cache_stats()), None)
+                       for meta_dict, docket_problems, columns in pipeline.run(
+                           tasks, self.cache_dir, self.cache_max_bytes, instrumentation_obj=self.instrumentation_obj,
+                           statement_columns=statement_writer is not None, mmap_transcripts=self.mmap_transcripts))
+
+        # Latest cache counters of every process that ran dockets (the counters are cumulative
+        # per process, so this process' counters from previous runs are subtracted)
+        process_cache_stats = {}
+        previous_cache_stats = cache_stats()
+
+        # Dockets whose manifest entries are recorded
+        n_checkpointed = 0
+        try:
+            for i, (meta_dict, docket_problems, columns, (pid, stats), worker_instrumentation) in enumerate(results):
+                process_cache_stats[pid] = stats
+                # Results come back in task order
+                manifest_entries[i]['count_problems'] = docket_problems
+                if worker_instrumentation is not None:
+                    self.instrumentation_obj.merge(worker_instrumentation)
+
+                if i % 100 == 0:
+                    print 'Done %s th doc...' % i
+
+                count_problems += docket_problems
 
-            # for loop to make sure every value in dict is utf-8
-            meta_dict = {k: self._to_utf8(v) for k, v in meta_dict.iteritems()}
+                if i % 100 == 0:
+                    print '# of problems: ', count_problems
 
-            clean_data_obj = clean_data.Clean_Data(docket, meta_dict['oral_text'])
-            clean_data_obj.update_class_variables()
-            count_problems += clean_data_obj.count_problems
+                if index_obj is not None:
+                    with timer('index', meta_dict['_id']):
+                        index_obj.add_docket(meta_dict['_id'], meta_dict['statements'], meta_dict['lawyer_names_lst'])
 
-            # Add output from clean_data_obj to meta_dict
-            meta_dict['oral_text'] = clean_data_obj.oral_text
-            meta_dict['oral_text_start'] = clean_data_obj.oral_text_start
-            meta_dict['oral_text_end'] = clean_data_obj.oral_text_end            
-            meta_dict['potential_lawyers'] = clean_data_obj.potential_lawyers
-            meta_dict['lawyer_names_lst'] = clean_data_obj.lawyer_names_lst
+                # Insert into the storage
+                with timer('storage_write'):
+                    if text_writer is not None:
+                        text_doc = {field: meta_dict.pop(field) for field in TEXT_FIELDS}
+                        text_doc['_id'] = meta_dict['_id']
+                        text_writer.add(text_doc)
+                    writer.add(meta_dict)
+                if columns is not None:
+                    with timer('statement_write'):
+                        statement_writer.add(*columns)
+                if checkpoint_every and (i + 1) % checkpoint_every == 0:
+                    with timer('manifest'):
+                        self._checkpoint(manifest_entries[n_checkpointed:i + 1], writer, text_writer,
+                                         index_obj, index_path)
+                    n_checkpointed = i + 1
+            with timer('storage_write'):
+                writer.close()
+                if text_writer is not None:
+                    text_writer.close()
+            if statement_writer is not None:
+                with timer('statement_write'):
+                    statement_writer.close()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            # Nothing left to do after a successful run, stops the background threads after an error
+            writer.close()
+            if text_writer is not None:
+                text_writer.close()
 
-            # Instantiate interruptions.py
-            interruptions_obj = interruptions.Interruptions(docket, 
-                                                            clean_data_obj.oral_text,
-                                                            clean_data_obj.oral_text_start,
-                                                            clean_data_obj.oral_text_end,
-                                                            clean_data_obj.lawyer_names_dict)
-            interruptions_obj.update_class_variables()
+        print 'Wrote %s documents in %s batches (%s failed, %s retries)' % (writer.n_written, writer.n_batches,
+                                                                           writer.n_failed, writer.n_retries)
+        if text_writer is not None:
+            print 'Wrote %s text documents (%s failed)' % (text_writer.n_written, text_writer.n_failed)
+        if background_writes:
+            print 'Parsing waited %.1f s for the background writer' % writer.blocked_seconds
+        if statement_writer is not None:
+            print 'Wrote %s statements to %s' % (statement_writer.n_rows, statements_dir)
+        if os.getpid() in process_cache_stats:
+            process_cache_stats[os.getpid()] = {
+                name: {counter: value - previous_cache_stats[name][counter] for counter, value in stats.iteritems()}
+                for name, stats in process_cache_stats[os.getpid()].iteritems()}
+        for name in sorted(previous_cache_stats):
+            hits = sum(stats[name]['hits'] for stats in process_cache_stats.itervalues())
+            misses = sum(stats[name]['misses'] for stats in process_cache_stats.itervalues())
+            evictions = sum(stats[name]['evictions'] for stats in process_cache_stats.itervalues())
+            print '%s cache: %s hits, %s misses, %s evictions' % (name, hits, misses, evictions)
+
+        with timer('aggregates'):
+            aggregate_counts = aggregates.rebuild(self.storage, self.collectionname)
+        print 'Aggregates: %s' % ', '.join('%s %s' % (count, suffix) for suffix, count in sorted(aggregate_counts.items()))
+
+        self._checkpoint(manifest_entries[n_checkpointed:], writer, text_writer, index_obj, index_path)
+        if index_obj is not None:
+            print 'Indexed %s dockets in %s (%.1f MB of postings)' % (len(index_obj.docket_numbers), index_path,
+                                                                     index_obj.n_bytes() / 1e6)
+
+        for line in self.instrumentation_obj.summary():
+            print line
+        self.run_info = {'n_dockets': len(tasks), 'n_unchanged': len(self.intersect_docket_ids) - len(tasks),
+                         'n_removed': len(removed_dockets), 'n_workers': n_workers, 'seconds': time.time() - start,
+                         'count_problems': count_problems, 'n_written': writer.n_written,
+                         'n_failed': writer.n_failed, 'n_retries': writer.n_retries,
+                         'background_writes': background_writes}
+        if report_prefix is not None:
+            self.instrumentation_obj.write_json(report_prefix + '.json', **self.run_info)
+            self.instrumentation_obj.write_csv(report_prefix + '.csv')
+        if profile_slowest:
+            self._profile_dockets(tasks, self.instrumentation_obj.slowest_dockets(profile_slowest), report_prefix)
+
+        return count_problems
+
+    def _checkpoint(self, manifest_entries, writer, text_writer=None, index_obj=None, index_path=None):
+        """
+        Wait for the writes, then save the index (without the dockets that failed) and record the
+        manifest entries of the dockets written without failure. The index goes first: a docket
+        in the manifest is skipped by the next incremental run, so it has to be in the index.
+        """
+        writer.sync()
+        failed_ids = set(writer.failed_ids)
+        if text_writer is not None:
+            text_writer.sync()
+            failed_ids.update(text_writer.failed_ids)
+        if index_obj is not None:
+            # Only what is in the storage
+            for docket in failed_ids:
+                index_obj.remove_docket(docket)
+            index_obj.save(index_path)
+        self.manifest.update([entry for entry in manifest_entries if entry['_id'] not in failed_ids])
+
+    def _index_stored_dockets(self, index_obj, dockets):
+        """
+        Add the stored statements of dockets to the index
+        """
+        dockets = set(dockets)
+        lawyer_names = {doc['_id']: doc['lawyer_names_lst'] for doc in self.tab.find(['lawyer_names_lst'])
+                        if doc['_id'] in dockets}
+        statements_tab = self.text_tab if self.layout == 'split' else self.tab
+        for doc in statements_tab.find(['statements']):
+            if doc['_id'] in lawyer_names:
+                index_obj.add_docket(doc['_id'], doc['statements'], lawyer_names[doc['_id']])
+
+    @staticmethod
+    def _profile_dockets(tasks, dockets, report_prefix=None):
+        """
+        Re-run dockets under cProfile (without the disk cache, nothing is written to the storage)
+        Profiles are saved to <report_prefix>.<docket>.pstats, or printed if report_prefix is None
+        """
+        tasks_by_docket = {task[0]: task for task in tasks}
+        for docket in dockets:
+            docket, meta_dict, oral_fpath = tasks_by_docket[docket]
+            profile = cProfile.Profile()
+            profile.runcall(process_docket, docket, dict(meta_dict), oral_fpath)
+            if report_prefix is not None:
+                profile.dump_stats('%s.%s.pstats' % (report_prefix, docket))
+            else:
+                print 'Profile of', docket
+                pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
 
-            # Add output from interruptions.py
-            meta_dict['statements'] = interruptions_obj.statements
-            meta_dict['interruptions_dict'] = interruptions_obj.interruptions_dict
-            meta_dict['interruptions_side_dict'] = interruptions_obj.interruptions_side_dict
 
-            if 'MR.GARRE' in interruptions_obj.interruptions_dict:
-                print 'interruptions_dict', interruptions_obj.docket
-            if 'MR.GARRE' in interruptions_obj.interruptions_side_dict:
-                print 'interruptions_dict', interruptions_obj.docket
+def process_docket(docket, meta_dict, oral_fpath, cache_dir=None, cache_max_bytes=1 << 30,
+                   statement_columns=False, mmap_transcripts=False, instrumentation_obj=None):
+    """
+    Run Clean_Data, Interruptions and Sentiment on one docket (see pipeline.run)
+    Kept at module level so that it can be pickled and run in a worker process
+    :param docket: docket id
+    :param meta_dict: metadata row of the docket
+    :param oral_fpath: path to the oral argument text file
+    :param cache_dir: directory of the Clean_Data disk cache (None = no disk cache)
+    :param cache_max_bytes: size limit of the disk cache
+    :param statement_columns: also return the statement_table rows of the docket
+    :param mmap_transcripts: only copy the argument body out of the memory-mapped transcript
+    :param instrumentation_obj: instrumentation.Instrumentation the stages record into
+    :return: (document to insert, count_problems of the docket, statement rows or None)
+    """
+    return next(pipeline.run([(docket, meta_dict, oral_fpath)], cache_dir, cache_max_bytes,
+                             instrumentation_obj=instrumentation_obj, statement_columns=statement_columns,
+                             mmap_transcripts=mmap_transcripts))
 
-            # Instantiate sentiment_obj.py
-            sentiment_obj = sentiment.Sentiment(docket, interruptions_obj.statements)
-            sentiment_obj.update_class_variables()
 
-            # Add output from sentiment.py
-            meta_dict['sentiment_dict'] = sentiment_obj.sentiment_dict
+def cache_stats():
+    """
+    Returns the counters of this process' caches: {'clean_data': {...}, 'polarity': {...}}
+    """
+    clean_data_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    for (directory, namespace, version, max_bytes), disk_cache in cache._disk_caches.iteritems():
+        if namespace == 'clean_data':
+            for counter in clean_data_stats:
+                clean_data_stats[counter] += getattr(disk_cache, counter)
+    return {'clean_data': clean_data_stats, 'polarity': sentiment.default_cache_stats()}
 
-            if 'MR.GARRE' in sentiment_obj.sentiment_dict:
-                print 'sentiment_dict', sentiment_obj.docket
 
-            if i % 100 == 0:
-                # print docket, clean_data_obj.oral_text_start
-                print '# of problems: ', count_problems
+def _process_docket_task(task):
+    """
+    Unpack a (docket, meta_dict, oral_fpath, cache_dir, cache_max_bytes, statement_columns,
+    mmap_transcripts) task for the process pool
+    :return: (document to insert, count_problems of the docket, statement rows or None,
+              (pid, cache_stats()), Instrumentation of the docket for the parent to merge)
+    """
+    instrumentation_obj = instrumentation.Instrumentation()
+    meta_dict, docket_problems, columns = process_docket(*task, instrumentation_obj=instrumentation_obj)
+    return meta_dict, docket_problems, columns, (os.getpid(), cache_stats()), instrumentation_obj
 
-            # Insert into Mongo
-            self.tab.insert(meta_dict)
 
 if __name__ == '__main__':
     oral_arguments = '/Users/nojzachariah/scotus_oral_arguments/data/z02_converted_pdfs_to_text/'
-    obj = Preprocessing('SCDB_2014_01_justiceCentered_Citation.csv', oral_arguments)
-    # Insert data into Mongo
-    obj.insert_intersect_docket_meta_oral()
+    # e.g. SCOTUS_STORAGE_URL=sqlite:///scotus_cases.db to run without a Mongo server
+    obj = Preprocessing('SCDB_2014_01_justiceCentered_Citation.csv', oral_arguments, incremental=True,
+                        cache_dir='preprocessing_cache', storage_url=os.environ.get('SCOTUS_STORAGE_URL'))
+    # Insert data into the storage
+    obj.insert_intersect_docket_meta_oral(n_workers=multiprocessing.cpu_count())
@@ -0,0 +1,208 @@
+"""
+Re-run some stages of the pipeline on the stored case documents, updating only the fields
+those stages produce
+
+    clean          oral_text, oral_text_start, oral_text_end, potential_lawyers, lawyer_names_lst
+                   (from the transcripts)
+    segment        statements
+    interruptions  interruptions_dict, interruptions_side_dict
+    sentiment      sentiment_dict
+
+The other stages read what an earlier run stored (oral_text, oral_text_start/oral_text_end,
+lawyer_names_lst, statements) instead of re-reading, cleaning and segmenting every transcript.
+A stage always brings the stages whose inputs it changes: clean runs every stage, segment also
+interruptions and sentiment. After a change to the sentiment scorer:
+
+    python recompute.py sentiment --storage-url sqlite:///scotus_cases.db
+
+The aggregates are rebuilt afterwards. The manifest, the Parquet statement export and the
+inverted index are left as they are, bump PIPELINE_VERSION for the next incremental run to
+pick up a changed stage.
+"""
+
+import argparse
+import os
+import time
+import aggregates
+import bulk_writer
+import clean_data
+import instrumentation
+import interruptions
+import pipeline
+import preprocessing
+import storage
+
+STAGES = ('clean', 'segment', 'interruptions', 'sentiment')
+
+# Fields of the case document each stage produces
+STAGE_FIELDS = {'clean': ('oral_text', 'oral_text_start', 'oral_text_end', 'potential_lawyers', 'lawyer_names_lst'),
+                'segment': ('statements',),
+                'interruptions': ('interruptions_dict', 'interruptions_side_dict'),
+                'sentiment': ('sentiment_dict',)}
+
+# Stages whose inputs a stage produces
+DEPENDENT_STAGES = {'clean': ('segment', 'interruptions', 'sentiment'),
+                    'segment': ('interruptions', 'sentiment'),
+                    'interruptions': (),
+                    'sentiment': ()}
+
+# Stored fields the stages after clean read
+STORED_INPUT_FIELDS = ('oral_text', 'oral_text_start', 'oral_text_end', 'lawyer_names_lst', 'statements')
+
+def stages_to_run(stages):
+    """
+    Returns stages plus the stages that depend on them, in pipeline order
+    """
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError('Unknown stage %r, expected some of %s' % (stage, STAGES))
+    selected = set(stages)
+    for stage in stages:
+        selected.update(DEPENDENT_STAGES[stage])
+    return [stage for stage in STAGES if stage in selected]
+
+def _stored_records(storage_obj, collectionname, layout):
+    """
+    Yield a pipeline.Docket_Record per stored case document, with STORED_INPUT_FIELDS in its doc
+    and the Clean_Data object restored from them
+    """
+    tab = storage_obj.table(collectionname)
+    if layout == 'split':
+        case_fields = [field for field in STORED_INPUT_FIELDS if field not in preprocessing.TEXT_FIELDS]
+        case_docs = {doc['_id']: doc for doc in tab.find(case_fields)}
+        docs = (dict(case_docs.get(text_doc['_id'], {}), **text_doc)
+                for text_doc in storage_obj.table(collectionname + '_text').find(STORED_INPUT_FIELDS))
+    else:
+        docs = tab.find(STORED_INPUT_FIELDS)
+
+    for doc in docs:
+        docket = doc['_id']
+        # The storage gives back unicode, the pipeline works on (ASCII) str, which scores faster
+        doc['oral_text'] = doc['oral_text'].encode('utf-8')
+        doc['statements'] = [statement.encode('utf-8') for statement in doc['statements']]
+        record = pipeline.Docket_Record(docket, doc)
+        clean_data_obj = clean_data.Clean_Data(docket, doc['oral_text'])
+        clean_data_obj.oral_text_start = doc['oral_text_start']
+        clean_data_obj.oral_text_end = doc['oral_text_end']
+        clean_data_obj.lawyer_names_lst = doc['lawyer_names_lst']
+        clean_data_obj.lawyer_names_dict = {last_name: side for side, last_name in doc['lawyer_names_lst']}
+        record.clean_data = clean_data_obj
+        yield record
+
+def _restore_spans(records):
+    """
+    Stand-in for pipeline.segment: the spans of the stored statements
+    """
+    for record in records:
+        clean_data_obj = record.clean_data
+        interruptions_obj = interruptions.Interruptions(record.docket, clean_data_obj.oral_text,
+                                                        clean_data_obj.oral_text_start, clean_data_obj.oral_text_end,
+                                                        clean_data_obj.lawyer_names_dict)
+        interruptions_obj.restore_spans(record.doc['statements'])
+        record.interruptions = interruptions_obj
+        yield record
+
+def recompute(storage_obj, stages, collectionname='data', layout='embedded', oral_argument_folder=None,
+              cache_dir=None, cache_max_bytes=1 << 30, mmap_transcripts=False, scorer=None, batch_size=100,
+              instrumentation_obj=None):
+    """
+    Re-run stages (and the stages depending on them, see stages_to_run) on every document of the
+    collectionname table and update the fields they produce, then rebuild the aggregates
+    :param storage_obj: storage backend (storage.py) the documents are in
+    :param layout: storage layout of the documents, see Preprocessing
+    :param oral_argument_folder: where the transcripts are, for the clean stage
+    :param cache_dir, cache_max_bytes, mmap_transcripts: see Preprocessing (clean stage)
+    :param scorer: polarity scorer of the sentiment stage, see sentiment.Sentiment
+    :param instrumentation_obj: instrumentation.Instrumentation the stages record into
+    :return: dict of counts: stages run, dockets, case (and text) documents updated, failed updates,
+             count_problems (None without the clean stage)
+    """
+    if layout not in preprocessing.LAYOUTS:
+        raise ValueError('layout must be one of %s, not %r' % (preprocessing.LAYOUTS, layout))
+    stages = stages_to_run(stages)
+    if 'clean' in stages and oral_argument_folder is None:
+        raise ValueError('The clean stage needs the oral_argument_folder')
+
+    n_missing = 0
+    if 'clean' in stages:
+        tasks = []
+        for doc in storage_obj.table(collectionname).find(['_id']):
+            oral_fpath = os.path.join(oral_argument_folder, doc['_id'] + '.txt')
+            if os.path.exists(oral_fpath):
+                tasks.append((doc['_id'], {}, oral_fpath))
+            else:
+                n_missing += 1
+        records = pipeline.read(tasks, mmap_transcripts, instrumentation_obj)
+        records = pipeline.clean(records, cache_dir, cache_max_bytes, instrumentation_obj)
+    else:
+        records = _stored_records(storage_obj, collectionname, layout)
+    if 'segment' in stages:
+        records = pipeline.segment(records, instrumentation_obj)
+    elif ('interruptions' in stages) or ('sentiment' in stages):
+        records = _restore_spans(records)
+    if 'interruptions' in stages:
+        records = pipeline.find_interruptions(records, instrumentation_obj)
+    if 'sentiment' in stages:
+        records = pipeline.score_sentiment(records, scorer, instrumentation_obj)
+
+    fields = [field for stage in stages for field in STAGE_FIELDS[stage]]
+    text_fields = [field for field in fields if layout == 'split' and field in preprocessing.TEXT_FIELDS]
+    case_fields = [field for field in fields if field not in text_fields]
+    writer = bulk_writer.Bulk_Writer(storage_obj.table(collectionname), batch_size, update_fields=True)
+    text_writer = bulk_writer.Bulk_Writer(storage_obj.table(collectionname + '_text'), batch_size,
+                                          update_fields=True)
+    timer = instrumentation.stage_timer(instrumentation_obj)
+
+    n_dockets = 0
+    count_problems = 0
+    for record in records:
+        n_dockets += 1
+        if record.clean_data is not None:
+            count_problems += record.clean_data.count_problems
+        if 'segment' in stages:
+            record.doc['statements'] = record.interruptions.statements
+        with timer('storage_write'):
+            if case_fields:
+                writer.add(dict(((field, record.doc[field]) for field in case_fields), _id=record.docket))
+            if text_fields:
+                text_writer.add(dict(((field, record.doc[field]) for field in text_fields), _id=record.docket))
+    with timer('storage_write'):
+        writer.close()
+        text_writer.close()
+
+    with timer('aggregates'):
+        aggregates.rebuild(storage_obj, collectionname)
+
+    return {'stages': stages, 'n_dockets': n_dockets, 'n_missing_transcripts': n_missing,
+            'n_updated': writer.n_written, 'n_text_updated': text_writer.n_written,
+            'n_failed': writer.n_failed + text_writer.n_failed,
+            'count_problems': count_problems if 'clean' in stages else None}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-run pipeline stages on the stored case documents')
+    parser.add_argument('stages', nargs='+', choices=STAGES,
+                        help='stages to re-run (the stages depending on them are re-run too)')
+    parser.add_argument('--storage-url', help='where the documents are (default: the local Mongo server)')
+    parser.add_argument('--collection', default='data')
+    parser.add_argument('--layout', choices=preprocessing.LAYOUTS, default='embedded')
+    parser.add_argument('--oral-argument-folder', help='transcripts, for the clean stage')
+    parser.add_argument('--cache-dir', help='Clean_Data disk cache, for the clean stage')
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    storage_obj = storage.open_storage(args.storage_url)
+    instrumentation_obj = instrumentation.Instrumentation()
+    start = time.time()
+    result = recompute(storage_obj, args.stages, args.collection, args.layout, args.oral_argument_folder,
+                       args.cache_dir, batch_size=args.batch_size, instrumentation_obj=instrumentation_obj)
+    storage_obj.close()
+
+    print 'Ran %s on %s dockets in %.1f s: %s documents and %s text documents updated, %s failed' % (
+        ', '.join(result['stages']), result['n_dockets'], time.time() - start, result['n_updated'],
+        result['n_text_updated'], result['n_failed'])
+    if result['n_missing_transcripts']:
+        print '%s dockets skipped, their transcript is missing' % result['n_missing_transcripts']
+    if result['count_problems'] is not None:
+        print '# of problems: ', result['count_problems']
+    for line in instrumentation_obj.summary():
+        print line
@@ -1,30 +1,90 @@
-import re
-from collections import defaultdict
-from textblob import TextBlob
+import numpy as np
+import cache
+import polarity
+import speakers
+
+# Number of distinct statement texts whose polarity is memoized per process
+POLARITY_CACHE_SIZE = 100000
+
+# Loaded on first use and shared by every Sentiment object of the process
+_default_scorer = None
+
+def default_scorer():
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = cache.Caching_Scorer(polarity.Lexicon_Scorer(textblob_compatible=True),
+                                               cache.LRU_Cache(POLARITY_CACHE_SIZE))
+    return _default_scorer
+
+def default_cache_stats():
+    """
+    Returns the hits, misses and evictions of the default scorer's polarity cache, without
+    loading the scorer if this process has not scored anything (all 0)
+    """
+    if _default_scorer is None:
+        return {'hits': 0, 'misses': 0, 'evictions': 0}
+    polarity_cache = _default_scorer.cache
+    return {'hits': polarity_cache.hits, 'misses': polarity_cache.misses, 'evictions': polarity_cache.evictions}
 
 class Sentiment(object):
     """
     Objective: Calculate the sentiment polarity for each statement and assign to
     Petitioner, Respondent, or Justice (where possible)
     """
-    def __init__(self, docket, statements):
+    def __init__(self, docket, oral_text, spans, scorer=None, instrumentation_obj=None, speaker_ids=None,
+                 registry=None):
+        """
+        :param oral_text: text the statements were found in
+        :param spans: (start, end, speaker) of each statement, from Interruptions.spans
+        :param scorer: object whose score(texts) returns a polarity per text (polarity.Lexicon_Scorer
+                       or polarity.TextBlob_Scorer), defaults to the TextBlob compatible Lexicon_Scorer
+                       behind an LRU of statement polarities
+        :param instrumentation_obj: instrumentation.Instrumentation counting scored statements
+                                    (None = not counted)
+        :param speaker_ids: speaker id of each span, from Interruptions.speaker_ids (looked up in
+                            registry, the process's speakers.Speaker_Registry by default, if None)
+        """
         self.docket = docket
-        self.statements = statements
-        self.sentiment_dict = defaultdict(list)
+        self.oral_text = oral_text
+        self.spans = spans
+        self.scorer = scorer if scorer is not None else default_scorer()
+        self.instrumentation_obj = instrumentation_obj
+        self.registry = registry if registry is not None else speakers.default_registry()
+        if speaker_ids is None:
+            speaker_ids = np.array([self.registry.intern(name) if name is not None else speakers.NO_SPEAKER
+                                    for start, end, name in spans], dtype=np.int32)
+        self.speaker_ids = speaker_ids
+        # Speaker name -> polarity of each of its statements, for the case document
+        self.sentiment_dict = {}
+        # Polarity of each span (float64 array, NaN for spans without a speaker)
+        self.polarity_array = None
+
+    @property
+    def polarities(self):
+        """
+        Polarity of each span as a list (None for spans without a speaker)
+        """
+        if self.polarity_array is None:
+            return None
+        # NaN is the only value not equal to itself
+        return [score if score == score else None for score in self.polarity_array.tolist()]
 
     def identify_sentiment_lawyers(self):
-        for statement in self.statements:
-            if len(statement.split(':', 1)) == 2:
-                name, statement_text = statement.split(':', 1)
-                if (len(name.split()) == 1) and name.isupper():
-                    # Some names do not have a space between titles (MR.,MS.) and name
-                    # so removing the title. MongoDB does not like '.'s in keys of dictionaries
-                    name = name.rstrip(' ')
-                    name = name.rstrip('.')
-                    if '.' in name:
-                        name = name.split('.', 1)[-1]
-                    statement_tb = TextBlob(statement_text)
-                    self.sentiment_dict[name].append(statement_tb.sentiment.polarity)
+        span_indices = []
+        statement_texts = []
+        for i, (start, end, name) in enumerate(self.spans):
+            if name is not None:
+                # Score what follows "<name>:"
+                span_indices.append(i)
+                statement_texts.append(self.oral_text[self.oral_text.find(':', start, end) + 1:end])
+
+        # All statements of the docket in one call
+        self.polarity_array = np.full(len(self.spans), np.nan)
+        self.polarity_array[span_indices] = self.scorer.score(statement_texts)
+        self.sentiment_dict = self.registry.series_dict(self.speaker_ids, self.polarity_array)
+
+        if self.instrumentation_obj is not None:
+            self.instrumentation_obj.count('statements_scored', len(statement_texts))
 
         ### Print out examples for review
         # print '#'*30
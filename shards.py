@@ -0,0 +1,203 @@
+"""
+Sharded runs: split the dockets over several processes or machines, then merge their outputs
+
+Every docket belongs to exactly one of N shards, by the hash of its docket id (shard_of), so
+every node computes the same split from the same inputs. A shard writes to its own tables,
+<collection>_shard<i>of<N> (plus its _text, _manifest and _runs tables), in its own storage
+(e.g. a SQLite file per node) or a shared one. Shard runs are incremental: the manifest is
+checkpointed every few dockets, so a shard started again after a crash skips the dockets it
+already wrote. merge copies the shards into <collection>, with a manifest that an incremental
+run on the merged collection picks up, and sums the shards' count_problems and measurements.
+
+On one machine:
+    python shards.py run SCDB.csv oral_arguments/ --shard-index 0 --shard-count 2 --storage-url sqlite:///shard0.db &
+    python shards.py run SCDB.csv oral_arguments/ --shard-index 1 --shard-count 2 --storage-url sqlite:///shard1.db &
+    wait
+    python shards.py merge --shard-count 2 --shard-url sqlite:///shard0.db sqlite:///shard1.db \\
+        --storage-url sqlite:///scotus_cases.db
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import time
+import aggregates
+import bulk_writer
+import manifest
+import preprocessing
+import storage
+
+def shard_of(docket, shard_count):
+    """
+    Returns the shard (0 .. shard_count - 1) of a docket. sha1 rather than hash(), which differs
+    between platforms and Python builds
+    """
+    return int(hashlib.sha1(docket).hexdigest()[:15], 16) % shard_count
+
+def shard_collection(collectionname, shard_index, shard_count):
+    """
+    Returns the name of the case table of a shard
+    """
+    return '%s_shard%sof%s' % (collectionname, shard_index, shard_count)
+
+def run_shard(metadata_file, oral_argument_folder, shard_index, shard_count, storage_url=None,
+              collectionname='data', restart=False, checkpoint_every=100, cache_dir=None, layout='embedded',
+              n_workers=1, report_prefix=None):
+    """
+    Process the dockets of one shard into shard_collection(collectionname, shard_index, shard_count)
+    and record the counts and measurements of the run in its _runs table
+    :param restart: empty the shard's tables first instead of resuming
+    :param checkpoint_every: dockets between manifest checkpoints
+    :param cache_dir, layout: see Preprocessing
+    :param n_workers, report_prefix: see Preprocessing.insert_intersect_docket_meta_oral
+    :return: count_problems of the dockets processed by this run
+    """
+    collection = shard_collection(collectionname, shard_index, shard_count)
+    obj = preprocessing.Preprocessing(metadata_file, oral_argument_folder, collectionname=collection,
+                                      incremental=not restart, cache_dir=cache_dir, layout=layout,
+                                      storage_url=storage_url, shard=(shard_index, shard_count))
+    runs_tab = obj.storage.table(collection + '_runs')
+    if restart:
+        runs_tab.clear()
+    count_problems = obj.insert_intersect_docket_meta_oral(n_workers=n_workers, report_prefix=report_prefix,
+                                                           checkpoint_every=checkpoint_every)
+
+    report = obj.instrumentation_obj.report()
+    run_doc = dict(obj.run_info, _id='%.6f' % time.time(), shard_index=shard_index, shard_count=shard_count,
+                   stages=report['stages'].items(), counters=report['counters'])
+    runs_tab.write_batch([run_doc])
+    obj.storage.close()
+    return count_problems
+
+def merge_shards(shard_storages, shard_count, storage_obj, collectionname='data', batch_size=100):
+    """
+    Copy the case, text and manifest tables of every shard into <collectionname> of storage_obj
+    (emptied first) and rebuild its aggregates
+    :param shard_storages: the storage of every shard, in shard order
+    :return: dict with the counts of every shard ('shards') and their totals. A docket found in a
+             shard it does not belong to is skipped there (the shard's n_misplaced)
+    """
+    tab = storage_obj.table(collectionname)
+    text_tab = storage_obj.table(collectionname + '_text')
+    manifest_tab = storage_obj.table(collectionname + '_manifest')
+    for table in (tab, text_tab, manifest_tab):
+        table.clear()
+    writer = bulk_writer.Bulk_Writer(tab, batch_size)
+    text_writer = bulk_writer.Bulk_Writer(text_tab, batch_size)
+    # Instrumentation stages and counters of every run of every shard, summed
+    stages = collections.OrderedDict()
+    counters = collections.Counter()
+
+    shard_results = []
+    for shard_index, shard_storage in enumerate(shard_storages):
+        collection = shard_collection(collectionname, shard_index, shard_count)
+        shard_manifest = manifest.Manifest(shard_storage.table(collection + '_manifest'))
+        runs = list(shard_storage.table(collection + '_runs').find())
+        for run_doc in runs:
+            for name, stats in run_doc['stages']:
+                totals = stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'bytes': 0})
+                for key in totals:
+                    totals[key] += stats[key]
+            counters.update(run_doc['counters'])
+
+        # A docket is only taken from the shard it belongs to, so that a docket left in the tables
+        # of another shard (e.g. by a run with a different split) is neither merged twice nor
+        # merged from whichever shard comes first
+        belongs = lambda doc: shard_of(doc['_id'], shard_count) == shard_index
+        n_documents = n_misplaced = 0
+        for doc in shard_storage.table(collection).find():
+            if not belongs(doc):
+                n_misplaced += 1
+                continue
+            writer.add(doc)
+            n_documents += 1
+        for doc in shard_storage.table(collection + '_text').find():
+            if belongs(doc):
+                text_writer.add(doc)
+        # The manifest only records the dockets whose documents were written, so that an
+        # incremental run on the merged collection writes the others again
+        writer.sync()
+        text_writer.sync()
+        failed_ids = set(writer.failed_ids).union(text_writer.failed_ids)
+        manifest_entries = [entry for entry in shard_manifest.entries.itervalues()
+                            if belongs(entry) and entry['_id'] not in failed_ids]
+        if manifest_entries:
+            manifest_tab.write_batch(manifest_entries)
+
+        shard_results.append({'shard_index': shard_index, 'n_documents': n_documents, 'n_misplaced': n_misplaced,
+                              'n_dockets': len(manifest_entries),
+                              'count_problems': sum(entry.get('count_problems', 0) for entry in manifest_entries),
+                              'n_runs': len(runs), 'seconds': sum(run_doc['seconds'] for run_doc in runs)})
+        if not manifest_entries:
+            print 'Shard %s of %s has no dockets, was it run?' % (shard_index, shard_count)
+        if n_misplaced:
+            print 'Shard %s of %s: skipped %s documents of dockets of other shards' % (shard_index, shard_count,
+                                                                                     n_misplaced)
+    writer.close()
+    text_writer.close()
+
+    aggregate_counts = aggregates.rebuild(storage_obj, collectionname)
+    return {'shards': shard_results,
+            'n_written': writer.n_written, 'n_failed': writer.n_failed,
+            'n_text_written': text_writer.n_written, 'n_text_failed': text_writer.n_failed,
+            'count_problems': sum(result['count_problems'] for result in shard_results),
+            'aggregates': aggregate_counts,
+            'stages': stages,
+            'counters': dict(counters)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded preprocessing runs and their merge')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='process the dockets of one shard (resumes by default)')
+    run_parser.add_argument('metadata_file', help='SCDB justice-centered CSV')
+    run_parser.add_argument('oral_argument_folder')
+    run_parser.add_argument('--shard-index', type=int, required=True)
+    run_parser.add_argument('--shard-count', type=int, required=True)
+    run_parser.add_argument('--storage-url', help='where the shard writes (default: the local Mongo server)')
+    run_parser.add_argument('--collection', default='data', help='name of the merged table')
+    run_parser.add_argument('--restart', action='store_true', help='empty the shard output instead of resuming')
+    run_parser.add_argument('--checkpoint-every', type=int, default=100, help='dockets between checkpoints')
+    run_parser.add_argument('--n-workers', type=int, default=1)
+    run_parser.add_argument('--cache-dir')
+    run_parser.add_argument('--layout', choices=preprocessing.LAYOUTS, default='embedded')
+    run_parser.add_argument('--report-prefix', help='also write the measurements of this run to '
+                                                    '<REPORT_PREFIX>.json and .csv')
+
+    merge_parser = subparsers.add_parser('merge', help='combine the shard outputs into the final table')
+    merge_parser.add_argument('--shard-count', type=int, required=True)
+    merge_parser.add_argument('--shard-url', nargs='+', default=[None],
+                              help='storage of every shard in shard order, or one storage holding all of them')
+    merge_parser.add_argument('--storage-url', help='where the merged table goes (default: the local Mongo server)')
+    merge_parser.add_argument('--collection', default='data')
+    merge_parser.add_argument('--report', help='write the merged counts and measurements (JSON) here')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        count_problems = run_shard(args.metadata_file, args.oral_argument_folder, args.shard_index,
+                                   args.shard_count, args.storage_url, args.collection, args.restart,
+                                   args.checkpoint_every, cache_dir=args.cache_dir, layout=args.layout,
+                                   n_workers=args.n_workers, report_prefix=args.report_prefix)
+        print 'Shard %s of %s: %s problems' % (args.shard_index, args.shard_count, count_problems)
+
+    elif args.command == 'merge':
+        if len(args.shard_url) not in (1, args.shard_count):
+            parser.error('--shard-url takes one storage URL or one per shard')
+        shard_urls = args.shard_url * args.shard_count if len(args.shard_url) == 1 else args.shard_url
+        # One backend per URL, the merged table may well go where the shards are
+        storages = {url: storage.open_storage(url) for url in set(shard_urls + [args.storage_url])}
+        result = merge_shards([storages[url] for url in shard_urls], args.shard_count, storages[args.storage_url],
+                              args.collection)
+        for shard_result in result['shards']:
+            print ('Shard %(shard_index)s: %(n_documents)s documents, %(n_dockets)s dockets, '
+                   '%(count_problems)s problems, %(n_runs)s runs, %(seconds).1f s' % shard_result)
+        print 'Merged %s documents (%s failed), %s text documents (%s failed), %s problems' % (
+            result['n_written'], result['n_failed'], result['n_text_written'], result['n_text_failed'],
+            result['count_problems'])
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(result, f, indent=2)
+        for storage_obj in storages.itervalues():
+            storage_obj.close()
@@ -0,0 +1,125 @@
+"""
+Speakers as small integer ids, shared by every docket of a process
+
+Names are interned the first time they are seen (the justices up front), so that the stages
+keep per-statement speakers and per-docket counts in numpy arrays indexed by speaker id and
+normalize every distinct "<name>" prefix once. Ids are only meaningful within a process: the
+case document (and so the aggregates built from it) is keyed by name again.
+"""
+
+import numpy as np
+
+# Speakers that are justices (QUESTION: in the older transcripts)
+JUSTICE_NAMES = ('QUESTION', 'SCALIA', 'ROBERTS',
+                 'SOTOMAYOR', 'GINSBURG', 'KENNEDY',
+                 'SOUTER', 'BREYER', 'ALITO',
+                 'STEVENS', 'KAGAN', 'THOMAS',
+                 "O'CONNOR", 'REHNQUIST')
+
+# Side codes, indexes into SIDES
+SIDES = ('PETITIONER', 'RESPONDENT', 'JUSTICE')
+PETITIONER, RESPONDENT, JUSTICE = range(len(SIDES))
+NO_SIDE = -1
+# Speaker id of a statement without a speaker
+NO_SPEAKER = -1
+
+def normalize_speaker(name):
+    """
+    Returns the speaker key of a statement's "<name>" prefix, or None if it is not a speaker
+    Some names do not have a space between titles (MR.,MS.) and name
+    so removing the title. MongoDB does not like '.'s in keys of dictionaries
+    """
+    if (len(name.split()) == 1) and name.isupper():
+        name = name.rstrip(' ')
+        name = name.rstrip('.')
+        if '.' in name:
+            name = name.split('.', 1)[-1]
+        return name
+    return None
+
+class Speaker_Registry(object):
+    """
+    Objective: Map speaker names to ids 0, 1, 2, ... and back, and remember which are justices
+    """
+    def __init__(self, justice_names=JUSTICE_NAMES):
+        # id -> name
+        self.names = []
+        # name -> id
+        self.ids = {}
+        # "<name>" prefix as in the transcript -> id (NO_SPEAKER if it is not a speaker), so that
+        # every distinct prefix is normalized once per process
+        self.prefix_ids = {}
+        self.justice_ids = set()
+        for name in justice_names:
+            self.justice_ids.add(self.intern(name))
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """
+        Returns the id of a (normalized) speaker name, registering it if it is new
+        """
+        speaker_id = self.ids.get(name)
+        if speaker_id is None:
+            speaker_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return speaker_id
+
+    def prefix_id(self, prefix):
+        """
+        Returns the id of the speaker of a statement's "<name>" prefix, NO_SPEAKER if it is not one
+        """
+        speaker_id = self.prefix_ids.get(prefix)
+        if speaker_id is None:
+            name = normalize_speaker(prefix)
+            speaker_id = self.prefix_ids[prefix] = NO_SPEAKER if name is None else self.intern(name)
+        return speaker_id
+
+    def name(self, speaker_id):
+        return self.names[speaker_id] if speaker_id != NO_SPEAKER else None
+
+    def side_codes(self, lawyer_names_dict):
+        """
+        Returns the side code of every registered speaker in a docket (int8 array indexed by id):
+        its lawyers' sides, JUSTICE for the justices that are not one of them, NO_SIDE otherwise
+        :param lawyer_names_dict: lawyer last name -> 'PETITIONER' or 'RESPONDENT' (Clean_Data)
+        """
+        lawyer_ids = [(self.intern(name), SIDES.index(side)) for name, side in lawyer_names_dict.iteritems()]
+        codes = np.full(len(self.names), NO_SIDE, dtype=np.int8)
+        codes[list(self.justice_ids)] = JUSTICE
+        for speaker_id, side in lawyer_ids:
+            codes[speaker_id] = side
+        return codes
+
+    def counts_dict(self, counts):
+        """
+        Returns {name: count} of the non-zero entries of an array indexed by speaker id
+        """
+        return {self.names[speaker_id]: int(counts[speaker_id]) for speaker_id in np.flatnonzero(counts)}
+
+    def series_dict(self, speaker_ids, values):
+        """
+        Returns {name: [value, ...]} of per-statement values, in statement order, skipping the
+        statements without a speaker
+        :param speaker_ids: speaker id of each statement (NO_SPEAKER for none)
+        """
+        speaker_ids = np.asarray(speaker_ids)
+        has_speaker = np.flatnonzero(speaker_ids != NO_SPEAKER)
+        # Statements grouped by speaker, in order within a speaker
+        order = has_speaker[np.argsort(speaker_ids[has_speaker], kind='mergesort')]
+        grouped_ids = speaker_ids[order]
+        bounds = np.flatnonzero(np.diff(grouped_ids)) + 1
+        values = np.asarray(values)[order]
+        return {self.names[group_ids[0]]: group_values.tolist()
+                for group_ids, group_values in zip(np.split(grouped_ids, bounds), np.split(values, bounds))
+                if len(group_ids)}
+
+# Shared by every stage object of the process
+_default_registry = None
+
+def default_registry():
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = Speaker_Registry()
+    return _default_registry
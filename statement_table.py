@@ -0,0 +1,145 @@
+import os
+import shutil
+
+# One row per statement. term is not stored in the files, it is the partition (term=<term>/)
+STATEMENT_COLUMNS = ('docket', 'speaker', 'side', 'start', 'end', 'interrupted', 'polarity')
+# Stored dictionary-encoded, few distinct values repeated on many rows
+DICTIONARY_COLUMNS = ['docket', 'speaker', 'side']
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The statement table needs pyarrow (pip install pyarrow)')
+    return pyarrow, pyarrow.parquet
+
+def _schema(pa):
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([('docket', dictionary),
+                      ('speaker', dictionary),
+                      ('side', dictionary),
+                      ('start', pa.int32()),
+                      ('end', pa.int32()),
+                      ('interrupted', pa.bool_()),
+                      ('polarity', pa.float32())])
+
+def docket_statement_columns(docket, term, oral_text, spans, lawyer_names_dict, justice_names, polarities):
+    """
+    Returns (term, {column: list}) with one row per statement of a docket
+    :param spans: (start, end, speaker) of each statement, from Interruptions.spans
+    :param lawyer_names_dict: lawyer last name -> 'PETITIONER' or 'RESPONDENT'
+    :param justice_names: names that are justices (side 'JUSTICE')
+    :param polarities: polarity of each span, from Sentiment.polarities
+    """
+    columns = {column: [] for column in STATEMENT_COLUMNS}
+    for (start, end, speaker), polarity in zip(spans, polarities):
+        if speaker in lawyer_names_dict:
+            side = lawyer_names_dict[speaker]
+        elif speaker in justice_names:
+            side = 'JUSTICE'
+        else:
+            side = None
+        columns['docket'].append(docket)
+        columns['speaker'].append(speaker)
+        columns['side'].append(side)
+        columns['start'].append(start)
+        columns['end'].append(end)
+        # Same rule as Interruptions.identify_interruptions
+        columns['interrupted'].append(speaker is not None and oral_text.endswith(' --', start, end))
+        columns['polarity'].append(polarity)
+    return int(term), columns
+
+class Statement_Table_Writer(object):
+    """
+    Objective: Write statement rows as a Parquet dataset partitioned by term, for
+    corpus-wide analytics without reading the Mongo documents:
+        <root_dir>/term=<term>/part-0.parquet
+
+    Rows are buffered per term and written as a row group every row_group_size rows.
+    The dataset is rewritten from scratch, so it has to be fed every docket of the run.
+    """
+    def __init__(self, root_dir, row_group_size=100000):
+        self.pa, self.pq = _import_pyarrow()
+        self.schema = _schema(self.pa)
+        self.root_dir = root_dir
+        self.row_group_size = row_group_size
+        # term -> {column: list}
+        self.buffers = {}
+        # term -> pyarrow.parquet.ParquetWriter
+        self.writers = {}
+        self.n_rows = 0
+
+        if os.path.isdir(root_dir):
+            shutil.rmtree(root_dir)
+        os.makedirs(root_dir)
+
+    def add(self, term, columns):
+        """
+        Buffer the rows of one docket (see docket_statement_columns)
+        """
+        buffer = self.buffers.get(term)
+        if buffer is None:
+            buffer = self.buffers[term] = {column: [] for column in STATEMENT_COLUMNS}
+        for column in STATEMENT_COLUMNS:
+            buffer[column].extend(columns[column])
+        self.n_rows += len(columns['start'])
+
+        if len(buffer['start']) >= self.row_group_size:
+            self._flush_term(term)
+
+    def _flush_term(self, term):
+        buffer = self.buffers.pop(term, None)
+        if not buffer or not buffer['start']:
+            return
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            if field.name in DICTIONARY_COLUMNS:
+                arrays.append(pa.array(buffer[field.name], type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(buffer[field.name], type=field.type))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+
+        writer = self.writers.get(term)
+        if writer is None:
+            term_dir = os.path.join(self.root_dir, 'term=%s' % term)
+            os.makedirs(term_dir)
+            writer = self.writers[term] = self.pq.ParquetWriter(os.path.join(term_dir, 'part-0.parquet'),
+                                                                self.schema, compression='snappy')
+        writer.write_table(table)
+
+    def close(self):
+        for term in list(self.buffers):
+            self._flush_term(term)
+        for writer in self.writers.itervalues():
+            writer.close()
+        self.writers = {}
+
+def read_statements(root_dir, columns=None, terms=None):
+    """
+    Returns the statements (or some of their columns) as a pyarrow Table, memory-mapping the
+    files. The speaker columns stay dictionary-encoded, term comes from the partitions.
+    :param terms: only read these terms (the other partitions are not opened)
+    """
+    pa, pq = _import_pyarrow()
+    filters = [('term', 'in', set(str(term) for term in terms))] if terms else None
+    dataset = pq.ParquetDataset(root_dir, filters=filters, memory_map=True, read_dictionary=DICTIONARY_COLUMNS)
+    return dataset.read(columns=columns)
+
+def interruptions_per_justice_per_term(table):
+    """
+    Returns a pandas Series (term, speaker) -> number of the justice's statements that were
+    interrupted (the definition of Interruptions.interruptions_dict)
+    """
+    df = table.to_pandas()
+    df = df[(df['side'] == 'JUSTICE') & df['interrupted']]
+    return df.groupby(['term', 'speaker'], observed=True).size()
+
+def mean_polarity_by_side(table):
+    """
+    Returns a pandas Series side -> mean polarity of the statements of that side (statements
+    of unknown side are left out)
+    """
+    df = table.to_pandas()
+    return df.groupby('side', observed=True)['polarity'].mean()
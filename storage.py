@@ -0,0 +1,400 @@
+"""
+Storage backends: where Preprocessing writes the case documents, the manifest and the aggregates
+
+A backend hands out tables by name. Every table stores documents keyed by '_id' and offers:
+
+    write_batch(docs, upsert=False, retry=False) -> [(index in docs, error message)] of the
+        documents that could not be written (upsert=True replaces documents with the same _id)
+    update_batch(docs, retry=False) -> same, docs only hold _id and the fields to set, the other
+        fields of the stored documents are kept
+    delete(ids), clear(), count()
+    find(fields=None) -> iterator of documents (only fields, plus _id, if given)
+    replace_all(docs, indexes=()) -> replace the whole table at once (aggregates)
+    transient_errors: exceptions worth retrying a batch for
+    doc_size: doc -> bytes counted against a batch's size limit, None if batches have no byte limit
+
+open_storage() selects the backend from a URL:
+    mongodb://host:port/dbname     Mongo (MongoClient defaults without host)
+    sqlite:///path/to/file.db      one SQLite file, WAL mode, one transaction per batch
+    jsonl:///path/to/directory     one append-only <table>.jsonl file per table
+
+pymongo is only imported by the Mongo backend, so the SQLite and JSONL backends start without it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import urlparse
+
+DEFAULT_DBNAME = 'scotus_cases'
+# Duplicate key, when a retried insert_many finds the documents the failed attempt did write
+DUPLICATE_KEY_ERROR = 11000
+
+def _dumps(doc):
+    return json.dumps(doc, separators=(',', ':'))
+
+def _project(doc, fields):
+    if fields is None:
+        return doc
+    return {field: doc[field] for field in ('_id',) + tuple(fields) if field in doc}
+
+class Mongo_Table(object):
+    """
+    Objective: A table in a Mongo collection, written with unordered bulk operations
+    """
+    def __init__(self, collection):
+        from pymongo.errors import AutoReconnect, ExecutionTimeout, WTimeoutError
+        self.collection = collection
+        # Lost connection / primary, server or write concern timeout
+        self.transient_errors = (AutoReconnect, ExecutionTimeout, WTimeoutError)
+
+    @staticmethod
+    def doc_size(doc):
+        """
+        BSON size, what the server's 16 MB message limit counts
+        """
+        import bson
+        return len(bson.BSON.encode(doc))
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        """
+        A document the driver cannot send (too large or not valid BSON) fails the whole bulk call,
+        so the batch is then written one document at a time to report only the failing ones
+        """
+        from pymongo import ReplaceOne
+        from pymongo.errors import BulkWriteError, InvalidDocument
+        try:
+            if upsert:
+                self.collection.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs],
+                                           ordered=False)
+            else:
+                self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            if retry:
+                # Duplicates were written by the attempt that failed
+                write_errors = [error for error in write_errors if error['code'] != DUPLICATE_KEY_ERROR]
+            return [(error['index'], error['errmsg']) for error in write_errors]
+        except InvalidDocument:
+            # DocumentTooLarge is an InvalidDocument
+            return self._write_one_by_one(docs, upsert)
+        return []
+
+    def _write_one_by_one(self, docs, upsert):
+        """
+        The bulk call may have written part of the batch before failing, so duplicates count as
+        written, like on a retry
+        """
+        from pymongo.errors import DuplicateKeyError, InvalidDocument, OperationFailure
+        failed = []
+        for i, doc in enumerate(docs):
+            try:
+                if upsert:
+                    self.collection.replace_one({'_id': doc['_id']}, doc, upsert=True)
+                else:
+                    self.collection.insert_one(doc)
+            except DuplicateKeyError:
+                pass
+            except self.transient_errors:
+                raise
+            except (InvalidDocument, OperationFailure) as e:
+                failed.append((i, str(e)))
+        return failed
+
+    def update_batch(self, docs, retry=False):
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+        try:
+            self.collection.bulk_write([UpdateOne({'_id': doc['_id']},
+                                                  {'$set': {field: value for field, value in doc.iteritems()
+                                                            if field != '_id'}})
+                                        for doc in docs], ordered=False)
+        except BulkWriteError as e:
+            return [(error['index'], error['errmsg']) for error in e.details.get('writeErrors', [])]
+        return []
+
+    def delete(self, ids):
+        self.collection.delete_many({'_id': {'$in': list(ids)}})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def count(self):
+        return self.collection.count_documents({})
+
+    def find(self, fields=None):
+        return self.collection.find({}, None if fields is None else {field: 1 for field in fields})
+
+    def replace_all(self, docs, indexes=()):
+        """
+        Built under a temporary name and renamed over the table, so readers never see it half written
+        :param indexes: lists of (field, direction) to index
+        """
+        tmp = self.collection.database[self.collection.name + '_tmp']
+        tmp.drop()
+        if not docs:
+            self.collection.drop()
+            return
+        tmp.insert_many(docs)
+        for keys in indexes:
+            tmp.create_index(keys)
+        tmp.rename(self.collection.name, dropTarget=True)
+
+class Mongo_Storage(object):
+    """
+    Objective: Tables are the collections of one Mongo database
+    """
+    def __init__(self, dbname=DEFAULT_DBNAME, host=None, port=None, client=None):
+        """
+        :param client: MongoClient (or a stand-in such as mongomock's) to use instead of connecting
+        """
+        if client is None:
+            from pymongo import MongoClient
+            client = MongoClient(host, port)
+        self.client = client
+        self.db = self.client[dbname]
+
+    def table(self, name):
+        return Mongo_Table(self.db[name])
+
+    def close(self):
+        self.client.close()
+
+class SQLite_Table(object):
+    """
+    Objective: A table of an SQLite database: the document as JSON plus indexed docket and term
+    columns
+    """
+    transient_errors = ()
+    doc_size = None
+
+    def __init__(self, storage_obj, name):
+        self.storage_obj = storage_obj
+        self.name = name
+        with self.storage_obj.lock:
+            with self.storage_obj.connection:
+                self.storage_obj.connection.execute('CREATE TABLE IF NOT EXISTS "%s" (_id TEXT PRIMARY KEY, '
+                                                    'docket TEXT, term INTEGER, doc TEXT NOT NULL)' % name)
+                for column in ('docket', 'term'):
+                    self.storage_obj.connection.execute('CREATE INDEX IF NOT EXISTS "%s_%s" ON "%s" (%s)' %
+                                                        (name, column, name, column))
+
+    @staticmethod
+    def _row(doc):
+        term = doc.get('term')
+        return (doc['_id'], doc.get('docket'), int(term) if term is not None else None, _dumps(doc))
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        """
+        Write docs in one transaction. If a document fails the transaction is rolled back and
+        the documents are written one by one, so that only the failing ones are left out (like
+        Mongo's unordered inserts)
+        """
+        statement = 'INSERT %sINTO "%s" VALUES (?, ?, ?, ?)' % ('OR REPLACE ' if upsert else '', self.name)
+        connection = self.storage_obj.connection
+        with self.storage_obj.lock:
+            try:
+                with connection:
+                    connection.executemany(statement, (self._row(doc) for doc in docs))
+                return []
+            except sqlite3.IntegrityError:
+                pass
+            failed = []
+            with connection:
+                for i, doc in enumerate(docs):
+                    try:
+                        connection.execute(statement, self._row(doc))
+                    except sqlite3.IntegrityError as e:
+                        failed.append((i, str(e)))
+            return failed
+
+    def update_batch(self, docs, retry=False):
+        """
+        Read, update and write back every document in one transaction
+        """
+        connection = self.storage_obj.connection
+        failed = []
+        with self.storage_obj.lock:
+            with connection:
+                for i, doc in enumerate(docs):
+                    row = connection.execute('SELECT doc FROM "%s" WHERE _id = ?' % self.name,
+                                             (doc['_id'],)).fetchone()
+                    if row is None:
+                        failed.append((i, 'no document with _id %s' % doc['_id']))
+                        continue
+                    stored = json.loads(row[0])
+                    stored.update(doc)
+                    connection.execute('UPDATE "%s" SET docket = ?, term = ?, doc = ? WHERE _id = ?' % self.name,
+                                       self._row(stored)[1:] + (doc['_id'],))
+        return failed
+
+    def delete(self, ids):
+        with self.storage_obj.lock:
+            with self.storage_obj.connection:
+                self.storage_obj.connection.executemany('DELETE FROM "%s" WHERE _id = ?' % self.name,
+                                                        ((_id,) for _id in ids))
+
+    def clear(self):
+        with self.storage_obj.lock:
+            with self.storage_obj.connection:
+                self.storage_obj.connection.execute('DELETE FROM "%s"' % self.name)
+
+    def count(self):
+        with self.storage_obj.lock:
+            return self.storage_obj.connection.execute('SELECT COUNT(*) FROM "%s"' % self.name).fetchone()[0]
+
+    def find(self, fields=None, chunk_size=100):
+        cursor = self.storage_obj.connection.cursor()
+        with self.storage_obj.lock:
+            cursor.execute('SELECT doc FROM "%s" ORDER BY _id' % self.name)
+        while True:
+            with self.storage_obj.lock:
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for (doc,) in rows:
+                yield _project(json.loads(doc), fields)
+
+    def replace_all(self, docs, indexes=()):
+        """
+        Replaced in one transaction
+        :param indexes: lists of (field, direction) to index, fields other than the _id, docket and
+                        term columns are indexed as expressions on the JSON document
+        """
+        with self.storage_obj.lock:
+            with self.storage_obj.connection:
+                self.storage_obj.connection.execute('DELETE FROM "%s"' % self.name)
+                self.storage_obj.connection.executemany('INSERT INTO "%s" VALUES (?, ?, ?, ?)' % self.name,
+                                                        (self._row(doc) for doc in docs))
+                for keys in indexes:
+                    self.storage_obj.connection.execute('CREATE INDEX IF NOT EXISTS "%s_%s" ON "%s" (%s)' % (
+                        self.name, '_'.join(field for field, direction in keys), self.name,
+                        ', '.join(self._index_column(field, direction) for field, direction in keys)))
+
+    @staticmethod
+    def _index_column(field, direction):
+        column = field if field in ('_id', 'docket', 'term') else "json_extract(doc, '$.%s')" % field
+        return column + (' DESC' if direction < 0 else '')
+
+class SQLite_Storage(object):
+    """
+    Objective: Tables of one SQLite file, for running without a Mongo server
+
+    The database is in WAL mode, so readers are not blocked while a run writes. Every batch is
+    one transaction. Tables may be written from the background writer threads, the connection
+    is shared behind a lock.
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(fpath, timeout=30, check_same_thread=False)
+        self.connection.text_factory = str
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+    def table(self, name):
+        return SQLite_Table(self, name)
+
+    def close(self):
+        self.connection.close()
+
+class JSONL_Table(object):
+    """
+    Objective: An append-only file of one JSON document per line
+
+    Writes only ever append: a document replaces earlier lines with the same _id, delete()
+    appends a tombstone and update_batch() the fields to set. Inserts do not check for an
+    existing _id, updates of a missing document are dropped when read. find() reads the whole
+    file and keeps the last line of every _id, with the later updates applied.
+    """
+    transient_errors = ()
+    doc_size = None
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.lock = threading.Lock()
+
+    def _append(self, lines):
+        with self.lock:
+            with open(self.fpath, 'ab') as f:
+                f.writelines(lines)
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        self._append([_dumps(doc) + '\n' for doc in docs])
+        return []
+
+    def update_batch(self, docs, retry=False):
+        self._append([_dumps(dict(doc, _update=True)) + '\n' for doc in docs])
+        return []
+
+    def delete(self, ids):
+        self._append([_dumps({'_id': _id, '_deleted': True}) + '\n' for _id in ids])
+
+    def clear(self):
+        with self.lock:
+            open(self.fpath, 'wb').close()
+
+    def _documents(self):
+        docs = {}
+        if os.path.exists(self.fpath):
+            with open(self.fpath, 'rb') as f:
+                for line in f:
+                    doc = json.loads(line)
+                    if doc.get('_deleted'):
+                        docs.pop(doc['_id'], None)
+                    elif doc.pop('_update', False):
+                        if doc['_id'] in docs:
+                            docs[doc['_id']].update(doc)
+                    else:
+                        docs[doc['_id']] = doc
+        return docs
+
+    def count(self):
+        return len(self._documents())
+
+    def find(self, fields=None):
+        docs = self._documents()
+        for _id in sorted(docs):
+            yield _project(docs[_id], fields)
+
+    def replace_all(self, docs, indexes=()):
+        """
+        Written to a temporary file and renamed over the table, no indexes
+        """
+        with self.lock:
+            with open(self.fpath + '.tmp', 'wb') as f:
+                f.writelines(_dumps(doc) + '\n' for doc in docs)
+            os.rename(self.fpath + '.tmp', self.fpath)
+
+class JSONL_Storage(object):
+    """
+    Objective: Tables as <directory>/<table>.jsonl, the cheapest sink for one-off local runs
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def table(self, name):
+        return JSONL_Table(os.path.join(self.directory, name + '.jsonl'))
+
+    def close(self):
+        pass
+
+def open_storage(url=None, dbname=DEFAULT_DBNAME):
+    """
+    Returns the backend of a storage URL (see the module docstring)
+    :param url: None = Mongo with the MongoClient defaults
+    :param dbname: Mongo database when the URL does not name one
+    """
+    if url is None:
+        return Mongo_Storage(dbname)
+    parsed = urlparse.urlparse(url)
+    if parsed.scheme == 'mongodb':
+        return Mongo_Storage(parsed.path.strip('/') or dbname, parsed.hostname, parsed.port)
+    if parsed.scheme == 'sqlite':
+        return SQLite_Storage(parsed.netloc + parsed.path)
+    if parsed.scheme == 'jsonl':
+        return JSONL_Storage(parsed.netloc + parsed.path)
+    raise ValueError('Unknown storage URL %r, expected mongodb://, sqlite:// or jsonl://' % url)
@@ -0,0 +1,225 @@
+import csv
+import os
+import random
+import textwrap
+
+# SCDB justiceName -> how the justice is introduced in a transcript
+JUSTICES = (('JGRoberts', 'CHIEF JUSTICE ROBERTS'),
+            ('AScalia', 'JUSTICE SCALIA'),
+            ('AMKennedy', 'JUSTICE KENNEDY'),
+            ('CThomas', 'JUSTICE THOMAS'),
+            ('RBGinsburg', 'JUSTICE GINSBURG'),
+            ('SGBreyer', 'JUSTICE BREYER'),
+            ('SAAlito', 'JUSTICE ALITO'),
+            ('SSotomayor', 'JUSTICE SOTOMAYOR'),
+            ('EKagan', 'JUSTICE KAGAN'),
+            )
+LAWYER_FIRST_NAMES = ('JOHN', 'MARY', 'DAVID', 'SARAH', 'PAUL', 'ELIZABETH', 'THOMAS', 'ANN')
+LAWYER_LAST_NAMES = ('SMITH', 'JONES', 'GARRE', 'CLEMENT', 'WAXMAN', 'OLSON', 'DREEBEN', 'KATYAL',
+                     'PHILLIPS', 'FRIEDMAN', 'BLATT', 'MILLER')
+PARTIES = ('United States', 'Smith', 'Florida', 'Texas', 'Jones', 'Holder', 'California', 'Johnson')
+WORDS = ('the court should not a statute question whether case argument congress intended that is '
+         'it was but we think petitioner respondent clearly section provision rule standard '
+         'reasonable unfair good bad right wrong great terrible very really would could jury '
+         'evidence district circuit appeals precedent doctrine text history purpose remedy').split()
+# Exchanges repeated in every argument
+BOILERPLATE = ("Thank you, counsel.",
+               "Mr. Chief Justice, and may it please the Court:",
+               "Thank you, Mr. Chief Justice.",
+               "Yes, Your Honor.",
+               "No, Your Honor.",
+               )
+# Variants of the opening marker seen in the converted PDFs
+PROCEEDINGS_MARKERS = ('P R O C E E D I N G S', 'PROCEEDINGS', 'P R O C E E D I N G S', 'PROCEDINGS')
+# Reporter boilerplate at the bottom of every page
+PAGE_FOOTER = ('Alderson Reporting Company',
+               '1111 FOURTEENTH STREET, N.W.',
+               'SUITE 400',
+               'WASHINGTON, D.C. 20005',
+               '(202)289-2260',
+               '(800) FOR DEPO',
+               )
+SCDB_COLUMNS = ['caseId', 'docketId', 'term', 'chief', 'docket', 'caseName', 'dateArgument',
+                'decisionDirection', 'majVotes', 'minVotes', 'justice', 'justiceName', 'vote',
+                'opinion', 'direction', 'majority', 'firstAgreement', 'secondAgreement']
+
+class Synthetic_Corpus(object):
+    """
+    Objective: Generate Alderson-style oral argument transcripts and matching rows of the SCDB
+    justice-centered CSV, so that the pipeline can be run and benchmarked at any scale without
+    the original corpus
+
+    The corpus is deterministic: every docket is generated from its own random.Random(seed, i),
+    so the same (seed, n_dockets) always gives the same files, and docket i does not depend on
+    how many dockets are generated.
+    Like the real data, some dockets are argued before 2000 (dropped by Preprocessing) and some
+    have no transcript.
+    """
+    def __init__(self, n_dockets, seed=0, turns=(80, 250), words_per_turn=(3, 80),
+                 missing_transcript_rate=0.1, pre_2000_rate=0.1):
+        """
+        :param n_dockets: number of dockets in the metadata
+        :param turns: (min, max) number of speaker turns per argument
+        :param words_per_turn: (min, max) number of words per turn
+        :param missing_transcript_rate: fraction of dockets without an oral argument transcript
+        :param pre_2000_rate: fraction of dockets argued before the 2000 term
+        """
+        self.n_dockets = n_dockets
+        self.seed = seed
+        self.turns = turns
+        self.words_per_turn = words_per_turn
+        self.missing_transcript_rate = missing_transcript_rate
+        self.pre_2000_rate = pre_2000_rate
+
+    def _random(self, i):
+        return random.Random('%s-%s' % (self.seed, i))
+
+    def docket(self, i):
+        """
+        Returns the metadata of docket i: (docket, term, case name, petitioner lawyer,
+        respondent lawyer, has transcript)
+        """
+        rnd = self._random(i)
+        term = rnd.randint(1995, 1999) if rnd.random() < self.pre_2000_rate else rnd.randint(2000, 2014)
+        docket = '%02d-%d' % (term % 100, 1000 + i)
+        case_name = '%s v. %s' % (rnd.choice(PARTIES), rnd.choice(PARTIES))
+        petitioner_lawyer = (rnd.choice(LAWYER_FIRST_NAMES), rnd.choice(LAWYER_LAST_NAMES))
+        respondent_lawyer = (rnd.choice(LAWYER_FIRST_NAMES),
+                             rnd.choice([name for name in LAWYER_LAST_NAMES if name != petitioner_lawyer[1]]))
+        has_transcript = rnd.random() >= self.missing_transcript_rate
+        return docket, term, case_name, petitioner_lawyer, respondent_lawyer, has_transcript
+
+    def metadata_rows(self, i):
+        """
+        Returns the nine justice-centered SCDB rows of docket i
+        """
+        docket, term, case_name, petitioner_lawyer, respondent_lawyer, has_transcript = self.docket(i)
+        rnd = self._random('meta-%s' % i)
+        direction = rnd.choice([1, 2])
+        dissenters = set(rnd.sample(range(len(JUSTICES)), rnd.choice([0, 0, 1, 2, 3, 4])))
+        rows = []
+        for j, (justice_name, _) in enumerate(JUSTICES):
+            majority = 1 if j in dissenters else 2
+            rows.append({'caseId': '%s-%03d' % (term, i % 1000),
+                         'docketId': '%s-%03d-01' % (term, i % 1000),
+                         'term': term,
+                         'chief': 'Roberts' if term >= 2005 else 'Rehnquist',
+                         'docket': docket,
+                         'caseName': case_name.upper(),
+                         'dateArgument': '%s/%s/%s' % (rnd.randint(1, 12), rnd.randint(1, 28), term),
+                         'decisionDirection': direction,
+                         'majVotes': len(JUSTICES) - len(dissenters),
+                         'minVotes': len(dissenters),
+                         'justice': 100 + j,
+                         'justiceName': justice_name,
+                         'vote': 2 if j in dissenters else 1,
+                         'opinion': rnd.choice([1, 1, 2, 3]),
+                         'direction': direction if j not in dissenters else 3 - direction,
+                         'majority': majority,
+                         'firstAgreement': 100 + rnd.randrange(len(JUSTICES)) if rnd.random() < 0.2 else '',
+                         'secondAgreement': '',
+                         })
+        return rows
+
+    def _turn(self, rnd, speaker):
+        text = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(*self.words_per_turn)))
+        if rnd.random() < 0.1:
+            text = rnd.choice(BOILERPLATE) + ' ' + text
+        ending = rnd.random()
+        if ending < 0.3:
+            # Interrupted
+            text += ' --'
+        elif ending < 0.4:
+            text += '?'
+        else:
+            text += '.'
+        return '%s: %s' % (speaker, text[0].upper() + text[1:])
+
+    def transcript(self, i):
+        """
+        Returns the text of the oral argument of docket i, as converted from the PDF: 25
+        numbered lines per page and the reporter's footer on every page
+        """
+        docket, term, case_name, petitioner_lawyer, respondent_lawyer, has_transcript = self.docket(i)
+        rnd = self._random('transcript-%s' % i)
+        petitioner = 'MR. %s' % petitioner_lawyer[1]
+        respondent = '%s %s' % (rnd.choice(['MR.', 'MS.']), respondent_lawyer[1])
+        justices = [speaker for _, speaker in JUSTICES]
+
+        lines = ['Official - Subject to Final Review',
+                 'IN THE SUPREME COURT OF THE UNITED STATES',
+                 '- - - - - - - - - - - - - - - - x',
+                 '%s, : Petitioner, : v. : No. %s' % (case_name.split(' v. ')[0].upper(), docket),
+                 '%s. : - - - - - - - - - - - - - - - - x' % case_name.split(' v. ')[1].upper(),
+                 'Washington, D.C.',
+                 'The above-entitled matter came on for oral argument before the Supreme Court of the '
+                 'United States at 10:04 a.m.',
+                 'APPEARANCES:',
+                 '%s %s, ESQ., Washington, D.C.; on behalf of the Petitioner.' % petitioner_lawyer,
+                 '%s %s, ESQ., Washington, D.C.; on behalf of the Respondent.' % respondent_lawyer,
+                 'C O N T E N T S',
+                 'ORAL ARGUMENT OF PAGE',
+                 '%s %s, ESQ. On behalf of the Petitioner 3' % petitioner_lawyer,
+                 '%s %s, ESQ. On behalf of the Respondent 28' % respondent_lawyer,
+                 rnd.choice(PROCEEDINGS_MARKERS),
+                 '(10:04 a.m.)',
+                 'CHIEF JUSTICE ROBERTS: We\'ll hear argument first this morning in Case %s, %s.' %
+                 (docket, case_name),
+                 ]
+
+        n_turns = rnd.randint(*self.turns)
+        sides = [('PETITIONER', petitioner_lawyer, petitioner),
+                 ('RESPONDENT', respondent_lawyer, respondent),
+                 ('PETITIONER', petitioner_lawyer, petitioner)]
+        for k, (side, lawyer, lawyer_speaker) in enumerate(sides):
+            title = 'REBUTTAL ARGUMENT' if k == 2 else 'ORAL ARGUMENT'
+            lines.append('%s OF %s %s ON BEHALF OF THE %s' % (title, lawyer[0], lawyer[1], side))
+            lines.append(self._turn(rnd, lawyer_speaker).replace(': ', ': Mr. Chief Justice, and may it '
+                                                                      'please the Court: ', 1))
+            for _ in range(n_turns / 2 if k < 2 else n_turns / 10):
+                speaker = rnd.choice(justices) if rnd.random() < 0.5 else lawyer_speaker
+                lines.append(self._turn(rnd, speaker))
+            if k < 2:
+                lines.append('CHIEF JUSTICE ROBERTS: Thank you, counsel.')
+
+        lines.append('CHIEF JUSTICE ROBERTS: Thank you, counsel. The case is submitted.')
+        lines.append('(Whereupon, at 11:04 a.m., the case in the above-entitled matter was submitted.)')
+
+        # Lay out as numbered lines of at most 60 characters, 25 lines per page
+        page_lines = []
+        for line in lines:
+            page_lines.extend(textwrap.wrap(line, 60))
+        out = []
+        for page, start in enumerate(range(0, len(page_lines), 25)):
+            for number, line in enumerate(page_lines[start:start + 25]):
+                # The PDF conversion loses some of the line numbers
+                out.append('%s   %s' % (number + 1, line) if rnd.random() < 0.9 else '  ' + line)
+            out.extend(PAGE_FOOTER)
+            out.append('%s' % (page + 1))
+        return '\n'.join(out) + '\n'
+
+    def write(self, folder, max_transcripts=None):
+        """
+        Write <folder>/metadata.csv and <folder>/oral_arguments/<docket>.txt
+        :param max_transcripts: only write the transcripts of the first dockets that have one
+                                (None = all), for a large metadata file with a small corpus
+        :return: (metadata file, oral argument folder)
+        """
+        metadata_file = os.path.join(folder, 'metadata.csv')
+        oral_argument_folder = os.path.join(folder, 'oral_arguments')
+        if not os.path.isdir(oral_argument_folder):
+            os.makedirs(oral_argument_folder)
+
+        with open(metadata_file, 'wb') as f:
+            writer = csv.DictWriter(f, SCDB_COLUMNS)
+            writer.writeheader()
+            n_transcripts = 0
+            for i in range(self.n_dockets):
+                writer.writerows(self.metadata_rows(i))
+                docket, term, case_name, petitioner_lawyer, respondent_lawyer, has_transcript = self.docket(i)
+                if has_transcript and (max_transcripts is None or n_transcripts < max_transcripts):
+                    n_transcripts += 1
+                    with open(os.path.join(oral_argument_folder, docket + '.txt'), 'w') as transcript_file:
+                        transcript_file.write(self.transcript(i))
+
+        return metadata_file, oral_argument_folder
@@ -0,0 +1,41 @@
+import unittest
+import aggregates
+
+# SMITH speaks but is not in the docket's lawyer list
+DOC = {'term': '2005',
+       'lawyer_names_lst': [('PETITIONER', 'JONES'), ('RESPONDENT', 'BROWN')],
+       'interruptions_dict': {'SCALIA': 2, 'JONES': 1, 'SMITH': 3},
+       'interruptions_side_dict': {'JUSTICE': 2, 'PETITIONER': 1},
+       'sentiment_dict': {'SCALIA': [0.5, -0.5, 1.0], 'JONES': [0.2], 'BROWN': [0.1, 0.3], 'SMITH': [0.9]}}
+
+class Test_Aggregates(unittest.TestCase):
+    def test_unresolved_lawyer(self):
+        aggregates_obj = aggregates.Aggregates()
+        aggregates_obj.add(DOC)
+        docs = aggregates_obj.documents()
+
+        self.assertEqual([doc['justice'] for doc in docs['justice_terms']], ['SCALIA'])
+        self.assertEqual(docs['justice_terms'][0]['interruptions'], 2)
+        self.assertEqual(docs['justice_terms'][0]['mean_polarity'], 1.0 / 3)
+        self.assertEqual([(doc['side'], doc['statements_scored']) for doc in docs['side_terms']],
+                         [('PETITIONER', 1), ('RESPONDENT', 2)])
+
+        term_doc, = docs['terms']
+        self.assertEqual(term_doc['term'], 2005)
+        self.assertEqual(term_doc['other_speakers'], 1)
+        self.assertEqual(term_doc['interruptions'], 3)
+        self.assertEqual(term_doc['statements_scored'], 6)
+        self.assertAlmostEqual(term_doc['polarity_sum'], 1.6)
+
+    def test_dockets_per_group(self):
+        aggregates_obj = aggregates.Aggregates()
+        aggregates_obj.add(DOC)
+        aggregates_obj.add(dict(DOC, term=2006))
+        aggregates_obj.add(dict(DOC, term=2006))
+        docs = aggregates_obj.documents()
+        self.assertEqual([(doc['_id'], doc['dockets']) for doc in docs['justice_terms']],
+                         [('SCALIA-2005', 1), ('SCALIA-2006', 2)])
+        self.assertEqual([(doc['_id'], doc['dockets']) for doc in docs['terms']], [('2005', 1), ('2006', 2)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import mongomock
+from pymongo.errors import AutoReconnect, WTimeoutError
+import bulk_writer
+import storage
+
+class _Sized_Table(object):
+    """
+    Records the batches written, documents sized by their 'size' field
+    """
+    transient_errors = ()
+
+    def __init__(self):
+        self.batches = []
+
+    @staticmethod
+    def doc_size(doc):
+        return doc['size']
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        self.batches.append([doc['_id'] for doc in docs])
+        return []
+
+class _Flaky_Table(object):
+    """
+    Fails the first n_failures writes with a lost connection or a write concern timeout, then
+    records the batches written and whether they were retries
+    """
+    transient_errors = (AutoReconnect, WTimeoutError)
+    doc_size = None
+
+    def __init__(self, n_failures):
+        self.n_failures = n_failures
+        self.batches = []
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        if self.n_failures:
+            self.n_failures -= 1
+            raise (AutoReconnect if self.n_failures % 2 else WTimeoutError)('flaky')
+        self.batches.append(([doc['_id'] for doc in docs], retry))
+        return []
+
+class _Blocking_Table(object):
+    """
+    Writes block until released, fail with error if it is set
+    """
+    transient_errors = ()
+    doc_size = None
+
+    def __init__(self, error=None):
+        self.error = error
+        self.released = threading.Event()
+        self.batches = []
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        self.released.wait()
+        if self.error is not None:
+            raise self.error
+        self.batches.append([doc['_id'] for doc in docs])
+        return []
+
+class _Reconnecting_Collection(object):
+    """
+    A mongomock collection whose first insert_many writes part of the documents and then loses
+    the connection
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.n_calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def insert_many(self, docs, ordered=True):
+        self.n_calls += 1
+        if self.n_calls == 1:
+            self.collection.insert_many(docs[:2], ordered=ordered)
+            raise AutoReconnect('connection lost')
+        return self.collection.insert_many(docs, ordered=ordered)
+
+class Test_Bulk_Writer(unittest.TestCase):
+    def test_flush_on_bytes(self):
+        table = _Sized_Table()
+        writer = bulk_writer.Bulk_Writer(table, batch_size=10, max_batch_bytes=100)
+        for i, size in enumerate([40, 40, 40, 90, 10]):
+            writer.add({'_id': i, 'size': size})
+        writer.close()
+        self.assertEqual(table.batches, [[0, 1], [2], [3, 4]])
+
+    def test_sqlite_without_bson(self):
+        # The SQLite table has no byte limit, its documents are not BSON encoded
+        folder = tempfile.mkdtemp(prefix='scotus_test_')
+        bson_module = sys.modules.get('bson')
+        sys.modules['bson'] = None
+        try:
+            storage_obj = storage.open_storage('sqlite://' + os.path.join(folder, 'cases.db'))
+            writer = bulk_writer.Bulk_Writer(storage_obj.table('data'), batch_size=2)
+            for i in range(5):
+                writer.add({'_id': str(i), 'docket': str(i)})
+            writer.close()
+            self.assertEqual((writer.n_batches, writer.n_written), (3, 5))
+            storage_obj.close()
+        finally:
+            if bson_module is None:
+                del sys.modules['bson']
+            else:
+                sys.modules['bson'] = bson_module
+            shutil.rmtree(folder)
+
+class Test_Retries(unittest.TestCase):
+    def setUp(self):
+        self.waits = []
+        self.sleep = bulk_writer.time.sleep
+        bulk_writer.time.sleep = self.waits.append
+
+    def tearDown(self):
+        bulk_writer.time.sleep = self.sleep
+
+    def test_backoff(self):
+        table = _Flaky_Table(3)
+        writer = bulk_writer.Bulk_Writer(table, batch_size=2, backoff_seconds=0.5)
+        for i in range(3):
+            writer.add({'_id': i})
+        writer.close()
+        self.assertEqual(self.waits, [0.5, 1.0, 2.0])
+        self.assertEqual(table.batches, [([0, 1], True), ([2], False)])
+        self.assertEqual((writer.n_written, writer.n_failed, writer.n_retries), (3, 0, 3))
+
+    def test_give_up(self):
+        writer = bulk_writer.Bulk_Writer(_Flaky_Table(3), max_retries=2)
+        writer.add({'_id': 0})
+        self.assertRaises(_Flaky_Table.transient_errors, writer.close)
+        self.assertEqual(self.waits, [0.5, 1.0])
+
+    def test_duplicates_on_retry(self):
+        # The retried insert_many finds the documents the lost one wrote
+        collection = mongomock.MongoClient().db.data
+        writer = bulk_writer.Bulk_Writer(storage.Mongo_Table(_Reconnecting_Collection(collection)), batch_size=5)
+        for i in range(5):
+            writer.add({'_id': str(i)})
+        writer.close()
+        self.assertEqual((writer.n_written, writer.n_failed, writer.n_retries), (5, 0, 1))
+        self.assertEqual(collection.count_documents({}), 5)
+
+    def test_background_retries(self):
+        table = _Flaky_Table(2)
+        writer = bulk_writer.Background_Writer(table, batch_size=2)
+        for i in range(5):
+            writer.add({'_id': i})
+        writer.close()
+        self.assertEqual([ids for ids, retry in table.batches], [[0, 1], [2, 3], [4]])
+        self.assertEqual((writer.n_written, writer.n_retries), (5, 2))
+
+class Test_Background_Writer(unittest.TestCase):
+    def test_add_blocks_on_full_queue(self):
+        table = _Blocking_Table()
+        writer = bulk_writer.Background_Writer(table, batch_size=1, max_queued_batches=1)
+        # One batch being written, one queued, the third add waits for room
+        adding = threading.Thread(target=lambda: [writer.add({'_id': i}) for i in range(3)])
+        adding.start()
+        adding.join(0.2)
+        self.assertTrue(adding.is_alive())
+        table.released.set()
+        adding.join()
+        writer.close()
+        self.assertEqual(table.batches, [[0], [1], [2]])
+        self.assertTrue(writer.blocked_seconds > 0.1)
+
+    def test_error_raised_again(self):
+        table = _Blocking_Table(ValueError('not transient'))
+        table.released.set()
+        writer = bulk_writer.Background_Writer(table, batch_size=1)
+        writer.add({'_id': 0})
+        writer.queue.join()
+        self.assertRaises(ValueError, writer.add, {'_id': 1})
+        self.assertRaises(ValueError, writer.flush)
+        self.assertRaises(ValueError, writer.sync)
+        self.assertRaises(ValueError, writer.close)
+        self.assertFalse(writer.thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
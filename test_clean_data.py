@@ -0,0 +1,77 @@
+import unittest
+import clean_data
+
+# Reporter boilerplate at the bottom of every page, then the page number
+FOOTER = ('Alderson Reporting Company\n1111 FOURTEENTH STREET, N.W.\nSUITE 400\nWASHINGTON, D.C. 20005\n'
+          '(202)289-2260\n(800) FOR DEPO\n')
+
+def transcript(start_marker, end_line):
+    """
+    Returns a two page transcript as converted from the PDF, some line numbers lost
+    """
+    return ('Official - Subject to Final Review\n'
+            '1   IN THE SUPREME COURT OF THE UNITED STATES\n'
+            '2   APPEARANCES:\n'
+            '3   JOHN SMITH, ESQ., Washington, D.C.; on behalf of the Petitioner.\n'
+            '    MARY JONES, ESQ., New York, N.Y.; on behalf of the Respondent.\n'
+            '4   %s\n'
+            '5   (10:04 a.m.)\n'
+            '6   CHIEF JUSTICE ROBERTS: We\'ll hear argument first this morning in Case 01-1234.\n'
+            '7   ORAL ARGUMENT OF JOHN SMITH ON BEHALF OF THE PETITIONER\n'
+            '    MR. SMITH: Mr. Chief Justice, and may it please the Court: Section 12 of the Act --\n'
+            + FOOTER + '2\n'
+            '1   JUSTICE SCALIA: Is that in 28 U.S.C.? MR. SMITH: It is,   Your Honor.\n'
+            '2   ORAL ARGUMENT OF MARY JONES ON BEHALF OF THE RESPONDENT\n'
+            '    MS. JONES: Thank you. The statute of 1990 says otherwise.\n'
+            '3   %s\n'
+            '4   (Whereupon, at 11:04 a.m., the case in the above-entitled matter was submitted.)\n'
+            + FOOTER + '3\n') % (start_marker, end_line)
+
+def clean(text):
+    clean_data_obj = clean_data.Clean_Data('01-1234', text)
+    clean_data_obj.update_class_variables()
+    return clean_data_obj
+
+class Test_Clean_Data(unittest.TestCase):
+    """
+    Output of the original cleaning (replace, collapse whitespace, drop numbers, markers in
+    priority order), byte for byte
+    """
+    def test_oral_text(self):
+        clean_data_obj = clean(transcript('P R O C E E D I N G S', 'CHIEF JUSTICE ROBERTS: Thank you, counsel. '
+                                                                   'The case is submitted.'))
+        self.assertEqual(clean_data_obj.oral_text,
+                         "- Subject to Final Review IN THE SUPREME COURT OF THE UNITED STATES APPEARANCES: JOHN "
+                         "SMITH, ESQ., Washington, D.C.; on behalf of the Petitioner. MARY JONES, ESQ., New York, "
+                         "N.Y.; on behalf of the Respondent. P R O C E E D I N G S (10:04 a.m.) CHIEF JUSTICE "
+                         "ROBERTS: We'll hear argument first this morning in Case-1234. ORAL ARGUMENT OF JOHN SMITH "
+                         "ON BEHALF OF THE PETITIONER MR. SMITH: Mr. Chief Justice, and may it please the Court: "
+                         "Section of the Act -- JUSTICE SCALIA: Is that in U.S.C.? MR. SMITH: It is, Your Honor. "
+                         "ORAL ARGUMENT OF MARY JONES ON BEHALF OF THE RESPONDENT MS. JONES: Thank you. The statute "
+                         "of says otherwise. CHIEF JUSTICE ROBERTS: Thank you, counsel. The case is submitted. "
+                         "(Whereupon, at:04 a.m., the case in the above-entitled matter was submitted.)")
+        # 'above-entitled matter was submitted.' comes before 'case is submitted.' in priority
+        self.assertEqual((clean_data_obj.oral_text_start, clean_data_obj.oral_text_end), (211, 737))
+        self.assertEqual(clean_data_obj.lawyer_names_lst, [('PETITIONER', 'SMITH'), ('RESPONDENT', 'JONES')])
+        self.assertEqual(clean_data_obj.lawyer_names_dict, {'SMITH': 'PETITIONER', 'JONES': 'RESPONDENT'})
+        self.assertEqual(clean_data_obj.count_problems, 0)
+
+    def test_marker_variants(self):
+        for start_marker, start in (('PROCEDINGS', 209), ('PR OCEEDINGS', 209),
+                                    ('The above-entitled argument before the Supreme Court', 209),
+                                    # 'PROCEEDING' wins over the earlier, lower priority marker
+                                    ('above-entitled matter came on for oral argument. PROCEEDINGS', 258)):
+            clean_data_obj = clean(transcript(start_marker, 'Thank you.'))
+            self.assertEqual(clean_data_obj.oral_text_start, start, start_marker)
+            self.assertEqual(clean_data_obj.oral_text[clean_data_obj.oral_text_end:],
+                             'above-entitled matter was submitted.)')
+            self.assertEqual(clean_data_obj.lawyer_names_lst, [('PETITIONER', 'SMITH'), ('RESPONDENT', 'JONES')])
+
+    def test_no_markers(self):
+        clean_data_obj = clean(transcript('(10:03 a.m.)', 'Thank you.').replace('above-entitled matter', 'matter'))
+        self.assertEqual((clean_data_obj.oral_text_start, clean_data_obj.oral_text_end), (-1, -1))
+        self.assertEqual(clean_data_obj.lawyer_names_lst, [])
+        self.assertEqual(clean_data_obj.count_problems, 1)
+
+if __name__ == '__main__':
+    unittest.main()
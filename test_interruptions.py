@@ -0,0 +1,84 @@
+import unittest
+import interruptions
+
+LAWYER_NAMES_DICT = {'SMITH': 'PETITIONER', 'JONES': 'RESPONDENT'}
+
+ARGUMENT = ("CHIEF JUSTICE ROBERTS: We'll hear argument first this morning in Case 01-1. MR. SMITH: Mr. Chief "
+            "Justice, and may it please the Court: The statute is clear -- JUSTICE SCALIA: Is it? Then why are we "
+            "here -- MR. SMITH: Because the court below erred. JUSTICE GINSBURG: Thank you, counsel. MS. JONES: "
+            "The respondent disagrees with that reading -- CHIEF JUSTICE ROBERTS: Thank you, counsel. The case "
+            "is submitted.")
+
+class Test_Interruptions(unittest.TestCase):
+    """
+    Statements and interruptions of fixed arguments, as the original segmentation found them
+    (including its quirks: the name before a colon is measured by str([word])[2:-2])
+    """
+    def _interruptions(self, text, start=0, end=None):
+        interruptions_obj = interruptions.Interruptions('01-1', text, start, len(text) if end is None else end,
+                                                        LAWYER_NAMES_DICT)
+        interruptions_obj.update_class_variables()
+        for (span_start, span_end, speaker), statement in zip(interruptions_obj.spans, interruptions_obj.statements):
+            self.assertEqual(text[span_start:span_end], statement)
+            self.assertEqual(speaker, interruptions.statement_speaker(statement))
+        return (interruptions_obj.statements, dict(interruptions_obj.interruptions_dict),
+                dict(interruptions_obj.interruptions_side_dict))
+
+    def test_argument(self):
+        self.assertEqual(self._interruptions(ARGUMENT),
+                         ([": We'll hear argument first this morning in Case 01-1.",
+                           'SMITH: Mr. Chief Justice, and may it please the ',
+                           'Court: The statute is clear --',
+                           'SCALIA: Is it? Then why are we here --',
+                           'SMITH: Because the court below erred.',
+                           'GINSBURG: Thank you, counsel.',
+                           'JONES: The respondent disagrees with that reading --',
+                           'ROBERTS: Thank you, counsel. The case is submitted.'],
+                          {'JONES': 1, 'SCALIA': 1}, {'RESPONDENT': 1}))
+
+    def test_part_of_the_text(self):
+        # The argument is oral_text[23:-31]
+        statements, interruptions_dict, interruptions_side_dict = self._interruptions(ARGUMENT, 23, -31)
+        self.assertEqual(statements[0], "We'll hear argument first this morning in Case 01-1.")
+        self.assertEqual(statements[-1], 'ROBERTS: Thank you, ')
+        self.assertEqual(len(statements), 8)
+        self.assertEqual((interruptions_dict, interruptions_side_dict), ({'JONES': 1, 'SCALIA': 1}, {'RESPONDENT': 1}))
+
+    def test_quotes(self):
+        # repr escapes the single quote of a word that also has a double quote
+        text = ('MR. SMITH: The statute says "isn\'t": it means what it says -- JUSTICE KAGAN: The word "don\'t": '
+                'is that in the text? MR. SMITH: Yes, Your Honor, it is --')
+        self.assertEqual(self._interruptions(text),
+                         ([': The statute says', ' "isn\'t": it means what it says --', 'KAGAN: The word',
+                           ' "don\'t": is that in the text?', 'SMITH: Yes, Your Honor, it is --'],
+                          {'SMITH': 1}, {'PETITIONER': 1}))
+
+    def test_backslashes(self):
+        text = ('MR. SMITH: The path C:\\dir\\file: is not in the record at all -- JUSTICE ALITO: Why a\\b: matters '
+                'here is unclear to me. MS. JONES: It does not matter at all --')
+        self.assertEqual(self._interruptions(text),
+                         ([': The path', 'h C:\\dir\\file: is not in the record at all --',
+                           ' a\\b: matters here is unclear to me.', 'JONES: It does not matter at all --'],
+                          {'JONES': 1}, {'RESPONDENT': 1}))
+
+    def test_non_ascii(self):
+        # repr escapes every byte of a UTF-8 character
+        text = ('MR. SMITH: The word caf\xc3\xa9: is borrowed from French and the word na\xc3\xafve: too -- '
+                'JUSTICE BREYER: Where is that in the brief at all? MS. JONES: Page four, Your Honor.')
+        self.assertEqual(self._interruptions(text),
+                         ([': The word caf\xc3\xa9', ': is borrowed from French and the',
+                           ' word na\xc3\xafve: too --', 'BREYER: Where is that in the brief at all?',
+                           'JONES: Page four, Your Honor.'],
+                          {}, {}))
+
+    def test_restore_spans(self):
+        interruptions_obj = interruptions.Interruptions('01-1', ARGUMENT, 0, len(ARGUMENT), LAWYER_NAMES_DICT)
+        interruptions_obj.update_class_variables()
+        restored = interruptions.Interruptions('01-1', ARGUMENT, 0, len(ARGUMENT), LAWYER_NAMES_DICT)
+        restored.restore_spans(interruptions_obj.statements)
+        restored.identify_interruptions()
+        self.assertEqual(restored.spans, interruptions_obj.spans)
+        self.assertEqual(restored.interruptions_dict, interruptions_obj.interruptions_dict)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import inverted_index
+import pipeline
+import preprocessing
+import synthetic
+
+STATEMENTS = ['SCALIA: Is originalism the rule here --',
+              'SMITH: No, Your Honor, the statute --',
+              'SCALIA: Then answer the question.',
+              'JONES: The statute is clear.']
+LAWYER_NAMES_LST = [('PETITIONER', 'SMITH'), ('RESPONDENT', 'JONES')]
+
+class Test_Postings(unittest.TestCase):
+    def test_encode_decode(self):
+        for keys in ([], [0], [5, 6, 200, 1 << 20, (1 << 40) + 3]):
+            self.assertEqual(inverted_index.decode(inverted_index.encode(keys)).tolist(), keys)
+
+    def test_query(self):
+        index_obj = inverted_index.Inverted_Index()
+        index_obj.add_docket('01-1', STATEMENTS, LAWYER_NAMES_LST)
+        search = lambda text: index_obj.search(inverted_index.parse_query(text))
+        self.assertEqual(search('speaker:SCALIA'), [('01-1', 0), ('01-1', 2)])
+        self.assertEqual(search('statute -interrupted:1'), [('01-1', 3)])
+        # SMITH cut off SCALIA, then was cut off by SCALIA
+        self.assertEqual(search('interrupts:JUSTICE'), [('01-1', 1)])
+        self.assertEqual(search('interrupts:PETITIONER side:JUSTICE'), [('01-1', 2)])
+        self.assertEqual(search('side:PETITIONER|RESPONDENT'), [('01-1', 1), ('01-1', 3)])
+
+    def test_reindex_and_compact(self):
+        index_obj = inverted_index.Inverted_Index()
+        index_obj.add_docket('01-1', STATEMENTS, LAWYER_NAMES_LST)
+        index_obj.add_docket('01-2', STATEMENTS[:2], LAWYER_NAMES_LST)
+        index_obj.add_docket('01-1', STATEMENTS[2:], LAWYER_NAMES_LST)
+        query = inverted_index.parse_query('speaker:SCALIA')
+        self.assertEqual(sorted(index_obj.search(query)), [('01-1', 0), ('01-2', 0)])
+        index_obj.compact()
+        self.assertEqual(index_obj.dropped_numbers, set())
+        self.assertEqual(sorted(index_obj.search(query)), [('01-1', 0), ('01-2', 0)])
+
+class Test_Index_Runs(unittest.TestCase):
+    """
+    The index kept by Preprocessing.insert_intersect_docket_meta_oral(index_path=...) has every
+    stored docket, however the collection was filled
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.metadata_file, self.oral_argument_folder = synthetic.Synthetic_Corpus(
+            30, turns=(20, 40)).write(self.folder)
+        self.storage_url = 'sqlite://' + os.path.join(self.folder, 'cases.db')
+        self.index_path = os.path.join(self.folder, 'index.pkl')
+        self.run_pipeline = pipeline.run
+
+    def tearDown(self):
+        pipeline.run = self.run_pipeline
+        shutil.rmtree(self.folder)
+
+    def _run(self, incremental, **kwargs):
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=incremental,
+                                          storage_url=self.storage_url)
+        try:
+            obj.insert_intersect_docket_meta_oral(**kwargs)
+        finally:
+            obj.storage.close()
+        return obj
+
+    def _check_index(self, obj):
+        """
+        The index has the stored dockets and finds what a scan of their statements finds
+        """
+        storage_obj = preprocessing.storage.open_storage(self.storage_url)
+        docs = list(storage_obj.table('data').find(['statements', 'lawyer_names_lst']))
+        storage_obj.close()
+        index_obj = inverted_index.Inverted_Index.load(self.index_path)
+        self.assertEqual(sorted(index_obj.docket_numbers), sorted(doc['_id'] for doc in docs))
+        self.assertEqual(len(docs), len(obj.intersect_docket_ids))
+
+        expected = [(doc['_id'], i) for doc in docs
+                    for i, keys in enumerate(inverted_index.statement_facets(doc['statements'],
+                                                                             doc['lawyer_names_lst']))
+                    if 'speaker:SCALIA' in keys and 'interrupted:1' in keys]
+        query = inverted_index.parse_query('speaker:SCALIA interrupted:1')
+        self.assertEqual(sorted(index_obj.search(query)), sorted(expected))
+        self.assertTrue(len(expected) > 0)
+
+    def test_crash_and_resume(self):
+        def crashing_run(*args, **kwargs):
+            for i, result in enumerate(self.run_pipeline(*args, **kwargs)):
+                if i == 12:
+                    raise RuntimeError('simulated crash')
+                yield result
+        pipeline.run = crashing_run
+        with self.assertRaises(RuntimeError):
+            self._run(False, checkpoint_every=5, index_path=self.index_path)
+        self.assertEqual(len(inverted_index.Inverted_Index.load(self.index_path).docket_numbers), 10)
+
+        pipeline.run = self.run_pipeline
+        obj = self._run(True, checkpoint_every=5, index_path=self.index_path)
+        self.assertEqual(obj.run_info['n_unchanged'], 10)
+        self._check_index(obj)
+
+    def test_index_an_existing_collection(self):
+        self._run(True)
+        obj = self._run(True, index_path=self.index_path)
+        self.assertEqual(obj.run_info['n_dockets'], 0)
+        self._check_index(obj)
+
+    def test_index_split_layout(self):
+        # Statements are in the _text table
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=True,
+                                          storage_url=self.storage_url, layout='split')
+        obj.insert_intersect_docket_meta_oral()
+        obj.insert_intersect_docket_meta_oral(index_path=self.index_path)
+        obj.storage.close()
+        index_obj = inverted_index.Inverted_Index.load(self.index_path)
+        self.assertEqual(len(index_obj.docket_numbers), len(obj.intersect_docket_ids))
+        self.assertTrue(np.all(np.diff(index_obj.keys('all')) > 0))
+
+if __name__ == '__main__':
+    unittest.main()
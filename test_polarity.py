@@ -0,0 +1,38 @@
+import unittest
+from textblob import TextBlob
+import polarity
+
+# Cleaned (whitespace collapsed) statements exercising PatternAnalyzer's rules
+STATEMENTS = ['SCALIA: That is a good argument.',
+              'SCALIA: That is not a good argument.',
+              "SMITH: I don't think that is right, Your Honor.",
+              'JONES: It was never a fair reading of the statute.',
+              'GINSBURG: That is a very good point, a really very bad result.',
+              'SMITH: The court below was extremely wrong and deeply unfair.',
+              'ROBERTS: Wonderful!',
+              'SCALIA: That is wonderful!!! Really great!',
+              'SMITH: Happy to answer :-) and glad to be here :)',
+              'JONES: That is sad :( but true.',
+              'SCALIA: Oh, that is a brilliant theory (!)',
+              'KAGAN: A nice ( ! ) reading of the brief.',
+              'SMITH: The "best" reading, Mr. Chief Justice, e.g. in Smith v. Jones, is plain.',
+              'BREYER: Is it -- is it not -- the worst, the least bad, of the options?',
+              'QUESTION: Well --',
+              '',
+              'JONES: No.']
+
+class Test_Lexicon_Scorer(unittest.TestCase):
+    def test_textblob_compatible(self):
+        scores = polarity.Lexicon_Scorer(textblob_compatible=True).score(STATEMENTS)
+        self.assertEqual(len(scores), len(STATEMENTS))
+        for statement, score in zip(STATEMENTS, scores):
+            self.assertAlmostEqual(score, TextBlob(statement).sentiment.polarity, places=9, msg=statement)
+
+    def test_rules_matter(self):
+        # The statements are scored differently without the rules, so the comparison above tests them
+        compatible = polarity.Lexicon_Scorer(textblob_compatible=True).score(STATEMENTS)
+        fast = polarity.Lexicon_Scorer(textblob_compatible=False).score(STATEMENTS)
+        self.assertTrue(sum(abs(a - b) > 1e-9 for a, b in zip(compatible, fast)) >= 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+import preprocessing
+import sentiment
+import synthetic
+
+class Test_Incremental(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.metadata_file, self.oral_argument_folder = synthetic.Synthetic_Corpus(
+            20, turns=(20, 40)).write(self.folder)
+        self.storage_url = 'sqlite://' + os.path.join(self.folder, 'cases.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _run(self, **kwargs):
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=True,
+                                          storage_url=self.storage_url, **kwargs)
+        obj.insert_intersect_docket_meta_oral()
+        docs = {doc['_id']: doc for doc in obj.tab.find(['oral_text', 'oral_text_start', 'oral_text_end'])}
+        obj.storage.close()
+        return obj.run_info, docs
+
+    def test_unchanged_dockets_are_skipped(self):
+        run_info, docs = self._run()
+        self.assertEqual(run_info['n_unchanged'], 0)
+        run_info, docs = self._run()
+        self.assertEqual((run_info['n_dockets'], run_info['n_unchanged']), (0, len(docs)))
+
+    def test_skipped_run_does_not_load_the_scorer(self):
+        self._run()
+        sentiment._default_scorer = None
+        run_info, docs = self._run()
+        self.assertEqual(run_info['n_dockets'], 0)
+        self.assertTrue(sentiment._default_scorer is None)
+
+    def test_mmap_transcripts_reprocesses(self):
+        # The stored oral_text and offsets differ between the two modes
+        run_info, docs = self._run()
+        mmap_run_info, mmap_docs = self._run(mmap_transcripts=True)
+        self.assertEqual(mmap_run_info['n_dockets'], len(docs))
+        for docket, doc in mmap_docs.iteritems():
+            self.assertEqual(doc['oral_text'][doc['oral_text_start']:doc['oral_text_end']],
+                             docs[docket]['oral_text'][docs[docket]['oral_text_start']:docs[docket]['oral_text_end']])
+        run_info, docs = self._run()
+        self.assertEqual(run_info['n_dockets'], len(docs))
+
+class Test_Workers(unittest.TestCase):
+    """
+    Worker processes store the same documents and count the same problems as a serial run
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.metadata_file, self.oral_argument_folder = synthetic.Synthetic_Corpus(
+            20, turns=(20, 40)).write(self.folder)
+        # Some transcripts without a respondent, so that there are problems to count
+        for fname in sorted(os.listdir(self.oral_argument_folder))[:3]:
+            fpath = os.path.join(self.oral_argument_folder, fname)
+            with open(fpath) as f:
+                text = f.read()
+            with open(fpath, 'w') as f:
+                f.write(text.replace('RESPONDENT', 'AMICUS').replace('Respondent', 'Amicus'))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _run(self, n_workers):
+        storage_url = 'sqlite://' + os.path.join(self.folder, 'cases%s.db' % n_workers)
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, storage_url=storage_url)
+        count_problems = obj.insert_intersect_docket_meta_oral(n_workers=n_workers, chunksize=3)
+        docs = list(obj.tab.find())
+        obj.storage.close()
+        return count_problems, docs
+
+    def test_same_as_serial(self):
+        count_problems, docs = self._run(1)
+        self.assertTrue(len(docs) > 10)
+        self.assertTrue(count_problems > 0)
+        self.assertEqual(self._run(2), (count_problems, docs))
+
+if __name__ == '__main__':
+    unittest.main()
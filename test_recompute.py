@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import preprocessing
+import recompute
+import storage
+import synthetic
+
+class _Constant_Scorer(object):
+    def score(self, texts):
+        return np.full(len(texts), 0.5)
+
+class Test_Recompute(unittest.TestCase):
+    """
+    A recomputed stage only changes the fields it produces
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.metadata_file, self.oral_argument_folder = synthetic.Synthetic_Corpus(
+            10, turns=(20, 40)).write(self.folder)
+        self.storage_url = 'sqlite://' + os.path.join(self.folder, 'cases.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _run(self, layout='embedded'):
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=True,
+                                          storage_url=self.storage_url, layout=layout)
+        obj.insert_intersect_docket_meta_oral()
+        obj.storage.close()
+
+    def _docs(self, name='data'):
+        storage_obj = storage.open_storage(self.storage_url)
+        docs = {doc['_id']: doc for doc in storage_obj.table(name).find()}
+        storage_obj.close()
+        return docs
+
+    def _recompute(self, stages, **kwargs):
+        storage_obj = storage.open_storage(self.storage_url)
+        result = recompute.recompute(storage_obj, stages, **kwargs)
+        storage_obj.close()
+        return result
+
+    def test_sentiment(self):
+        self._run()
+        before = self._docs()
+        result = self._recompute(['sentiment'], scorer=_Constant_Scorer())
+        self.assertEqual(result['stages'], ['sentiment'])
+        self.assertEqual((result['n_updated'], result['n_failed']), (len(before), 0))
+        after = self._docs()
+        self.assertEqual(sorted(after), sorted(before))
+        for docket, doc in after.iteritems():
+            sentiment_dict = doc.pop('sentiment_dict')
+            self.assertTrue(all(value == 0.5 for values in sentiment_dict.itervalues() for value in values))
+            self.assertNotEqual(sentiment_dict, before[docket].pop('sentiment_dict'))
+            self.assertEqual(doc, before[docket])
+
+    def test_unchanged_stages(self):
+        # Re-running stages whose code did not change gives back the stored documents
+        self._run()
+        before = self._docs()
+        before_aggregates = self._docs('data_justice_terms')
+        self._recompute(['interruptions'])
+        self.assertEqual(self._docs(), before)
+        self._recompute(['clean'], oral_argument_folder=self.oral_argument_folder)
+        self.assertEqual(self._docs(), before)
+        self.assertEqual(self._docs('data_justice_terms'), before_aggregates)
+
+    def test_split_layout(self):
+        self._run('split')
+        before, before_text = self._docs(), self._docs('data_text')
+        result = self._recompute(['segment'], layout='split')
+        self.assertEqual(result['n_text_updated'], len(before_text))
+        self.assertEqual(self._docs(), before)
+        self.assertEqual(self._docs('data_text'), before_text)
+
+if __name__ == '__main__':
+    unittest.main()
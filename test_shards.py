@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+import preprocessing
+import shards
+import storage
+import synthetic
+
+class _Failing_Table(object):
+    """
+    A storage table that fails to write the document of one docket
+    """
+    def __init__(self, table, failing_id):
+        self.table = table
+        self.failing_id = failing_id
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def write_batch(self, docs, upsert=False, retry=False):
+        failed = [(i, 'cannot write') for i, doc in enumerate(docs) if doc['_id'] == self.failing_id]
+        self.table.write_batch([doc for doc in docs if doc['_id'] != self.failing_id], upsert, retry)
+        return failed
+
+class _Failing_Storage(object):
+    def __init__(self, storage_obj, table_name, failing_id):
+        self.storage_obj = storage_obj
+        self.table_name = table_name
+        self.failing_id = failing_id
+
+    def table(self, name):
+        table = self.storage_obj.table(name)
+        return _Failing_Table(table, self.failing_id) if name == self.table_name else table
+
+class Test_Merge(unittest.TestCase):
+    """
+    Two shards merged hold the same documents, manifest and aggregates as one unsharded run
+    """
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.metadata_file, self.oral_argument_folder = synthetic.Synthetic_Corpus(
+            20, turns=(20, 40)).write(self.folder)
+        self.shard_url = 'sqlite://' + os.path.join(self.folder, 'shards.db')
+        for shard_index in range(2):
+            shards.run_shard(self.metadata_file, self.oral_argument_folder, shard_index, 2,
+                             storage_url=self.shard_url, checkpoint_every=5)
+        self.single_url = 'sqlite://' + os.path.join(self.folder, 'single.db')
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=True,
+                                          storage_url=self.single_url)
+        obj.insert_intersect_docket_meta_oral()
+        obj.storage.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _tables(self, url, names=('data', 'data_manifest', 'data_justice_terms', 'data_side_terms')):
+        storage_obj = storage.open_storage(url)
+        tables = {name: list(storage_obj.table(name).find()) for name in names}
+        storage_obj.close()
+        return tables
+
+    def _merge(self):
+        shard_storage = storage.open_storage(self.shard_url)
+        result = shards.merge_shards([shard_storage, shard_storage], 2, shard_storage)
+        shard_storage.close()
+        return result
+
+    def test_merge(self):
+        result = self._merge()
+        self.assertEqual(sum(shard_result['n_dockets'] for shard_result in result['shards']),
+                         len(self._tables(self.single_url)['data']))
+        self.assertTrue(all(shard_result['n_dockets'] for shard_result in result['shards']))
+        self.assertEqual(result['n_failed'], 0)
+        self.assertEqual(self._tables(self.shard_url), self._tables(self.single_url))
+
+    def test_overlapping_docket(self):
+        # A stale copy of a docket of shard 1 in the tables of shard 0
+        shard_storage = storage.open_storage(self.shard_url)
+        doc = next(iter(shard_storage.table(shards.shard_collection('data', 1, 2)).find()))
+        shard_storage.table(shards.shard_collection('data', 0, 2)).write_batch([dict(doc, term=1800)])
+        shard_storage.table(shards.shard_collection('data', 0, 2) + '_manifest').write_batch(
+            [{'_id': doc['_id'], 'count_problems': 1000}])
+        shard_storage.close()
+
+        result = self._merge()
+        self.assertEqual([shard_result['n_misplaced'] for shard_result in result['shards']], [1, 0])
+        self.assertEqual(result['n_failed'], 0)
+        self.assertEqual(self._tables(self.shard_url), self._tables(self.single_url))
+
+    def test_failed_write(self):
+        # The text document of a docket cannot be written: it is left out of the manifest, so
+        # that an incremental run on the merged collection writes it again
+        shard_storage = storage.open_storage(self.shard_url)
+        docket = next(iter(shard_storage.table(shards.shard_collection('data', 0, 2)).find(['_id'])))['_id']
+        shard_storage.table(shards.shard_collection('data', 0, 2) + '_text').write_batch([{'_id': docket}])
+        result = shards.merge_shards([shard_storage, shard_storage], 2,
+                                     _Failing_Storage(shard_storage, 'data_text', docket))
+        self.assertEqual((result['n_text_written'], result['n_text_failed']), (0, 1))
+        manifest_ids = [entry['_id'] for entry in shard_storage.table('data_manifest').find()]
+        self.assertEqual(len(manifest_ids), result['n_written'] - 1)
+        self.assertTrue(docket not in manifest_ids)
+        shard_storage.close()
+
+        obj = preprocessing.Preprocessing(self.metadata_file, self.oral_argument_folder, incremental=True,
+                                          storage_url=self.shard_url)
+        obj.insert_intersect_docket_meta_oral()
+        obj.storage.close()
+        self.assertEqual(obj.run_info['n_dockets'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
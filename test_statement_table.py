@@ -0,0 +1,79 @@
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import preprocessing
+import statement_table
+import synthetic
+from speakers import JUSTICE_NAMES
+
+class Test_Statement_Table(unittest.TestCase):
+    """
+    The statements exported by a run agree with its case documents
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        metadata_file, oral_argument_folder = synthetic.Synthetic_Corpus(20, turns=(20, 40)).write(cls.folder)
+        cls.statements_dir = os.path.join(cls.folder, 'statements')
+        obj = preprocessing.Preprocessing(metadata_file, oral_argument_folder,
+                                          storage_url='sqlite://' + os.path.join(cls.folder, 'cases.db'))
+        obj.insert_intersect_docket_meta_oral(statements_dir=cls.statements_dir)
+        cls.docs = list(obj.tab.find())
+        obj.storage.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_round_trip(self):
+        df = statement_table.read_statements(self.statements_dir).to_pandas()
+        self.assertEqual(sorted(df['docket'].unique()), sorted(doc['_id'] for doc in self.docs))
+        for doc in self.docs:
+            rows = df[df['docket'] == doc['_id']]
+            self.assertEqual(set(rows['term'].astype(int)), set([int(doc['term'])]))
+            self.assertEqual([doc['oral_text'][start:end] for start, end in zip(rows['start'], rows['end'])],
+                             doc['statements'])
+            lawyer_sides = {name: side for side, name in doc['lawyer_names_lst']}
+            for speaker, side in zip(rows['speaker'], rows['side']):
+                # Statements without a side read back as NaN
+                side = side if isinstance(side, basestring) else None
+                self.assertEqual(side, lawyer_sides.get(speaker, 'JUSTICE' if speaker in JUSTICE_NAMES else None))
+
+    def test_term_pruning(self):
+        terms = sorted(set(int(doc['term']) for doc in self.docs))
+        self.assertTrue(len(terms) > 1)
+        table = statement_table.read_statements(self.statements_dir, columns=['docket'], terms=terms[:1])
+        self.assertEqual(set(table.to_pandas()['docket']),
+                         set(doc['_id'] for doc in self.docs if int(doc['term']) == terms[0]))
+
+    def test_interruptions_per_justice_per_term(self):
+        counts = statement_table.interruptions_per_justice_per_term(
+            statement_table.read_statements(self.statements_dir, columns=['speaker', 'side', 'interrupted']))
+        expected = collections.Counter()
+        for doc in self.docs:
+            lawyers = set(name for side, name in doc['lawyer_names_lst'])
+            for name, n_interruptions in doc['interruptions_dict'].iteritems():
+                if name in JUSTICE_NAMES and name not in lawyers:
+                    expected[(int(doc['term']), name)] += n_interruptions
+        self.assertEqual({(int(term), speaker): n for (term, speaker), n in counts.iteritems()}, dict(expected))
+
+    def test_mean_polarity_by_side(self):
+        means = statement_table.mean_polarity_by_side(
+            statement_table.read_statements(self.statements_dir, columns=['side', 'polarity']))
+        scores = collections.defaultdict(list)
+        for doc in self.docs:
+            lawyer_sides = {name: side for side, name in doc['lawyer_names_lst']}
+            for name, polarities in doc['sentiment_dict'].iteritems():
+                side = lawyer_sides.get(name, 'JUSTICE' if name in JUSTICE_NAMES else None)
+                if side is not None:
+                    scores[side].extend(polarities)
+        self.assertEqual(sorted(means.index), sorted(scores))
+        for side, polarities in scores.iteritems():
+            # Stored as float32
+            self.assertAlmostEqual(means[side], np.mean(polarities), places=5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mongomock
+from pymongo.errors import DocumentTooLarge
+import aggregates
+import storage
+
+MAX_BSON_SIZE = 1024
+
+class _Size_Limited_Collection(object):
+    """
+    A mongomock collection that rejects documents over MAX_BSON_SIZE like the driver does,
+    after sending the documents before them
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def _check(self, doc):
+        if storage.Mongo_Table.doc_size(doc) > MAX_BSON_SIZE:
+            raise DocumentTooLarge('BSON document too large')
+
+    def insert_many(self, docs, ordered=True):
+        for i, doc in enumerate(docs):
+            try:
+                self._check(doc)
+            except DocumentTooLarge:
+                if i:
+                    self.collection.insert_many(docs[:i], ordered=ordered)
+                raise
+        return self.collection.insert_many(docs, ordered=ordered)
+
+    def insert_one(self, doc):
+        self._check(doc)
+        return self.collection.insert_one(doc)
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            self._check(request._doc)
+        return self.collection.bulk_write(requests, ordered=ordered)
+
+    def replace_one(self, query, doc, upsert=False):
+        self._check(doc)
+        return self.collection.replace_one(query, doc, upsert=upsert)
+
+class Test_Mongo_Table(unittest.TestCase):
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.data
+        self.table = storage.Mongo_Table(_Size_Limited_Collection(self.collection))
+        self.docs = [{'_id': '01-1', 'text': 'a'}, {'_id': '01-2', 'text': 'a' * 2 * MAX_BSON_SIZE},
+                     {'_id': '01-3', 'text': 'a'}]
+
+    def _stored_ids(self):
+        return sorted(doc['_id'] for doc in self.collection.find({}, {'_id': 1}))
+
+    def test_document_too_large(self):
+        failed = self.table.write_batch(self.docs)
+        self.assertEqual([i for i, message in failed], [1])
+        self.assertEqual(self._stored_ids(), ['01-1', '01-3'])
+
+    def test_document_too_large_upsert(self):
+        failed = self.table.write_batch(self.docs, upsert=True)
+        self.assertEqual([i for i, message in failed], [1])
+        self.assertEqual(self._stored_ids(), ['01-1', '01-3'])
+
+    def test_invalid_document(self):
+        # Keys with '.' are not valid, mongomock raises after writing the documents before it
+        docs = [{'_id': '01-1'}, {'_id': '01-2', 'a.b': 1}, {'_id': '01-3'}]
+        failed = storage.Mongo_Table(self.collection).write_batch(docs)
+        self.assertEqual([i for i, message in failed], [1])
+        self.assertEqual(self._stored_ids(), ['01-1', '01-3'])
+
+class _Round_Trip(object):
+    """
+    The same table operations on every backend, self.storage_obj is set by setUp
+    """
+    def _table(self):
+        return self.storage_obj.table('data')
+
+    def test_round_trip(self):
+        docs = [{'_id': '01-%s' % i, 'docket': '01-%s' % i, 'term': 2001, 'statements': ['A: %s' % i]}
+                for i in range(5)]
+        self.assertEqual(self._table().write_batch(docs), [])
+        self.assertEqual(self._table().write_batch([dict(docs[0], term=2002)], upsert=True), [])
+        self.assertEqual(self._table().update_batch([{'_id': '01-1', 'sentiment_dict': {'SCALIA': 1}}]), [])
+        self._table().delete(['01-4'])
+
+        table = self.storage_obj.table('data')
+        self.assertEqual(table.count(), 4)
+        stored = {doc['_id']: doc for doc in table.find()}
+        self.assertEqual(stored['01-0']['term'], 2002)
+        self.assertEqual(stored['01-1'], dict(docs[1], sentiment_dict={'SCALIA': 1}))
+        self.assertEqual(stored['01-2'], docs[2])
+        self.assertEqual(sorted(table.find(['term'])),
+                         sorted([{'_id': '01-0', 'term': 2002}] + [{'_id': '01-%s' % i, 'term': 2001}
+                                                                    for i in range(1, 4)]))
+        table.clear()
+        self.assertEqual(table.count(), 0)
+
+    def test_replace_all(self):
+        table = self._table()
+        table.replace_all([{'_id': 'a', 'justice': 'SCALIA', 'term': 2001}])
+        docs = [{'_id': 'b', 'justice': 'ALITO', 'term': 2006}, {'_id': 'c', 'justice': 'SCALIA', 'term': 2006}]
+        table.replace_all(docs, aggregates.AGGREGATE_INDEXES['justice_terms'])
+        self.assertEqual(sorted(table.find(), key=lambda doc: doc['_id']), docs)
+
+class Test_Mongo_Storage(_Round_Trip, unittest.TestCase):
+    def setUp(self):
+        self.storage_obj = storage.Mongo_Storage(client=mongomock.MongoClient())
+
+    def test_url(self):
+        storage_obj = storage.open_storage('mongodb://localhost:27017/scotus_test')
+        self.assertEqual(storage_obj.db.name, 'scotus_test')
+        storage_obj.close()
+
+class Test_SQLite_Storage(_Round_Trip, unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.storage_obj = storage.open_storage('sqlite://' + os.path.join(self.folder, 'cases.db'))
+
+    def tearDown(self):
+        self.storage_obj.close()
+        shutil.rmtree(self.folder)
+
+    def test_replace_all_indexes(self):
+        self._table().replace_all([{'_id': 'a', 'justice': 'SCALIA', 'term': 2001}],
+                                  aggregates.AGGREGATE_INDEXES['justice_terms'])
+        index_names = [name for (name,) in self.storage_obj.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'data'")]
+        self.assertTrue('data_justice_term' in index_names)
+        self.assertTrue('data_term' in index_names)
+        plan = self.storage_obj.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT doc FROM data WHERE json_extract(doc, '$.justice') = ?", ('SCALIA',)).fetchall()
+        self.assertTrue('data_justice_term' in str(plan))
+
+class Test_JSONL_Storage(_Round_Trip, unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='scotus_test_')
+        self.storage_obj = storage.open_storage('jsonl://' + os.path.join(self.folder, 'cases'))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+if __name__ == '__main__':
+    unittest.main()
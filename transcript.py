@@ -0,0 +1,87 @@
+import mmap
+import os
+import re
+import clean_data
+
+# Characters Preprocessing._to_utf8 replaces with a space
+NON_TEXT_RE = re.compile('[^0-9a-zA-Z \.\,\:\!\'\"\-]+')
+
+# What a single space of the cleaned text can stand for in the raw transcript: characters
+# _to_utf8 turns into spaces, line numbers (removed by Clean_Data.perform_regex) and the
+# reporter boilerplate of a page break (removed by Clean_Data.replace_strings, which only
+# finds the strings _to_utf8 left intact)
+_RAW_SPACE = '(?:%s|[^0-9a-zA-Z.,:!\'"\-]+[0-9]*)+' % '|'.join(re.escape(s) for s in clean_data.REPLACE_STRINGS
+                                                             if NON_TEXT_RE.search(s) is None)
+
+def _raw_marker_re(marker):
+    return re.compile(_RAW_SPACE.join(re.escape(word) for word in marker.split(' ')))
+
+# The markers of clean_data, as they can appear in the raw transcript
+RAW_START_MARKER_RES = tuple(_raw_marker_re(marker) for marker in clean_data.START_MARKERS)
+RAW_END_MARKER_RES = tuple(_raw_marker_re(marker) for marker in clean_data.END_MARKERS)
+
+def to_text(raw):
+    """
+    Returns raw (str, mmap or buffer) with every character Clean_Data does not expect replaced by a space
+    """
+    return NON_TEXT_RE.sub(' ', raw)
+
+def read_transcript(oral_fpath):
+    """
+    Returns the whole transcript, character-filtered
+    """
+    with open(oral_fpath) as f:
+        return to_text(f.read())
+
+def _find_first_raw_marker(raw, marker_res):
+    """
+    Same as clean_data.find_first_marker, on the raw transcript
+    :return: (index of the marker, match), or (None, None) if none of the markers is found
+    """
+    for i, marker_re in enumerate(marker_res):
+        match = marker_re.search(raw)
+        if match is not None:
+            return i, match
+    return None, None
+
+def read_mapped_body(oral_fpath):
+    """
+    Memory-map the transcript, find the start and end markers of the oral argument in the
+    mapped bytes and only copy out (character-filtered) the lines from the start marker to
+    the end marker. The front matter and the word index after the argument are never read
+    into memory, and workers mapping the same file share the page cache.
+    Falls back to the whole transcript when a marker is not found.
+    :return: (text, (start marker index, end marker index) or None for the whole transcript),
+             see body_markers_match
+    """
+    with open(oral_fpath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return '', None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        start_marker, start_match = _find_first_raw_marker(mapped, RAW_START_MARKER_RES)
+        end_marker, end_match = _find_first_raw_marker(mapped, RAW_END_MARKER_RES)
+        if (start_match is None) or (end_match is None):
+            return to_text(mapped), None
+
+        # Whole lines, so that the markers are cleaned exactly as in the whole transcript
+        body_start = mapped.rfind('\n', 0, min(start_match.start(), end_match.start())) + 1
+        body_end = mapped.find('\n', max(start_match.end(), end_match.end()))
+        if body_end == -1:
+            body_end = len(mapped)
+        return to_text(buffer(mapped, body_start, body_end - body_start)), (start_marker, end_marker)
+    finally:
+        mapped.close()
+
+def body_markers_match(clean_data_obj, markers):
+    """
+    Returns whether Clean_Data found the markers read_mapped_body picked in the raw bytes. The
+    raw search accepts everything the cleaned text could match, so when the cleaned body starts
+    and ends at the same markers, they are the ones the whole transcript would give.
+    """
+    start_marker, end_marker = markers
+    return (clean_data_obj.oral_text_start != -1 and clean_data_obj.oral_text_end != -1 and
+            clean_data_obj.oral_text.startswith(clean_data.START_MARKERS[start_marker],
+                                                clean_data_obj.oral_text_start) and
+            clean_data_obj.oral_text.startswith(clean_data.END_MARKERS[end_marker],
+                                                clean_data_obj.oral_text_end))